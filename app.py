@@ -5,11 +5,14 @@ from flask import Flask
 from flask_login import LoginManager
 from config import Config
 from models import db, User
+import db_utils
+import metrics
+import profiling
 from routes.auth import auth_bp
 from routes.admin import admin_bp
 from routes.doctor import doctor_bp
 from routes.patient import patient_bp
-from commands.load_data import register_command
+from commands import register_commands
 
 # Initialize Flask-Login
 login_manager = LoginManager()
@@ -20,18 +23,9 @@ login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user from database for Flask-Login"""
-    from db_utils import fetch_one
-    user_data = fetch_one(
-        "SELECT * FROM core_customuser WHERE id = %s",
-        (int(user_id),)
-    )
-    if user_data:
-        user = User()
-        for key, value in user_data.items():
-            setattr(user, key, value)
-        return user
-    return None
+    """Load user for Flask-Login (served from the user cache when possible)"""
+    from services.users import load_user_by_id
+    return load_user_by_id(user_id)
 
 
 def create_app(config_class=Config):
@@ -41,6 +35,9 @@ def create_app(config_class=Config):
     
     # Initialize extensions
     db.init_app(app)
+    db_utils.init_app(app)
+    metrics.init_app(app)
+    profiling.init_app(app)
     login_manager.init_app(app)
     
     # Register blueprints
@@ -50,7 +47,7 @@ def create_app(config_class=Config):
     app.register_blueprint(patient_bp, url_prefix='/patient')
     
     # Register CLI commands
-    register_command(app)
+    register_commands(app)
     
     # Create database tables (if they don't exist)
     # Note: We're using existing tables, so this is mainly for SQLAlchemy mapping
@@ -0,0 +1,420 @@
+"""
+Route-level benchmark for the Flask application.
+
+Builds a deterministic, scaled-up dataset (flask load-data + flask
+generate-data) in a dedicated MySQL database, logs in one test client per
+role and drives every GET route of the auth, admin, doctor and patient
+blueprints. For each route it records p50/p95/p99 latency, queries per
+request and peak Python memory, and writes them to a JSON file that a later
+run can be compared against.
+
+Database:
+    - BENCH_DB_HOST set: use that server (BENCH_DB_PORT, BENCH_DB_USER,
+      BENCH_DB_PASSWORD); the BENCH_DB_NAME database is dropped and rebuilt
+    - otherwise: start a throwaway mysqld/mariadbd from PATH in a temp dir
+
+Usage:
+    python benchmark.py --patients 20000 --output benchmark_baseline.json
+    python benchmark.py --compare benchmark_baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import pymysql
+
+from config import Config
+
+# Blueprint -> role of the client that drives its routes (None = anonymous)
+BLUEPRINT_ROLES = {'admin': 'ADMIN', 'doctor': 'DOCTOR', 'patient': 'PATIENT'}
+AUTH_ROUTE_ROLES = {'auth.login': None, 'auth.patient_registration': None, 'auth.dashboard': 'DOCTOR'}
+
+# Routes that would end the benchmark client's session
+SKIPPED_ENDPOINTS = {'auth.logout'}
+
+# Query strings for routes that need one to do real work
+QUERY_STRINGS = {
+    'doctor.patient_search': {'q': 'Rah'},
+    'doctor.medicine_search': {'q': 'Na'},
+}
+
+# (role, URL argument) -> SQL returning a sample value for the benchmark user.
+# Each query receives the user's profile id (hospital, doctor or patient id).
+URL_ARG_QUERIES = {
+    ('ADMIN', 'dept_id'): "SELECT dept_id FROM core_department WHERE hospital_id = %s ORDER BY dept_id LIMIT 1",
+    ('ADMIN', 'stock_id'): """SELECT pm.pharmacy_medicine_id FROM core_pharmacymedicine pm
+                              INNER JOIN core_pharmacy p ON pm.pharmacy_id = p.pharmacy_id
+                              WHERE p.hospital_id = %s ORDER BY pm.pharmacy_medicine_id LIMIT 1""",
+    ('DOCTOR', 'appointment_id'): """SELECT appointment_id FROM core_appointment
+                                     WHERE doctor_id = %s ORDER BY date_and_time DESC LIMIT 1""",
+    ('DOCTOR', 'prescription_id'): """SELECT p.prescription_id FROM core_prescription p
+                                      INNER JOIN core_appointment a ON p.appointment_id = a.appointment_id
+                                      WHERE a.doctor_id = %s ORDER BY p.prescription_id DESC LIMIT 1""",
+    ('DOCTOR', 'test_id'): "SELECT test_id FROM core_labtest WHERE ordered_by_id = %s ORDER BY test_id DESC LIMIT 1",
+    ('PATIENT', 'appointment_id'): """SELECT appointment_id FROM core_appointment
+                                      WHERE patient_id = %s ORDER BY date_and_time DESC LIMIT 1""",
+}
+
+# The busiest generated user of each role, so the worst-case pages are measured
+BENCH_USER_QUERIES = {
+    'ADMIN': """SELECT u.id, u.username, u.hospital_id AS profile_id FROM core_customuser u
+                WHERE u.role = 'ADMIN' AND u.username LIKE 'gen\\_%%' AND u.hospital_id = (
+                    SELECT hospital_id FROM core_doctor GROUP BY hospital_id ORDER BY COUNT(*) DESC LIMIT 1)
+                LIMIT 1""",
+    'DOCTOR': """SELECT u.id, u.username, d.doctor_id AS profile_id FROM core_doctor d
+                 INNER JOIN core_customuser u ON d.user_id = u.id
+                 INNER JOIN core_appointment a ON a.doctor_id = d.doctor_id
+                 WHERE u.username LIKE 'gen\\_%%'
+                 GROUP BY u.id, u.username, d.doctor_id ORDER BY COUNT(*) DESC LIMIT 1""",
+    'PATIENT': """SELECT u.id, u.username, p.patient_id AS profile_id FROM core_patient p
+                  INNER JOIN core_customuser u ON p.user_id = u.id
+                  INNER JOIN core_appointment a ON a.patient_id = p.patient_id
+                  WHERE u.username LIKE 'gen\\_%%'
+                  GROUP BY u.id, u.username, p.patient_id ORDER BY COUNT(*) DESC LIMIT 1""",
+}
+
+
+class LocalMySQL:
+    """Throwaway MySQL/MariaDB server in a temporary data directory"""
+
+    def __init__(self):
+        self.binary = shutil.which('mysqld') or shutil.which('mariadbd')
+        self.workdir = None
+        self.process = None
+        self.port = None
+
+    @property
+    def available(self):
+        return self.binary is not None
+
+    def start(self, timeout=60):
+        self.workdir = tempfile.mkdtemp(prefix='bench-mysql-')
+        datadir = os.path.join(self.workdir, 'data')
+        version = subprocess.run([self.binary, '--version'], capture_output=True, text=True).stdout
+        if 'MariaDB' in version:
+            installer = shutil.which('mariadb-install-db') or shutil.which('mysql_install_db')
+            command = [installer, f'--datadir={datadir}', '--auth-root-authentication-method=normal']
+        else:
+            command = [self.binary, '--initialize-insecure', f'--datadir={datadir}']
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            self.port = probe.getsockname()[1]
+        self.process = subprocess.Popen(
+            [self.binary, f'--datadir={datadir}', f'--port={self.port}', '--bind-address=127.0.0.1',
+             f'--socket={os.path.join(self.workdir, "mysql.sock")}',
+             f'--pid-file={os.path.join(self.workdir, "mysql.pid")}', '--skip-log-bin', '--user=root'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                pymysql.connect(host='127.0.0.1', port=self.port, user='root', password='').close()
+                return
+            except pymysql.err.OperationalError:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError('Local MySQL server did not start')
+                time.sleep(0.5)
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.workdir:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def make_config(host, port, user, password, name):
+    """Config subclass pointing both db_utils and SQLAlchemy at the benchmark database"""
+
+    class BenchConfig(Config):
+        DEBUG = False
+        TESTING = False
+        PROPAGATE_EXCEPTIONS = False
+        WTF_CSRF_ENABLED = False
+        DB_HOST = host
+        DB_PORT = port
+        DB_USER = user
+        DB_PASSWORD = password
+        DB_NAME = name
+        DB_QUERY_INSTRUMENTATION = True
+        SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{user}:{password}@{host}:{port}/{name}?charset=utf8mb4"
+
+    return BenchConfig
+
+
+def recreate_database(host, port, user, password, name):
+    conn = pymysql.connect(host=host, port=port, user=user, password=password)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP DATABASE IF EXISTS `{name}`")
+            cursor.execute(f"CREATE DATABASE `{name}` CHARACTER SET utf8mb4")
+    finally:
+        conn.close()
+
+
+def build_dataset(app, args):
+    """Load reference data, indexes and the synthetic dataset through the CLI commands"""
+    runner = app.test_cli_runner()
+    steps = [
+        ['load-data'],
+        ['create-indexes', '--no-explain'],
+        ['generate-data', '--patients', str(args.patients),
+         '--appointments-per-patient', str(args.appointments_per_patient),
+         '--hospitals', str(args.hospitals), '--doctors', str(args.doctors), '--seed', str(args.seed)],
+    ]
+    for step in steps:
+        print(f"  flask {' '.join(step)}")
+        result = runner.invoke(args=step)
+        if result.exit_code != 0:
+            raise RuntimeError(f"flask {step[0]} failed:\n{result.output}") from result.exception
+
+
+def bench_users(app):
+    """Pick the busiest generated user of each role"""
+    from db_utils import fetch_one
+    users = {}
+    with app.app_context():
+        for role, sql in BENCH_USER_QUERIES.items():
+            row = fetch_one(sql)
+            if not row:
+                raise RuntimeError(f'No generated {role} user found; was generate-data run?')
+            users[role] = row
+    return users
+
+
+def resolve_routes(app, users):
+    """
+    Every GET route of the four blueprints with concrete URLs for its client.
+
+    Returns:
+        Tuple of (list of (endpoint, role, url), list of skipped endpoint messages)
+    """
+    from flask import url_for
+    from db_utils import fetch_one
+
+    routes, skipped = [], []
+    with app.test_request_context():
+        for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.endpoint):
+            blueprint = rule.endpoint.split('.')[0]
+            if 'GET' not in rule.methods or rule.endpoint in SKIPPED_ENDPOINTS:
+                continue
+            if blueprint == 'auth':
+                role = AUTH_ROUTE_ROLES.get(rule.endpoint)
+            elif blueprint in BLUEPRINT_ROLES:
+                role = BLUEPRINT_ROLES[blueprint]
+            else:
+                continue
+
+            values = dict(QUERY_STRINGS.get(rule.endpoint, {}))
+            missing = None
+            for argument in sorted(rule.arguments):
+                sql = URL_ARG_QUERIES.get((role, argument))
+                row = fetch_one(sql, (users[role]['profile_id'],)) if sql else None
+                if not row:
+                    missing = argument
+                    break
+                values[argument] = next(iter(row.values()))
+            if missing:
+                skipped.append(f'{rule.endpoint} (no sample value for {missing})')
+                continue
+            routes.append((rule.endpoint, role, url_for(rule.endpoint, **values)))
+    return routes, skipped
+
+
+def login_clients(app, users, password):
+    clients = {None: app.test_client()}
+    for role, user in users.items():
+        client = app.test_client()
+        response = client.post('/login', data={'username': user['username'], 'password': password})
+        if response.status_code != 302:
+            raise RuntimeError(f"Login failed for {user['username']} ({response.status_code})")
+        clients[role] = client
+    return clients
+
+
+def measure_route(client, url, warmup, iterations):
+    """Latency percentiles, queries per request and peak traced memory of one URL"""
+    from db_utils import capture_queries
+
+    for _ in range(warmup):
+        client.get(url)
+
+    timings, query_counts, statuses = [], [], set()
+    for _ in range(iterations):
+        with capture_queries() as queries:
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000.0)
+        query_counts.append(len(queries))
+        statuses.add(response.status_code)
+
+    # Separate request: tracing slows everything down and would skew the timings
+    tracemalloc.start()
+    client.get(url)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cut_points = statistics.quantiles(timings, n=100, method='inclusive') if len(timings) > 1 else timings * 99
+    return {
+        'url': url,
+        'status': sorted(statuses),
+        'p50_ms': round(cut_points[49], 3),
+        'p95_ms': round(cut_points[94], 3),
+        'p99_ms': round(cut_points[98], 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': int(statistics.median(query_counts)),
+        'peak_kb': round(peak / 1024.0, 1),
+    }
+
+
+def compare(results, baseline, tolerance, slack_ms):
+    """
+    Regressions of results against a baseline.
+
+    A route regresses if its p95 grows beyond tolerance (plus slack_ms, to
+    ignore noise on very fast routes), if it issues more queries, or if its
+    peak memory grows beyond tolerance.
+    """
+    regressions = []
+    for endpoint, base in baseline.get('routes', {}).items():
+        current = results['routes'].get(endpoint)
+        if current is None:
+            regressions.append(f'{endpoint}: missing from this run')
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance) + slack_ms:
+            regressions.append(f"{endpoint}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['queries'] > base['queries']:
+            regressions.append(f"{endpoint}: queries {base['queries']} -> {current['queries']}")
+        if current['peak_kb'] > base['peak_kb'] * (1 + tolerance):
+            regressions.append(f"{endpoint}: peak memory {base['peak_kb']}KB -> {current['peak_kb']}KB")
+    return regressions
+
+
+def print_table(results):
+    print(f"\n{'Endpoint':<34} {'Status':<8} {'p50':>8} {'p95':>8} {'p99':>8} {'Queries':>8} {'Peak KB':>9}")
+    print("-" * 90)
+    for endpoint, row in results['routes'].items():
+        status = ','.join(str(code) for code in row['status'])
+        print(f"{endpoint:<34} {status:<8} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+              f"{row['p99_ms']:>8.2f} {row['queries']:>8} {row['peak_kb']:>9.1f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every blueprint route against a generated dataset.')
+    parser.add_argument('--patients', type=int, default=5000)
+    parser.add_argument('--appointments-per-patient', type=float, default=10)
+    parser.add_argument('--hospitals', type=int, default=20)
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--iterations', type=int, default=50, help='Timed requests per route.')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed requests per route first.')
+    parser.add_argument('--reuse-data', action='store_true',
+                        help='Keep the existing benchmark database instead of rebuilding it.')
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write the results.')
+    parser.add_argument('--compare', metavar='BASELINE', help='Baseline JSON to check for regressions.')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative p95/memory growth.')
+    parser.add_argument('--slack-ms', type=float, default=2.0, help='Absolute p95 noise allowance.')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    password = 'password123'
+
+    print("=" * 60)
+    print("Healthcare Management System - Route Benchmark")
+    print("=" * 60)
+
+    server = None
+    host = os.environ.get('BENCH_DB_HOST')
+    if host:
+        port = int(os.environ.get('BENCH_DB_PORT') or 3306)
+        user = os.environ.get('BENCH_DB_USER') or 'root'
+        db_password = os.environ.get('BENCH_DB_PASSWORD') or ''
+    else:
+        server = LocalMySQL()
+        if not server.available:
+            print("[SKIP] Set BENCH_DB_HOST or install mysqld/mariadbd to run the benchmark")
+            return 2
+        print("Starting local MySQL server...")
+        server.start()
+        host, port, user, db_password = '127.0.0.1', server.port, 'root', ''
+    name = os.environ.get('BENCH_DB_NAME') or 'healthcare_bench'
+
+    try:
+        if not args.reuse_data or server:
+            recreate_database(host, port, user, db_password, name)
+
+        # create_app() runs db.create_all(), so the schema comes from models.py
+        from app import create_app
+        app = create_app(make_config(host, port, user, db_password, name))
+
+        if not args.reuse_data or server:
+            print("Building dataset...")
+            start = time.perf_counter()
+            build_dataset(app, args)
+            print(f"  done in {time.perf_counter() - start:.1f}s")
+
+        users = bench_users(app)
+        routes, skipped = resolve_routes(app, users)
+        clients = login_clients(app, users, password)
+
+        results = {
+            'meta': {
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'patients': args.patients,
+                'appointments_per_patient': args.appointments_per_patient,
+                'hospitals': args.hospitals,
+                'doctors': args.doctors,
+                'seed': args.seed,
+                'iterations': args.iterations,
+            },
+            'routes': {},
+        }
+        print(f"Benchmarking {len(routes)} routes ({args.iterations} requests each)...")
+        for endpoint, role, url in routes:
+            results['routes'][endpoint] = measure_route(clients[role], url, args.warmup, args.iterations)
+
+        print_table(results)
+        for message in skipped:
+            print(f"[SKIP] {message}")
+
+        with open(args.output, 'w') as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+        print(f"\nResults written to {args.output}")
+
+        if args.compare:
+            with open(args.compare) as handle:
+                baseline = json.load(handle)
+            regressions = compare(results, baseline, args.tolerance, args.slack_ms)
+            for message in regressions:
+                print(f"[FAIL] {message}")
+            if regressions:
+                return 1
+            print(f"[OK] No regressions against {args.compare}")
+        return 0
+    finally:
+        if server:
+            server.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Microbenchmark of row hydration for templates.
+
+Compares the old per-blueprint dict_to_model helper (a SQLAlchemy model
+instance per row, filled with setattr) against the services.rows views on
+synthetic row dicts shaped like the route queries. Reports the best time
+of several runs and the memory retained by the hydrated list. Needs no
+database.
+
+Usage:
+    python benchmark_rows.py --rows 10000 --repeat 5
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from models import Appointment, Medicine, Patient, PrescriptionItem
+from services.rows import APPOINTMENT, PRESCRIPTION_ITEM
+
+
+def dict_to_model(model_class, data_dict):
+    """The helper the blueprints used before services.rows (kept as the baseline)"""
+    if not data_dict:
+        return None
+    instance = model_class()
+    for key, value in data_dict.items():
+        setattr(instance, key, value)
+    return instance
+
+
+def appointment_rows(count):
+    """Rows of "SELECT a.*, p.full_name as patient_name ..." """
+    start = datetime(2024, 1, 1, 9, 0)
+    return [
+        {
+            'appointment_id': i,
+            'patient_id': i % 997 + 1,
+            'doctor_id': i % 53 + 1,
+            'status': 'Completed' if i % 3 else 'Scheduled',
+            'reason_for_visit': 'Routine check-up',
+            'diagnosis': 'Hypertension' if i % 3 else None,
+            'follow_up_date': None,
+            'symptoms': 'Headache, fatigue',
+            'visit_type': 'Follow-up',
+            'date_and_time': start + timedelta(minutes=15 * i),
+            'patient_name': f'Patient {i % 997 + 1}',
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def prescription_item_rows(count):
+    """Rows of "SELECT pi.*, m.name as medicine_name, m.type as medicine_type ..." """
+    return [
+        {
+            'item_id': i,
+            'prescription_id': i // 3 + 1,
+            'medicine_id': i % 211 + 1,
+            'dosage': '500mg',
+            'frequency': 'Twice daily',
+            'duration': '7 days',
+            'quantity': 14,
+            'before_after_meal': 'After',
+            'instructions': '',
+            'medicine_name': f'Medicine {i % 211 + 1}',
+            'medicine_type': 'Tablet',
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def legacy_appointments(rows):
+    appointments = []
+    for data in rows:
+        appointment = dict_to_model(Appointment, data)
+        patient = Patient()
+        patient.full_name = data['patient_name']
+        appointment.patient = patient
+        appointments.append(appointment)
+    return appointments
+
+
+def legacy_prescription_items(rows):
+    items = []
+    for data in rows:
+        item = dict_to_model(PrescriptionItem, data)
+        medicine = Medicine()
+        medicine.name = data['medicine_name']
+        medicine.type = data['medicine_type']
+        item.medicine = medicine
+        items.append(item)
+    return items
+
+
+CASES = (
+    ('appointments', appointment_rows, legacy_appointments, APPOINTMENT.many),
+    ('prescription_items', prescription_item_rows, legacy_prescription_items, PRESCRIPTION_ITEM.many),
+)
+
+
+def measure(hydrate, rows, repeat):
+    """Best wall time (ms) over repeat runs and KB retained by one result"""
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        hydrate(rows)
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = hydrate(rows)
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return round(best * 1000.0, 2), round(retained / 1024.0, 1)
+
+
+def run(count=10000, repeat=5):
+    """Results per case: {'legacy_ms', 'rows_ms', 'speedup', 'legacy_kb', 'rows_kb'}"""
+    results = {}
+    for name, make_rows, legacy, rows_view in CASES:
+        rows = make_rows(count)
+        # Warm both paths (mapper configuration, row class creation)
+        legacy(rows[:10])
+        rows_view(rows[:10])
+        legacy_ms, legacy_kb = measure(legacy, rows, repeat)
+        rows_ms, rows_kb = measure(rows_view, rows, repeat)
+        results[name] = {
+            'legacy_ms': legacy_ms,
+            'rows_ms': rows_ms,
+            'speedup': round(legacy_ms / rows_ms, 1) if rows_ms else None,
+            'legacy_kb': legacy_kb,
+            'rows_kb': rows_kb,
+        }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare dict_to_model and services.rows hydration.')
+    parser.add_argument('--rows', type=int, default=10000, help='Rows per list.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per case (best is reported).')
+    args = parser.parse_args(argv)
+
+    print("=" * 60)
+    print(f"Row Hydration Benchmark ({args.rows} rows, best of {args.repeat})")
+    print("=" * 60)
+    print(f"\n{'Case':<20} {'dict_to_model':>14} {'rows':>10} {'Speedup':>8} {'Model KB':>10} {'Rows KB':>10}")
+    print("-" * 76)
+    for name, row in run(args.rows, args.repeat).items():
+        print(f"{name:<20} {row['legacy_ms']:>12.2f}ms {row['rows_ms']:>8.2f}ms {row['speedup']:>7}x "
+              f"{row['legacy_kb']:>10.1f} {row['rows_kb']:>10.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
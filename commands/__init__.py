@@ -1,2 +1,10 @@
 # Commands package
+from commands import load_data, create_indexes, generate_data, profile_token
 
+
+def register_commands(app):
+    """Register all CLI commands with Flask app"""
+    load_data.register_command(app)
+    create_indexes.register_command(app)
+    generate_data.register_command(app)
+    profile_token.register_command(app)
@@ -0,0 +1,171 @@
+"""
+Flask CLI command to create indexes for the application's hot query paths
+Usage: flask create-indexes [--no-explain]
+"""
+import click
+import pymysql
+from datetime import datetime, timedelta
+from flask.cli import with_appcontext
+from db_utils import fetch_all, execute_update
+
+
+# (table, index name, columns, unique)
+INDEXES = [
+    ('core_appointment', 'idx_appointment_doctor_datetime', ('doctor_id', 'date_and_time'), False),
+    ('core_appointment', 'idx_appointment_patient_datetime', ('patient_id', 'date_and_time'), False),
+    ('core_doctor', 'idx_doctor_user', ('user_id',), False),
+    ('core_patient', 'idx_patient_user', ('user_id',), False),
+    ('core_patient', 'idx_patient_full_name', ('full_name',), False),
+    ('core_patient', 'idx_patient_phone', ('phone',), False),
+    ('core_bill', 'idx_bill_patient_date', ('patient_id', 'bill_date'), False),
+    ('core_bill', 'idx_bill_date', ('bill_date',), False),
+    ('core_labtest', 'idx_labtest_ordered_by_status', ('ordered_by_id', 'status'), False),
+    ('core_bill', 'uniq_bill_transaction_id', ('transaction_id',), True),
+    ('core_servicetype', 'uniq_servicetype_name', ('name',), True),
+    ('core_district', 'uniq_district_name', ('name',), True),
+]
+
+_NOW = datetime.now()
+
+# Representative queries whose plans are reported before and after (label, sql, params)
+EXPLAIN_QUERIES = [
+    ("Doctor's appointments for a day",
+     """SELECT a.appointment_id FROM core_appointment a
+        WHERE a.doctor_id = %s AND a.date_and_time >= %s AND a.date_and_time < %s
+        ORDER BY a.date_and_time""",
+     (1, _NOW, _NOW + timedelta(days=1))),
+    ("Patient's appointment history",
+     """SELECT a.appointment_id FROM core_appointment a
+        WHERE a.patient_id = %s ORDER BY a.date_and_time DESC""",
+     (1,)),
+    ("Doctor profile by user",
+     "SELECT * FROM core_doctor WHERE user_id = %s",
+     (1,)),
+    ("Patient profile by user",
+     "SELECT * FROM core_patient WHERE user_id = %s",
+     (1,)),
+    ("Patient search by name prefix",
+     "SELECT patient_id FROM core_patient WHERE full_name LIKE %s ORDER BY full_name LIMIT 20",
+     ('Rah%',)),
+    ("Patient search by phone",
+     "SELECT patient_id FROM core_patient WHERE phone = %s",
+     ('01700000000',)),
+    ("Patient's recent bills",
+     "SELECT b.bill_id FROM core_bill b WHERE b.patient_id = %s ORDER BY b.bill_date DESC LIMIT 5",
+     (1,)),
+    ("Bills in an export date range",
+     "SELECT b.bill_id FROM core_bill b WHERE b.bill_date >= %s AND b.bill_date <= %s",
+     (_NOW.date() - timedelta(days=30), _NOW.date())),
+    ("Doctor's lab tests by status",
+     "SELECT t.test_id FROM core_labtest t WHERE t.ordered_by_id = %s AND t.status = %s",
+     (1, 'Ordered')),
+]
+
+
+def get_existing_indexes(table):
+    """
+    Map index name -> (columns tuple, unique) for a table in the current database.
+    """
+    rows = fetch_all(
+        """SELECT index_name AS index_name, column_name AS column_name, non_unique AS non_unique
+           FROM information_schema.statistics
+           WHERE table_schema = DATABASE() AND table_name = %s
+           ORDER BY index_name, seq_in_index""",
+        (table,)
+    )
+    indexes = {}
+    for row in rows:
+        columns, _ = indexes.get(row['index_name'], ((), False))
+        indexes[row['index_name']] = (columns + (row['column_name'],), not row['non_unique'])
+    return indexes
+
+
+def find_covering_index(existing, columns, unique):
+    """
+    Name of an existing index that already serves the required one, if any.
+    
+    A plain index is covered by any index with the same leading columns. A
+    unique one needs a unique index on exactly the same columns: unique
+    (transaction_id, x) does not make transaction_id alone unique.
+    """
+    for name, (index_columns, index_unique) in existing.items():
+        if unique:
+            if index_unique and sorted(index_columns) == sorted(columns):
+                return name
+        elif index_columns[:len(columns)] == tuple(columns):
+            return name
+    return None
+
+
+def find_duplicates(table, columns, limit=10):
+    """Values of columns that occur more than once in table (they block a unique index)"""
+    column_list = ', '.join(columns)
+    return fetch_all(
+        f"""SELECT {column_list}, COUNT(*) AS copies FROM {table}
+            WHERE {' AND '.join(f'{column} IS NOT NULL' for column in columns)}
+            GROUP BY {column_list} HAVING COUNT(*) > 1
+            ORDER BY copies DESC LIMIT %s""",
+        (limit,)
+    )
+
+
+def report_plans(title):
+    """Echo the EXPLAIN output of every representative query"""
+    click.echo(click.style(title, fg='cyan'))
+    for label, sql, params in EXPLAIN_QUERIES:
+        click.echo(f'  {label}:')
+        for row in fetch_all(f"EXPLAIN {sql}", params):
+            click.echo(
+                f"    table={row.get('table')} type={row.get('type')} key={row.get('key')} "
+                f"rows={row.get('rows')} extra={row.get('Extra') or ''}"
+            )
+
+
+@click.command('create-indexes')
+@click.option('--explain/--no-explain', default=True, help='Report query plans before and after.')
+@with_appcontext
+def create_indexes(explain):
+    """Create composite indexes for the real access paths (safe to run repeatedly)"""
+    click.echo(click.style('Creating indexes...', fg='green'))
+
+    if explain:
+        report_plans('Query plans before:')
+
+    created = 0
+    failed = []
+    for table, name, columns, unique in INDEXES:
+        existing = get_existing_indexes(table)
+        covering = find_covering_index(existing, columns, unique)
+        if covering:
+            click.echo(f'  {table}({", ".join(columns)}) already covered by {covering}')
+            continue
+
+        kind = 'UNIQUE INDEX' if unique else 'INDEX'
+        try:
+            execute_update(f"CREATE {kind} {name} ON {table} ({', '.join(columns)})")
+        except pymysql.err.IntegrityError:
+            # Existing duplicate rows; report them instead of aborting the remaining indexes
+            failed.append(name)
+            click.echo(click.style(
+                f'  Could not create {name} on {table}({", ".join(columns)}): duplicate values exist', fg='red'))
+            for row in find_duplicates(table, columns):
+                values = ', '.join(f'{column}={row[column]!r}' for column in columns)
+                click.echo(f'    {values} ({row["copies"]} rows)')
+            continue
+        created += 1
+        click.echo(f'  Created {name} on {table}({", ".join(columns)})')
+
+    if explain:
+        report_plans('Query plans after:')
+
+    click.echo(click.style(f'{created} index(es) created.', fg='green'))
+    if failed:
+        raise click.ClickException(
+            f"{len(failed)} unique index(es) not created ({', '.join(failed)}); "
+            f"merge the duplicate rows listed above and run the command again"
+        )
+
+
+def register_command(app):
+    """Register the command with Flask app"""
+    app.cli.add_command(create_indexes)
@@ -0,0 +1,467 @@
+"""
+Flask CLI command to generate synthetic data for load testing
+Usage: flask generate-data --patients 100000 --appointments-per-patient 20 --seed 42
+
+Rows are produced by a seeded random.Random and streamed into the database
+in chunked multi-row INSERTs, parents before children, so memory stays flat
+however many appointments are generated. Primary keys are assigned
+explicitly from MAX(pk) + 1, which keeps foreign keys resolvable without
+reading ids back and makes a run reproducible for the same seed, date and
+starting database. Run `flask load-data` first for the reference tables.
+"""
+import click
+import itertools
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from flask.cli import with_appcontext
+from werkzeug.security import generate_password_hash
+from db_utils import fetch_all, fetch_one, transaction
+from services.reference import get_service_type_id
+
+FIRST_NAMES = [
+    'Abdul', 'Rahim', 'Karim', 'Fatema', 'Ayesha', 'Nusrat', 'Tanvir', 'Sabbir', 'Mahmud', 'Farhana',
+    'Sharmin', 'Rafiq', 'Jamal', 'Nazma', 'Shirin', 'Imran', 'Sadia', 'Arif', 'Rubina', 'Habib',
+    'Mizanur', 'Taslima', 'Kamrul', 'Sumaiya', 'Anwar', 'Roksana', 'Shahid', 'Moushumi', 'Jahid', 'Nasrin',
+]
+LAST_NAMES = [
+    'Rahman', 'Hossain', 'Islam', 'Ahmed', 'Khan', 'Chowdhury', 'Uddin', 'Akter', 'Begum', 'Sarker',
+    'Miah', 'Alam', 'Haque', 'Karim', 'Siddique', 'Talukder', 'Bhuiyan', 'Mondal', 'Sheikh', 'Das',
+]
+CITIES = ['Dhaka', 'Chittagong', 'Sylhet', 'Rajshahi', 'Khulna', 'Barisal', 'Rangpur', 'Mymensingh']
+DEPARTMENTS = [
+    'Medicine', 'Surgery', 'Cardiology', 'Neurology', 'Orthopedics', 'Pediatrics', 'Gynecology',
+    'Dermatology', 'ENT', 'Ophthalmology', 'Psychiatry', 'Oncology', 'Nephrology', 'Urology',
+]
+SPECIALIZATIONS = [
+    'General Medicine', 'General Surgery', 'Cardiology', 'Neurology', 'Orthopedics', 'Pediatrics',
+    'Gynecology', 'Dermatology', 'ENT', 'Ophthalmology', 'Psychiatry', 'Oncology',
+]
+MEDICINE_STEMS = [
+    'Napa', 'Ace', 'Seclo', 'Losectil', 'Fexo', 'Monas', 'Azith', 'Cef', 'Amlo', 'Losar',
+    'Metfo', 'Glic', 'Atova', 'Rosu', 'Pantid', 'Domp', 'Ceevit', 'Calbo', 'Neuro', 'Tusca',
+]
+MEDICINE_TYPES = ['Tablet', 'Capsule', 'Syrup', 'Injection', 'Ointment', 'Drops']
+TEST_TYPES = [
+    'Complete Blood Count', 'Lipid Profile', 'Blood Sugar (Fasting)', 'HbA1c', 'Liver Function Test',
+    'Kidney Function Test', 'Thyroid Profile', 'Urine R/E', 'Chest X-Ray', 'ECG', 'Ultrasound Abdomen',
+]
+REASONS = ['Fever', 'Headache', 'Chest pain', 'Back pain', 'Routine checkup', 'Cough', 'Abdominal pain',
+           'Skin rash', 'Follow-up on treatment', 'Shortness of breath']
+DIAGNOSES = ['Viral fever', 'Migraine', 'Hypertension', 'Type 2 diabetes', 'Gastritis', 'Bronchitis',
+             'Muscle strain', 'Allergic dermatitis', 'Anemia', 'Upper respiratory infection']
+RELATIONSHIPS = ['Father', 'Mother', 'Spouse', 'Brother', 'Sister', 'Son', 'Daughter']
+
+# Columns written per table; the primary key is always generated explicitly
+COLUMNS = {
+    'core_hospital': ['hospital_id', 'name', 'address', 'phone', 'capacity', 'registration_no', 'email',
+                      'emergency_services', 'established_date', 'website', 'district_id', 'hospital_type'],
+    'core_publichospital': ['hospital_id', 'govt_funding', 'accreditation_level', 'subsidies'],
+    'core_privatehospital': ['hospital_id', 'owner_name', 'profit_margin'],
+    'core_department': ['dept_id', 'dept_name', 'floor', 'extension', 'operating_hours', 'hospital_id'],
+    'core_lab': ['lab_id', 'lab_name', 'location', 'phone', 'hospital_id'],
+    'core_pharmacy': ['pharmacy_id', 'name', 'location', 'employee_count', 'hospital_id'],
+    'core_medicine': ['medicine_id', 'name', 'type', 'dosage_info', 'side_effects', 'manufacturer_id'],
+    'core_pharmacymedicine': ['pharmacy_medicine_id', 'pharmacy_id', 'medicine_id', 'stock_quantity',
+                              'unit_price', 'expiry_date', 'batch_number', 'last_restocked'],
+    'core_customuser': ['id', 'username', 'password', 'email', 'first_name', 'last_name', 'is_active',
+                        'is_staff', 'is_superuser', 'date_joined', 'role', 'hospital_id'],
+    'core_doctor': ['doctor_id', 'license_no', 'full_name', 'specialization', 'phone', 'email',
+                    'experience_yrs', 'gender', 'shift_timing', 'join_date', 'hospital_id', 'dept_id', 'user_id'],
+    'core_doctorqualification': ['doctor_qualification_id', 'doctor_id', 'qualification_id',
+                                 'year_obtained', 'institution_name'],
+    'core_patient': ['patient_id', 'national_id', 'full_name', 'date_of_birth', 'gender', 'phone', 'email',
+                     'address', 'blood_type', 'occupation', 'marital_status', 'birth_place',
+                     'father_name', 'mother_name', 'user_id'],
+    'core_patientemergencycontact': ['contact_id', 'patient_id', 'contact_name', 'contact_phone',
+                                     'relationship', 'is_primary'],
+    'core_appointment': ['appointment_id', 'patient_id', 'doctor_id', 'status', 'reason_for_visit',
+                         'diagnosis', 'follow_up_date', 'symptoms', 'visit_type', 'date_and_time'],
+    'core_prescription': ['prescription_id', 'appointment_id', 'valid_until', 'refill_count', 'notes'],
+    'core_prescriptionitem': ['item_id', 'prescription_id', 'medicine_id', 'dosage', 'frequency', 'duration',
+                              'quantity', 'before_after_meal', 'instructions'],
+    'core_labtest': ['test_id', 'lab_id', 'patient_id', 'test_type', 'result', 'ordered_by_id', 'remarks',
+                     'test_cost', 'date_and_time', 'status'],
+    'core_bill': ['bill_id', 'patient_id', 'service_type_id', 'bill_date', 'total_amount', 'status',
+                  'insurance_covered', 'discount', 'tax', 'due_date', 'transaction_id'],
+    'core_pharmacybill': ['pharmacy_bill_id', 'pharmacy_id', 'bill_id', 'purchase_date', 'prescription_id'],
+}
+
+# Parents before children, so every flushed chunk's foreign keys already exist
+FLUSH_ORDER = list(COLUMNS)
+
+PRIMARY_KEYS = {table: columns[0] for table, columns in COLUMNS.items()}
+# Subtype tables share core_hospital's key
+SHARED_KEYS = {'core_publichospital', 'core_privatehospital'}
+
+ZERO = Decimal('0.00')
+
+
+class ChunkedWriter:
+    """
+    Buffers generated rows per table and writes them as multi-row INSERTs.
+
+    When any buffer reaches chunk_size every buffer is flushed in FLUSH_ORDER
+    inside one transaction, so child rows never reach the database before
+    the parents they reference.
+    """
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.buffers = {table: [] for table in FLUSH_ORDER}
+        self.counts = Counter()
+
+    def add(self, table, row):
+        buffer = self.buffers[table]
+        buffer.append(row)
+        if len(buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        with transaction() as tx:
+            for table in FLUSH_ORDER:
+                rows = self.buffers[table]
+                if rows:
+                    tx.insert_many(table, COLUMNS[table], rows)
+                    self.counts[table] += len(rows)
+                    self.buffers[table] = []
+
+
+def next_ids():
+    """Iterator of fresh primary keys per table, starting after the current maximum"""
+    ids = {}
+    for table, pk in PRIMARY_KEYS.items():
+        if table in SHARED_KEYS:
+            continue
+        row = fetch_one(f"SELECT COALESCE(MAX({pk}), 0) AS max_id FROM {table}")
+        ids[table] = itertools.count(int(row['max_id']) + 1)
+    return ids
+
+
+def zipf_cum_weights(n, exponent=1.1):
+    """Cumulative Zipf weights for n items: a few items get most of the picks"""
+    return list(itertools.accumulate(1.0 / (rank + 1) ** exponent for rank in range(n)))
+
+
+def reference_ids(table, pk):
+    rows = fetch_all(f"SELECT {pk} FROM {table} ORDER BY {pk}")
+    if not rows:
+        raise click.UsageError(f'{table} is empty; run `flask load-data` first.')
+    return [row[pk] for row in rows]
+
+
+class Generator:
+    """Deterministic row factory for one generate-data run"""
+
+    def __init__(self, rng, writer, ids, today, password_hash):
+        self.rng = rng
+        self.writer = writer
+        self.ids = ids
+        self.today = today
+        self.now = datetime.combine(today, datetime.min.time()) + timedelta(hours=12)
+        self.password_hash = password_hash
+
+    # ---- helpers -------------------------------------------------------
+
+    def take(self, table):
+        return next(self.ids[table])
+
+    def person_name(self):
+        return f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}'
+
+    def phone(self):
+        return f'01{self.rng.randint(3, 9)}{self.rng.randrange(10 ** 8):08d}'
+
+    def money(self, low, high):
+        return Decimal(self.rng.randrange(low * 100, high * 100)) / 100
+
+    def user(self, role, first_name, last_name, hospital_id=None):
+        user_id = self.take('core_customuser')
+        username = f'gen_{role.lower()}{user_id}'
+        self.writer.add('core_customuser', (
+            user_id, username, self.password_hash, f'{username}@example.com', first_name, last_name,
+            True, role == 'ADMIN', False, self.now, role, hospital_id,
+        ))
+        return user_id
+
+    # ---- hospital network ----------------------------------------------
+
+    def hospitals(self, count, district_ids):
+        """Create hospitals with departments, labs, pharmacies and one admin each"""
+        hospitals = []
+        rng = self.rng
+        for _ in range(count):
+            hospital_id = self.take('core_hospital')
+            public = rng.random() < 0.4
+            city = rng.choice(CITIES)
+            self.writer.add('core_hospital', (
+                hospital_id, f'{city} {"General" if public else "Specialized"} Hospital {hospital_id}',
+                f'{rng.randint(1, 200)} Hospital Road, {city}', self.phone(), rng.randint(50, 2500),
+                f'GEN-HOSP-{hospital_id}', f'info{hospital_id}@hospital.example.com', rng.random() < 0.8,
+                date(rng.randint(1950, 2020), rng.randint(1, 12), 1), None,
+                rng.choice(district_ids), 'public' if public else 'private',
+            ))
+            if public:
+                self.writer.add('core_publichospital', (
+                    hospital_id, self.money(10 ** 6, 10 ** 7), rng.choice(['A+', 'A', 'B']), self.money(10 ** 5, 10 ** 6),
+                ))
+            else:
+                self.writer.add('core_privatehospital', (
+                    hospital_id, f'{rng.choice(LAST_NAMES)} Group', self.money(5, 25),
+                ))
+
+            departments = []
+            for dept_name in rng.sample(DEPARTMENTS, rng.randint(5, 10)):
+                dept_id = self.take('core_department')
+                self.writer.add('core_department', (
+                    dept_id, dept_name, str(rng.randint(1, 12)), str(rng.randint(100, 999)),
+                    '8:00 AM - 5:00 PM', hospital_id,
+                ))
+                departments.append(dept_id)
+
+            labs = []
+            for number in range(rng.randint(1, 3)):
+                lab_id = self.take('core_lab')
+                self.writer.add('core_lab', (
+                    lab_id, f'Diagnostic Lab {number + 1}', f'Floor {rng.randint(1, 5)}', self.phone(), hospital_id,
+                ))
+                labs.append(lab_id)
+
+            pharmacies = []
+            for number in range(rng.randint(1, 2)):
+                pharmacy_id = self.take('core_pharmacy')
+                self.writer.add('core_pharmacy', (
+                    pharmacy_id, f'Pharmacy {number + 1}', f'Ground Floor, Block {"ABC"[number]}',
+                    rng.randint(3, 20), hospital_id,
+                ))
+                pharmacies.append(pharmacy_id)
+
+            self.user('ADMIN', 'Admin', str(hospital_id), hospital_id)
+            hospitals.append({'hospital_id': hospital_id, 'departments': departments,
+                              'labs': labs, 'pharmacies': pharmacies})
+        return hospitals
+
+    def doctors(self, count, hospitals, qualification_ids):
+        """Create doctors spread over hospitals with Zipf skew (big hospitals get most)"""
+        rng = self.rng
+        hospital_weights = zipf_cum_weights(len(hospitals), exponent=0.8)
+        doctors = []
+        for _ in range(count):
+            hospital = rng.choices(hospitals, cum_weights=hospital_weights)[0]
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            user_id = self.user('DOCTOR', first, last, hospital['hospital_id'])
+            doctor_id = self.take('core_doctor')
+            self.writer.add('core_doctor', (
+                doctor_id, f'GEN-DOC-{doctor_id}', f'Dr. {first} {last}', rng.choice(SPECIALIZATIONS),
+                self.phone(), f'doctor{doctor_id}@hospital.example.com', rng.randint(1, 35),
+                rng.choice('MF'), rng.choice(['8 AM - 4 PM', '9 AM - 5 PM', '2 PM - 10 PM']),
+                self.today - timedelta(days=rng.randint(30, 5000)), hospital['hospital_id'],
+                rng.choice(hospital['departments']), user_id,
+            ))
+            for qualification_id in rng.sample(qualification_ids, rng.randint(1, min(3, len(qualification_ids)))):
+                self.writer.add('core_doctorqualification', (
+                    self.take('core_doctorqualification'), doctor_id, qualification_id,
+                    rng.randint(1985, 2022), 'Dhaka Medical College',
+                ))
+            doctors.append((doctor_id, hospital))
+        # Shuffle so the most popular doctors are not all in the first hospitals
+        rng.shuffle(doctors)
+        return doctors
+
+    def medicines(self, count, manufacturer_ids, hospitals):
+        """Create medicines and stock batches (some already expired) in every pharmacy"""
+        rng = self.rng
+        medicine_ids = []
+        for _ in range(count):
+            medicine_id = self.take('core_medicine')
+            strength = rng.choice([5, 10, 20, 50, 100, 250, 500])
+            self.writer.add('core_medicine', (
+                medicine_id, f'{rng.choice(MEDICINE_STEMS)} {strength}mg #{medicine_id}', rng.choice(MEDICINE_TYPES),
+                f'{strength}mg as directed', None, rng.choice(manufacturer_ids),
+            ))
+            medicine_ids.append(medicine_id)
+
+        stocked = max(1, int(len(medicine_ids) * 0.6))
+        for hospital in hospitals:
+            for pharmacy_id in hospital['pharmacies']:
+                for medicine_id in rng.sample(medicine_ids, stocked):
+                    for _ in range(rng.randint(1, 3)):
+                        batch_id = self.take('core_pharmacymedicine')
+                        self.writer.add('core_pharmacymedicine', (
+                            batch_id, pharmacy_id, medicine_id, rng.randint(0, 500), self.money(1, 50),
+                            self.today + timedelta(days=rng.randint(-60, 720)), f'B{batch_id}',
+                            self.today - timedelta(days=rng.randint(0, 90)),
+                        ))
+        return medicine_ids
+
+    # ---- patients and their history ------------------------------------
+
+    def patients(self, count, appointments_per_patient, doctors, medicine_ids, service_types):
+        """
+        Create patients with emergency contacts and a skewed appointment history.
+
+        The number of appointments per patient is exponentially distributed
+        around the requested mean and doctors are picked with Zipf skew, so a
+        few doctors and patients own most rows, as in production.
+        """
+        rng = self.rng
+        writer = self.writer
+        doctor_weights = zipf_cum_weights(len(doctors))
+        rate = 1.0 / appointments_per_patient if appointments_per_patient else None
+
+        for _ in range(count):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            user_id = self.user('PATIENT', first, last)
+            patient_id = self.take('core_patient')
+            writer.add('core_patient', (
+                patient_id, f'GEN{patient_id:012d}', f'{first} {last}',
+                self.today - timedelta(days=rng.randint(365, 90 * 365)), rng.choice('MF'), self.phone(),
+                f'patient{patient_id}@example.com', f'{rng.randint(1, 300)} Road {rng.randint(1, 30)}, {rng.choice(CITIES)}',
+                rng.choice(['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']), None,
+                rng.choice(['Single', 'Married', 'Married', 'Divorced', 'Widowed']), rng.choice(CITIES),
+                self.person_name(), self.person_name(), user_id,
+            ))
+            for number in range(rng.randint(1, 2)):
+                writer.add('core_patientemergencycontact', (
+                    self.take('core_patientemergencycontact'), patient_id, self.person_name(), self.phone(),
+                    rng.choice(RELATIONSHIPS), number == 0,
+                ))
+
+            visits = int(rng.expovariate(rate) + 0.5) if rate else 0
+            for _ in range(visits):
+                doctor_id, hospital = rng.choices(doctors, cum_weights=doctor_weights)[0]
+                self.appointment(patient_id, doctor_id, hospital, medicine_ids, service_types)
+
+    def appointment(self, patient_id, doctor_id, hospital, medicine_ids, service_types):
+        rng = self.rng
+        writer = self.writer
+        # Mostly the past year, a tail into the past and a few weeks of future bookings
+        days_ago = min(int(rng.expovariate(1 / 120.0)), 1500) if rng.random() < 0.9 else -rng.randint(0, 30)
+        slot = rng.randint(0, 35)
+        moment = (self.now.replace(hour=9) - timedelta(days=days_ago)) + timedelta(minutes=15 * slot)
+        if moment > self.now:
+            status = 'Scheduled'
+        else:
+            status = rng.choices(['Completed', 'Cancelled', 'No-Show'], cum_weights=[80, 90, 100])[0]
+        completed = status == 'Completed'
+        visit_day = moment.date()
+
+        appointment_id = self.take('core_appointment')
+        writer.add('core_appointment', (
+            appointment_id, patient_id, doctor_id, status, rng.choice(REASONS),
+            rng.choice(DIAGNOSES) if completed else None,
+            visit_day + timedelta(days=rng.randint(7, 30)) if completed and rng.random() < 0.3 else None,
+            rng.choice(REASONS), rng.choice(['First Visit', 'Follow-up', 'Follow-up', 'Emergency']), moment,
+        ))
+        if not completed:
+            return
+
+        if rng.random() < 0.7:
+            self.bill(patient_id, service_types['Consultation'], visit_day, self.money(300, 2000))
+
+        if rng.random() < 0.6:
+            prescription_id = self.take('core_prescription')
+            writer.add('core_prescription', (
+                prescription_id, appointment_id, visit_day + timedelta(days=rng.randint(7, 90)),
+                rng.randint(0, 3), None,
+            ))
+            total = ZERO
+            for medicine_id in rng.sample(medicine_ids, min(len(medicine_ids), rng.randint(1, 4))):
+                quantity = rng.randint(5, 30)
+                writer.add('core_prescriptionitem', (
+                    self.take('core_prescriptionitem'), prescription_id, medicine_id, rng.choice(['250mg', '500mg', '10ml']),
+                    rng.choice(['Once daily', 'Twice daily', 'Thrice daily']), f'{rng.randint(3, 30)} days',
+                    quantity, rng.choice(['Before', 'After', 'With']), None,
+                ))
+                total += quantity * self.money(1, 20)
+            if hospital['pharmacies'] and rng.random() < 0.4:
+                bill_id = self.bill(patient_id, service_types['Pharmacy'], visit_day, total, status='Paid')
+                writer.add('core_pharmacybill', (
+                    self.take('core_pharmacybill'), rng.choice(hospital['pharmacies']), bill_id, visit_day, prescription_id,
+                ))
+
+        if hospital['labs'] and rng.random() < 0.25:
+            test_id = self.take('core_labtest')
+            test_cost = self.money(300, 5000)
+            if (self.now - moment).days > 3:
+                test_status = 'Completed'
+            else:
+                test_status = rng.choice(['Ordered', 'In Progress'])
+            writer.add('core_labtest', (
+                test_id, rng.choice(hospital['labs']), patient_id, rng.choice(TEST_TYPES),
+                'Within normal limits' if test_status == 'Completed' else None, doctor_id, None,
+                test_cost, moment, test_status,
+            ))
+            if test_status == 'Completed':
+                # Same transaction_id scheme as doctor.update_lab_test auto-billing
+                self.bill(patient_id, service_types['Laboratory'], visit_day, test_cost, transaction_id=f'LAB-{test_id}')
+
+    def bill(self, patient_id, service_type_id, bill_date, amount, status=None, transaction_id=None):
+        bill_id = self.take('core_bill')
+        if status is None:
+            status = 'Paid' if (self.today - bill_date).days > 30 else self.rng.choice(['Pending', 'Paid'])
+        self.writer.add('core_bill', (
+            bill_id, patient_id, service_type_id, bill_date, amount, status,
+            ZERO, ZERO, ZERO, bill_date + timedelta(days=30), transaction_id,
+        ))
+        return bill_id
+
+
+@click.command('generate-data')
+@click.option('--patients', default=1000, show_default=True, type=click.IntRange(min=0), help='Patients to create.')
+@click.option('--appointments-per-patient', default=5.0, show_default=True, type=click.FloatRange(min=0),
+              help='Mean appointments per patient (exponentially distributed).')
+@click.option('--hospitals', default=20, show_default=True, type=click.IntRange(min=1), help='Hospitals to create.')
+@click.option('--doctors', default=200, show_default=True, type=click.IntRange(min=1), help='Doctors to create.')
+@click.option('--medicines', default=300, show_default=True, type=click.IntRange(min=1), help='Medicines to create.')
+@click.option('--seed', default=42, show_default=True, type=int, help='Random seed.')
+@click.option('--chunk-size', default=5000, show_default=True, type=click.IntRange(min=1),
+              help='Rows buffered per table before a bulk INSERT.')
+@click.option('--password', default='password123', show_default=True,
+              help='Password for every generated user.')
+@with_appcontext
+def generate_data(patients, appointments_per_patient, hospitals, doctors, medicines, seed, chunk_size, password):
+    """Generate deterministic synthetic data for every table (for load testing)"""
+    click.echo(click.style(f'Generating data (seed {seed})...', fg='green'))
+
+    district_ids = reference_ids('core_district', 'district_id')
+    qualification_ids = reference_ids('core_qualification', 'qualification_id')
+    manufacturer_ids = reference_ids('core_manufacturer', 'manufacturer_id')
+    service_types = {
+        name: get_service_type_id(name, description)
+        for name, description in (('Consultation', 'Doctor consultation fee'),
+                                  ('Laboratory', 'Lab test services'),
+                                  ('Pharmacy', 'Medicine purchase'))
+    }
+
+    writer = ChunkedWriter(chunk_size)
+    # One hash shared by all generated users; pbkdf2 fits core_customuser.password
+    password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+    generator = Generator(random.Random(seed), writer, next_ids(), date.today(), password_hash)
+
+    click.echo('Creating hospitals...')
+    hospital_list = generator.hospitals(hospitals, district_ids)
+    click.echo('Creating doctors...')
+    doctor_list = generator.doctors(doctors, hospital_list, qualification_ids)
+    click.echo('Creating medicines and pharmacy stock...')
+    medicine_ids = generator.medicines(medicines, manufacturer_ids, hospital_list)
+    writer.flush()
+
+    click.echo('Creating patients and appointment history...')
+    with click.progressbar(length=patients, label='  patients') as progress:
+        for start in range(0, patients, 1000):
+            batch = min(1000, patients - start)
+            generator.patients(batch, appointments_per_patient, doctor_list, medicine_ids, service_types)
+            progress.update(batch)
+    writer.flush()
+
+    for table in FLUSH_ORDER:
+        if writer.counts[table]:
+            click.echo(f'  {table}: {writer.counts[table]} rows')
+    click.echo(click.style('Synthetic data generated successfully!', fg='green'))
+
+
+def register_command(app):
+    """Register the command with Flask app"""
+    app.cli.add_command(generate_data)
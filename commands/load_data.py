@@ -4,9 +4,77 @@ Usage: flask load-data
 """
 import click
 from flask.cli import with_appcontext
-from db_utils import get_or_create, execute_insert, fetch_one
+from db_utils import fetch_all, transaction
 from datetime import date
 
+HOSPITAL_COLUMNS = [
+    'name', 'address', 'phone', 'capacity', 'registration_no', 'email',
+    'emergency_services', 'established_date', 'website', 'district_id',
+]
+
+
+def existing_keys(tx, table, column, values):
+    """Set of values already present in table.column, in one query"""
+    if not values:
+        return set()
+    placeholders = ', '.join(['%s'] * len(values))
+    rows = tx.fetch_all(
+        f"SELECT {column} FROM {table} WHERE {column} IN ({placeholders})",
+        tuple(values)
+    )
+    return {row[column] for row in rows}
+
+
+def load_rows(table, key, columns, rows_data, label):
+    """
+    Insert the rows whose natural key is not in the table yet, in one transaction.
+    
+    Returns:
+        The rows that were inserted
+    """
+    with transaction() as tx:
+        existing = existing_keys(tx, table, key, [row[key] for row in rows_data])
+        new_rows = [row for row in rows_data if row[key] not in existing]
+        tx.insert_many(table, columns, [tuple(row[c] for c in columns) for row in new_rows])
+    for row in new_rows:
+        click.echo(f'  Created {label}: {row[key]}')
+    return new_rows
+
+
+def load_hospitals(subtype_table, subtype_columns, hospitals_data, label):
+    """
+    Insert hospitals and their subtype rows (joined-table inheritance) in one transaction.
+    
+    Base rows go in first; their ids are then read back by registration_no so
+    the subtype rows can be inserted in bulk as well.
+    """
+    with transaction() as tx:
+        registration_nos = [row['registration_no'] for row in hospitals_data]
+        existing = existing_keys(tx, 'core_hospital', 'registration_no', registration_nos)
+        new_rows = [row for row in hospitals_data if row['registration_no'] not in existing]
+        if not new_rows:
+            return []
+        tx.insert_many(
+            'core_hospital', HOSPITAL_COLUMNS,
+            [tuple(row[c] for c in HOSPITAL_COLUMNS) for row in new_rows]
+        )
+        
+        placeholders = ', '.join(['%s'] * len(new_rows))
+        ids = {
+            row['registration_no']: row['hospital_id']
+            for row in tx.fetch_all(
+                f"SELECT hospital_id, registration_no FROM core_hospital WHERE registration_no IN ({placeholders})",
+                tuple(row['registration_no'] for row in new_rows)
+            )
+        }
+        tx.insert_many(
+            subtype_table, ['hospital_id'] + subtype_columns,
+            [(ids[row['registration_no']],) + tuple(row[c] for c in subtype_columns) for row in new_rows]
+        )
+    for row in new_rows:
+        click.echo(f'  Created {label}: {row["name"]}')
+    return new_rows
+
 
 @click.command('load-data')
 @with_appcontext
@@ -24,16 +92,11 @@ def load_data():
         {'name': 'Khulna', 'division': 'Khulna'},
     ]
     
-    districts = {}
-    for district_data in districts_data:
-        district, created = get_or_create(
-            'core_district',
-            {'name': district_data['name']},
-            district_data
-        )
-        districts[district_data['name']] = district
-        if created:
-            click.echo(f'  Created district: {district["name"]}')
+    load_rows('core_district', 'name', ['name', 'division'], districts_data, 'district')
+    districts = {
+        row['name']: row
+        for row in fetch_all("SELECT district_id, name, division FROM core_district")
+    }
 
     # Create Service Types
     click.echo('Creating service types...')
@@ -45,14 +108,7 @@ def load_data():
         {'name': 'Surgery', 'description': 'Surgical procedures'},
     ]
     
-    for service_data in service_types_data:
-        service, created = get_or_create(
-            'core_servicetype',
-            {'name': service_data['name']},
-            service_data
-        )
-        if created:
-            click.echo(f'  Created service type: {service["name"]}')
+    load_rows('core_servicetype', 'name', ['name', 'description'], service_types_data, 'service type')
 
     # Create Public Hospitals
     click.echo('Creating public hospitals...')
@@ -134,40 +190,10 @@ def load_data():
         },
     ]
     
-    for hospital_data in public_hospitals_data:
-        existing = fetch_one(
-            "SELECT hospital_id FROM core_hospital WHERE registration_no = %s",
-            (hospital_data['registration_no'],)
-        )
-        
-        if not existing:
-            hospital_base_sql = """INSERT INTO core_hospital 
-                (name, address, phone, capacity, registration_no, email, emergency_services, 
-                 established_date, website, district_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
-            hospital_id = execute_insert(hospital_base_sql, (
-                hospital_data['name'],
-                hospital_data['address'],
-                hospital_data['phone'],
-                hospital_data['capacity'],
-                hospital_data['registration_no'],
-                hospital_data['email'],
-                hospital_data['emergency_services'],
-                hospital_data['established_date'],
-                hospital_data['website'],
-                hospital_data['district_id']
-            ))
-            
-            public_sql = """INSERT INTO core_publichospital 
-                (hospital_id, govt_funding, accreditation_level, subsidies)
-                VALUES (%s, %s, %s, %s)"""
-            execute_insert(public_sql, (
-                hospital_id,
-                hospital_data['govt_funding'],
-                hospital_data['accreditation_level'],
-                hospital_data['subsidies']
-            ))
-            click.echo(f'  Created public hospital: {hospital_data["name"]}')
+    load_hospitals(
+        'core_publichospital', ['govt_funding', 'accreditation_level', 'subsidies'],
+        public_hospitals_data, 'public hospital'
+    )
 
     # Create Private Hospitals
     click.echo('Creating private hospitals...')
@@ -244,39 +270,10 @@ def load_data():
         },
     ]
     
-    for hospital_data in private_hospitals_data:
-        existing = fetch_one(
-            "SELECT hospital_id FROM core_hospital WHERE registration_no = %s",
-            (hospital_data['registration_no'],)
-        )
-        
-        if not existing:
-            hospital_base_sql = """INSERT INTO core_hospital 
-                (name, address, phone, capacity, registration_no, email, emergency_services, 
-                 established_date, website, district_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
-            hospital_id = execute_insert(hospital_base_sql, (
-                hospital_data['name'],
-                hospital_data['address'],
-                hospital_data['phone'],
-                hospital_data['capacity'],
-                hospital_data['registration_no'],
-                hospital_data['email'],
-                hospital_data['emergency_services'],
-                hospital_data['established_date'],
-                hospital_data['website'],
-                hospital_data['district_id']
-            ))
-            
-            private_sql = """INSERT INTO core_privatehospital 
-                (hospital_id, owner_name, profit_margin)
-                VALUES (%s, %s, %s)"""
-            execute_insert(private_sql, (
-                hospital_id,
-                hospital_data['owner_name'],
-                hospital_data['profit_margin']
-            ))
-            click.echo(f'  Created private hospital: {hospital_data["name"]}')
+    load_hospitals(
+        'core_privatehospital', ['owner_name', 'profit_margin'],
+        private_hospitals_data, 'private hospital'
+    )
 
     # Create Qualifications
     click.echo('Creating qualifications...')
@@ -288,14 +285,7 @@ def load_data():
         {'code': 'FRCS', 'degree_name': 'Fellow of the Royal College of Surgeons'},
     ]
     
-    for qual_data in qualifications_data:
-        qual, created = get_or_create(
-            'core_qualification',
-            {'code': qual_data['code']},
-            qual_data
-        )
-        if created:
-            click.echo(f'  Created qualification: {qual["code"]}')
+    load_rows('core_qualification', 'code', ['code', 'degree_name'], qualifications_data, 'qualification')
 
     # Create Manufacturers
     click.echo('Creating manufacturers...')
@@ -320,14 +310,10 @@ def load_data():
         },
     ]
     
-    for mfg_data in manufacturers_data:
-        mfg, created = get_or_create(
-            'core_manufacturer',
-            {'license_no': mfg_data['license_no']},
-            mfg_data
-        )
-        if created:
-            click.echo(f'  Created manufacturer: {mfg["name"]}')
+    load_rows(
+        'core_manufacturer', 'license_no', ['name', 'phone', 'address', 'license_no'],
+        manufacturers_data, 'manufacturer'
+    )
 
     click.echo(click.style('Initial data loaded successfully!', fg='green'))
 
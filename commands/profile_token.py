@@ -0,0 +1,23 @@
+"""
+Flask CLI command to print a token that enables profiling for a request
+Usage: flask profile-token
+"""
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from profiling import make_profile_token
+
+
+@click.command('profile-token')
+@with_appcontext
+def profile_token():
+    """Print a signed header value that enables profiling for a request"""
+    header = current_app.config['PROFILING_HEADER']
+    hours = current_app.config['PROFILING_TOKEN_MAX_AGE'] / 3600
+    click.echo(f'{header}: {make_profile_token()}')
+    click.echo(f'(valid for {hours:g}h; PROFILING_ENABLED must be set)')
+
+
+def register_command(app):
+    """Register the command with Flask app"""
+    app.cli.add_command(profile_token)
@@ -19,6 +19,30 @@ class Config:
     DB_PASSWORD = os.environ.get('DB_PASSWORD') or ''
     DB_NAME = os.environ.get('DB_NAME') or 'healthcare_db'
     
+    # Connection pool used by db_utils (one connection per request)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or 5)
+    DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW') or 10)
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT') or 30)  # seconds to wait for a free connection
+    DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT') or 300)  # close connections idle longer
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') != '0'
+    
+    # Read replicas: comma-separated host[:port] list sharing DB_USER/DB_PASSWORD/DB_NAME.
+    # fetch_* helpers read from them during requests; empty sends everything to DB_HOST
+    DB_REPLICAS = os.environ.get('DB_REPLICAS') or ''
+    DB_REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG') or 5)  # seconds; more lagging replicas are skipped
+    DB_REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL') or 2)  # seconds between lag checks
+    DB_REPLICA_CONNECT_TIMEOUT = int(os.environ.get('DB_REPLICA_CONNECT_TIMEOUT') or 2)  # seconds
+    DB_READ_YOUR_WRITES = float(os.environ.get('DB_READ_YOUR_WRITES') or 5)  # seconds a session reads the primary after a write
+    
+    # db_utils.stream(): rows per fetch from the server-side cursor, and how long the
+    # server waits for a slow reader (e.g. an export download) before aborting
+    DB_STREAM_CHUNK_SIZE = int(os.environ.get('DB_STREAM_CHUNK_SIZE') or 1000)
+    DB_STREAM_NET_WRITE_TIMEOUT = int(os.environ.get('DB_STREAM_NET_WRITE_TIMEOUT') or 600)  # seconds
+    
+    # Query instrumentation ('db_utils.queries' log lines; X-DB-* response headers only in debug/testing)
+    DB_QUERY_INSTRUMENTATION = os.environ.get('DB_QUERY_INSTRUMENTATION', '1') != '0'
+    DB_N_PLUS_ONE_THRESHOLD = int(os.environ.get('DB_N_PLUS_ONE_THRESHOLD') or 3)  # same statement more often is flagged
+    
     # SQLAlchemy configuration
     SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -27,6 +51,49 @@ class Config:
         'pool_recycle': 300,
     }
     
+    # Doctor/patient profile cache used by role_required(..., with_profile=True)
+    PROFILE_CACHE_TTL = float(os.environ.get('PROFILE_CACHE_TTL') or 60)  # seconds
+    PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE') or 4096)
+    
+    # Flask-Login user cache (see services.users); also the longest a user changed in
+    # the database (e.g. deactivated) keeps the old role/flags in a logged-in session
+    USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL') or 300)  # seconds
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 10000)
+    
+    # Hospital cache used by admin views (see services.hospitals)
+    HOSPITAL_CACHE_TTL = float(os.environ.get('HOSPITAL_CACHE_TTL') or 600)  # seconds
+    HOSPITAL_CACHE_SIZE = int(os.environ.get('HOSPITAL_CACHE_SIZE') or 256)
+    
+    # Appointment list pagination (keyset, see services.pagination)
+    APPOINTMENTS_PAGE_SIZE = int(os.environ.get('APPOINTMENTS_PAGE_SIZE') or 25)
+    
+    # Maximum results returned by the doctor patient search endpoint
+    PATIENT_SEARCH_LIMIT = int(os.environ.get('PATIENT_SEARCH_LIMIT') or 20)
+    
+    # In-memory medicine catalog for prescription entry (see services.catalog); new or
+    # renamed medicines show up in each worker once its copy is older than the TTL
+    MEDICINE_CATALOG_TTL = float(os.environ.get('MEDICINE_CATALOG_TTL') or 300)  # seconds
+    MEDICINE_SEARCH_LIMIT = int(os.environ.get('MEDICINE_SEARCH_LIMIT') or 20)
+    
+    # Reference data (service types etc.) cached per worker (see services.reference)
+    REFERENCE_CACHE_TTL = float(os.environ.get('REFERENCE_CACHE_TTL') or 3600)  # seconds
+    
+    # Opt-in request profiling (see profiling.py); a request is profiled if it sends a
+    # token from `flask profile-token` in PROFILING_HEADER or is picked by the sample rate
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+    PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE') or 0.0)  # fraction of requests
+    PROFILING_INTERVAL = float(os.environ.get('PROFILING_INTERVAL') or 0.005)  # seconds between samples
+    PROFILING_HEADER = os.environ.get('PROFILING_HEADER') or 'X-Profile-Token'
+    PROFILING_TOKEN_MAX_AGE = int(os.environ.get('PROFILING_TOKEN_MAX_AGE') or 3600)  # seconds
+    PROFILES_DIR = os.environ.get('PROFILES_DIR') or str(BASE_DIR / 'profiles')
+    PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES') or 200)  # oldest profiles pruned first
+    
+    # Prometheus metrics at /metrics (see metrics.py); only served with a token, scrape
+    # with "Authorization: Bearer <token>"
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+    METRICS_MAX_FINGERPRINTS = int(os.environ.get('METRICS_MAX_FINGERPRINTS') or 200)  # query label cardinality cap
+    
     # Flask-Login configuration
     SESSION_COOKIE_SECURE = False  # Set to True in production with HTTPS
     SESSION_COOKIE_HTTPONLY = True
@@ -2,31 +2,675 @@
 Database utility functions for executing raw MySQL queries in Flask.
 Provides a centralized interface for database operations with proper connection management,
 parameterized queries, and error handling.
+
+Connections come from a per-application pool. Each request (or CLI app context)
+checks out at most one connection, keeps it on ``flask.g`` and hands it back to
+the pool at teardown, so every helper below shares it without opening a new
+TCP connection per query.
+
+Every statement is also recorded (fingerprint, wall time, row count, call
+site) so slow pages and N+1 query patterns can be spotted per request.
+
+With DB_REPLICAS configured, fetch_one/fetch_all/fetch_count run on a read
+replica during requests (one replica connection per request, chosen by
+replication lag), while writes and transaction() use the primary. A request
+that writes, and its session for DB_READ_YOUR_WRITES seconds afterwards,
+reads from the primary so users see their own changes. Without a usable
+replica every read falls back to the primary.
+
+stream() iterates large results (exports, reports) through an unbuffered
+server-side cursor on a connection of its own, so memory stays flat no
+matter how many rows the query returns.
 """
-from flask import current_app
-from config import Config
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from config import Config, BASE_DIR
+import json
+import logging
+import os
 import pymysql
-from typing import List, Dict, Any, Optional, Tuple
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+query_logger = logging.getLogger('db_utils.queries')
 
 
-def get_db_connection():
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available in time"""
+    pass
+
+
+def get_db_connection(app=None, host=None, port=None, connect_timeout=10):
     """
-    Get MySQL database connection using Flask's config.
+    Open a new MySQL database connection using Flask's config.
+    
+    Application code should not call this directly; it is the connection
+    factory used by the pool. Use get_request_connection() instead.
+    
+    Args:
+        app: Flask app whose config to use (defaults to current_app)
+        host: Server to connect to instead of DB_HOST (e.g. a replica)
+        port: Port to use instead of DB_PORT
+        connect_timeout: Seconds to wait for the TCP connection
     
     Returns:
         pymysql.connections.Connection: MySQL connection object
     """
+    config = (app or current_app).config
     return pymysql.connect(
-        host=current_app.config.get('DB_HOST', Config.DB_HOST),
-        port=current_app.config.get('DB_PORT', Config.DB_PORT),
-        user=current_app.config.get('DB_USER', Config.DB_USER),
-        password=current_app.config.get('DB_PASSWORD', Config.DB_PASSWORD),
-        database=current_app.config.get('DB_NAME', Config.DB_NAME),
+        host=host or config.get('DB_HOST', Config.DB_HOST),
+        port=port or config.get('DB_PORT', Config.DB_PORT),
+        user=config.get('DB_USER', Config.DB_USER),
+        password=config.get('DB_PASSWORD', Config.DB_PASSWORD),
+        database=config.get('DB_NAME', Config.DB_NAME),
         charset='utf8mb4',
-        cursorclass=pymysql.cursors.DictCursor
+        connect_timeout=connect_timeout,
+        # Helpers below build dicts from cursor.description themselves
+        cursorclass=pymysql.cursors.Cursor
+    )
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of MySQL connections.
+    
+    Keeps up to ``size`` idle connections and allows ``max_overflow`` extra
+    connections under load. Idle connections older than ``idle_timeout``
+    seconds are closed instead of reused, and ``pre_ping`` checks a connection
+    is still alive before handing it out.
+    """
+    
+    def __init__(self, creator, size=5, max_overflow=10, timeout=30.0,
+                 idle_timeout=300.0, pre_ping=True):
+        self._creator = creator
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self._idle = deque()  # (connection, returned_at), most recent on the right
+        self._checked_out = 0
+        self._cond = threading.Condition()
+    
+    def acquire(self):
+        """
+        Check out a connection, waiting up to ``timeout`` seconds for one.
+        
+        Raises:
+            PoolTimeoutError: If the pool is exhausted for longer than timeout
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while not self._idle and self._checked_out >= self.size + self.max_overflow:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeoutError(
+                        f"Connection pool exhausted ({self.size} + {self.max_overflow} overflow "
+                        f"in use), timed out after {self.timeout}s"
+                    )
+                self._cond.wait(remaining)
+            candidates = []
+            if self._idle:
+                candidates.append(self._idle.pop())
+            self._checked_out += 1
+        
+        # Validate outside the lock; the slot is already reserved for us
+        try:
+            for conn, returned_at in candidates:
+                if self._is_usable(conn, returned_at):
+                    return conn
+                self._close_quietly(conn)
+            return self._creator()
+        except Exception:
+            with self._cond:
+                self._checked_out -= 1
+                self._cond.notify()
+            raise
+    
+    def release(self, conn):
+        """Return a connection to the pool, closing it if the pool is full"""
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            self._checked_out -= 1
+            while self._idle and now - self._idle[0][1] > self.idle_timeout:
+                expired.append(self._idle.popleft()[0])
+            if getattr(conn, 'open', False) and len(self._idle) < self.size:
+                self._idle.append((conn, now))
+            else:
+                expired.append(conn)
+            self._cond.notify()
+        for stale in expired:
+            self._close_quietly(stale)
+    
+    def discard(self, conn):
+        """Close a checked-out connection that must not be reused"""
+        self._close_quietly(conn)
+        with self._cond:
+            self._checked_out -= 1
+            self._cond.notify()
+    
+    def dispose(self):
+        """Close all idle connections"""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+        for conn in idle:
+            self._close_quietly(conn)
+    
+    def stats(self) -> Dict[str, int]:
+        """Snapshot of pool usage"""
+        with self._cond:
+            checked_out = self._checked_out
+            idle = len(self._idle)
+        return {
+            'size': self.size,
+            'max_overflow': self.max_overflow,
+            'checked_out': checked_out,
+            'idle': idle,
+            'overflow': max(0, checked_out + idle - self.size),
+        }
+    
+    def _is_usable(self, conn, returned_at):
+        if not getattr(conn, 'open', False):
+            return False
+        if time.monotonic() - returned_at > self.idle_timeout:
+            return False
+        if self.pre_ping:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+    
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+def parse_replicas(value, default_port: int) -> List[Tuple[str, int]]:
+    """
+    Parse DB_REPLICAS ("host[:port],host[:port]" or a list of such strings).
+    
+    Returns:
+        List of (host, port) tuples
+    """
+    if isinstance(value, str):
+        value = value.split(',')
+    replicas = []
+    for entry in value or ():
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, port = entry.rpartition(':') if ':' in entry else (entry, '', '')
+        replicas.append((host, int(port) if port else default_port))
+    return replicas
+
+
+def replica_lag(conn) -> Optional[float]:
+    """
+    Seconds a replica is behind its source.
+    
+    Returns:
+        The replication delay; 0.0 for a server that is not replicating
+        (e.g. a read-only copy); None if replication is stopped or broken
+    """
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except pymysql.err.ProgrammingError:
+            # MySQL < 8.0.22 and MariaDB < 10.5.1
+            cursor.execute("SHOW SLAVE STATUS")
+        row = cursor.fetchone()
+        if row is None:
+            return 0.0
+        status = dict(zip((col[0] for col in cursor.description), row))
+    lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+    return None if lag is None else float(lag)
+
+
+class Replica:
+    """One read replica: its pool plus the last known replication lag"""
+    
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.lag: Optional[float] = None
+        self.healthy = False
+        self.checked_at = float('-inf')
+        self._check_lock = threading.Lock()
+    
+    def mark_down(self):
+        """Skip this replica until its next lag check"""
+        self.healthy = False
+        self.checked_at = time.monotonic()
+
+
+class ReplicaSet:
+    """
+    Read replicas with lag-aware selection.
+    
+    Each replica's lag is re-read at most every ``check_interval`` seconds, by
+    whichever request asks first (others keep using the last value). Replicas
+    that are unreachable, not replicating or more than ``max_lag`` seconds
+    behind are skipped; among the rest the least lagged, then least busy, wins.
+    """
+    
+    def __init__(self, replicas: List[Replica], max_lag=5.0, check_interval=2.0, lag_probe=replica_lag):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._lag_probe = lag_probe
+    
+    def choose(self) -> Optional[Replica]:
+        """Best replica to read from, or None if the primary must be used"""
+        now = time.monotonic()
+        for replica in self.replicas:
+            if now - replica.checked_at >= self.check_interval:
+                self._check(replica, now)
+        eligible = [
+            replica for replica in self.replicas
+            if replica.healthy and replica.lag is not None and replica.lag <= self.max_lag
+        ]
+        if not eligible:
+            return None
+        return min(eligible, key=lambda replica: (replica.lag, replica.pool.stats()['checked_out']))
+    
+    def _check(self, replica: Replica, now: float):
+        if not replica._check_lock.acquire(blocking=False):
+            return
+        try:
+            replica.checked_at = now
+            try:
+                conn = replica.pool.acquire()
+            except Exception:
+                replica.healthy = False
+                return
+            try:
+                lag = self._lag_probe(conn)
+            except Exception:
+                replica.pool.discard(conn)
+                replica.healthy = False
+                return
+            replica.pool.release(conn)
+            replica.lag = lag
+            replica.healthy = lag is not None
+        finally:
+            replica._check_lock.release()
+    
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Lag, health and pool usage per replica"""
+        return {
+            replica.name: {'lag': replica.lag, 'healthy': replica.healthy, **replica.pool.stats()}
+            for replica in self.replicas
+        }
+    
+    def dispose(self):
+        for replica in self.replicas:
+            replica.pool.dispose()
+
+
+def _make_pool(app, creator):
+    return ConnectionPool(
+        creator,
+        size=app.config.get('DB_POOL_SIZE', Config.DB_POOL_SIZE),
+        max_overflow=app.config.get('DB_POOL_MAX_OVERFLOW', Config.DB_POOL_MAX_OVERFLOW),
+        timeout=app.config.get('DB_POOL_TIMEOUT', Config.DB_POOL_TIMEOUT),
+        idle_timeout=app.config.get('DB_POOL_IDLE_TIMEOUT', Config.DB_POOL_IDLE_TIMEOUT),
+        pre_ping=app.config.get('DB_POOL_PRE_PING', Config.DB_POOL_PRE_PING),
     )
 
 
+def init_app(app):
+    """
+    Create the connection pools (primary and any DB_REPLICAS) for an
+    application and register the teardown handler that returns request
+    connections to them.
+    """
+    app.extensions['db_pool'] = _make_pool(app, lambda: get_db_connection(app))
+    
+    replicas = parse_replicas(app.config.get('DB_REPLICAS', Config.DB_REPLICAS),
+                              app.config.get('DB_PORT', Config.DB_PORT))
+    if replicas:
+        connect_timeout = app.config.get('DB_REPLICA_CONNECT_TIMEOUT', Config.DB_REPLICA_CONNECT_TIMEOUT)
+        app.extensions['db_replicas'] = ReplicaSet(
+            [
+                Replica(f'{host}:{port}', _make_pool(
+                    app, lambda host=host, port=port: get_db_connection(app, host, port, connect_timeout)))
+                for host, port in replicas
+            ],
+            max_lag=app.config.get('DB_REPLICA_MAX_LAG', Config.DB_REPLICA_MAX_LAG),
+            check_interval=app.config.get('DB_REPLICA_CHECK_INTERVAL', Config.DB_REPLICA_CHECK_INTERVAL),
+        )
+    app.teardown_appcontext(release_request_connection)
+    app.after_request(_emit_query_report)
+
+
+def get_pool() -> ConnectionPool:
+    """Return the connection pool of the current application"""
+    try:
+        return current_app.extensions['db_pool']
+    except KeyError:
+        raise RuntimeError('db_utils.init_app(app) must be called before using the database')
+
+
+def get_request_connection():
+    """
+    Get the connection bound to the current app context, checking one out of
+    the pool on first use.
+    
+    Returns:
+        pymysql.connections.Connection: MySQL connection object
+    """
+    conn = g.get('_db_conn')
+    if conn is None:
+        conn = get_pool().acquire()
+        g._db_conn = conn
+    return conn
+
+
+# Session key holding the time until which reads go to the primary
+READ_YOUR_WRITES_KEY = '_db_primary_until'
+
+
+def _replica_reads_allowed() -> bool:
+    # Replicas only serve requests that have not written, in sessions that have not written recently;
+    # CLI commands and other non-request contexts always read their own writes from the primary
+    if not has_request_context() or g.get('_db_wrote'):
+        return False
+    return session.get(READ_YOUR_WRITES_KEY, 0) <= time.time()
+
+
+def get_read_connection():
+    """
+    Connection for a read-only statement: the current request's replica
+    connection when replicas are configured and safe to use, otherwise the
+    primary connection from get_request_connection().
+    """
+    replicas = current_app.extensions.get('db_replicas')
+    if replicas is None or not _replica_reads_allowed():
+        return get_request_connection()
+    bound = g.get('_db_read')
+    if bound is None:
+        replica = replicas.choose()
+        if replica is None:
+            return get_request_connection()
+        try:
+            conn = replica.pool.acquire()
+        except Exception:
+            replica.mark_down()
+            return get_request_connection()
+        bound = g._db_read = (replica, conn)
+    return bound[1]
+
+
+def _drop_read_connection(conn) -> bool:
+    """Discard conn if it is the request's replica connection (after an error); True if it was"""
+    bound = g.get('_db_read')
+    if bound is None or bound[1] is not conn:
+        return False
+    del g._db_read
+    replica, _ = bound
+    replica.pool.discard(conn)
+    replica.mark_down()
+    return True
+
+
+def _mark_write():
+    """Route the rest of this request, and the session for a while, to the primary"""
+    g._db_wrote = True
+    if 'db_replicas' in current_app.extensions and has_request_context():
+        window = current_app.config.get('DB_READ_YOUR_WRITES', Config.DB_READ_YOUR_WRITES)
+        session[READ_YOUR_WRITES_KEY] = time.time() + window
+
+
+def _return_to_pool(pool, conn):
+    try:
+        if conn.open:
+            conn.rollback()
+    except Exception:
+        pool.discard(conn)
+        return
+    pool.release(conn)
+
+
+def release_request_connection(exc=None):
+    """
+    Return the app context's connections (primary and replica) to their pools.
+    Any uncommitted work is rolled back so the next user gets a clean session.
+    """
+    bound = g.pop('_db_read', None)
+    if bound is not None:
+        replica, conn = bound
+        _return_to_pool(replica.pool, conn)
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        _return_to_pool(get_pool(), conn)
+
+
+# ==================== Query Instrumentation ====================
+QueryRecord = namedtuple('QueryRecord', ['fingerprint', 'sql', 'duration_ms', 'rows', 'call_site'])
+
+_DB_UTILS_FILE = os.path.abspath(__file__)
+_listeners: List[List[QueryRecord]] = []
+_listeners_lock = threading.Lock()
+# Process-wide callbacks (e.g. metrics), see add_query_observer()
+_query_observers = []
+
+# rowcount of an unbuffered (SSCursor) result until it is fully read, as in MySQLdb
+_UNKNOWN_ROWCOUNT = 2 ** 64 - 1
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|%\([^)]+\)s")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(sql: str) -> str:
+    """
+    Normalize a SQL statement so that queries differing only in literal
+    values share one fingerprint.
+    
+    Args:
+        sql: SQL query string
+    
+    Returns:
+        Normalized statement, e.g. "SELECT * FROM core_doctor WHERE user_id = ?"
+    """
+    normalized = _STRING_LITERAL.sub('?', sql)
+    normalized = _PLACEHOLDER.sub('?', normalized)
+    normalized = _NUMBER_LITERAL.sub('?', normalized)
+    normalized = _IN_LIST.sub('IN (...)', normalized)
+    return _WHITESPACE.sub(' ', normalized).strip()
+
+
+@lru_cache(maxsize=512)
+def _relative_path(filename):
+    try:
+        return os.path.relpath(filename, BASE_DIR)
+    except ValueError:
+        return filename
+
+
+def _call_site() -> str:
+    """First stack frame outside this module, as 'path:line in function'"""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_code.co_filename == _DB_UTILS_FILE:
+        frame = frame.f_back
+    if frame is None:
+        return 'unknown'
+    code = frame.f_code
+    return f"{_relative_path(code.co_filename)}:{frame.f_lineno} in {code.co_name}"
+
+
+def _record(sql, duration, rows):
+    """Store a query record on the current app context and any active captures"""
+    if not current_app.config.get('DB_QUERY_INSTRUMENTATION', Config.DB_QUERY_INSTRUMENTATION) and not _listeners:
+        return
+    record = QueryRecord(fingerprint(sql), sql, duration * 1000.0, rows, _call_site())
+    queries = g.get('_db_queries')
+    if queries is None:
+        queries = g._db_queries = []
+    queries.append(record)
+    for listener in _listeners:
+        listener.append(record)
+
+
+def add_query_observer(observer) -> None:
+    """
+    Call observer(sql, duration_seconds) after every statement, in any context.
+    
+    Unlike the per-request records this is always on, so observers must be cheap.
+    """
+    _query_observers.append(observer)
+
+
+def _execute(cursor, sql, params=None):
+    """Execute a statement on cursor and record it for instrumentation"""
+    start = time.perf_counter()
+    try:
+        return cursor.execute(sql, params or ())
+    finally:
+        duration = time.perf_counter() - start
+        rows = cursor.rowcount
+        _record(sql, duration, -1 if rows == _UNKNOWN_ROWCOUNT else rows)
+        for observer in _query_observers:
+            observer(sql, duration)
+
+
+def _executemany(cursor, sql, rows):
+    """Execute a statement for many parameter rows and record it once"""
+    start = time.perf_counter()
+    try:
+        return cursor.executemany(sql, rows)
+    finally:
+        duration = time.perf_counter() - start
+        _record(sql, duration, cursor.rowcount)
+        for observer in _query_observers:
+            observer(sql, duration)
+
+
+def get_request_queries() -> List[QueryRecord]:
+    """Queries recorded so far in the current app context"""
+    if not has_app_context():
+        return []
+    return g.get('_db_queries') or []
+
+
+def summarize_queries(records: List[QueryRecord], threshold: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Summarize query records and flag repeated fingerprints (likely N+1).
+    
+    Args:
+        records: Query records, e.g. from get_request_queries()
+        threshold: A fingerprint executed more than this many times is flagged
+    
+    Returns:
+        Dictionary with count, total time and the flagged fingerprints
+    """
+    if threshold is None:
+        threshold = current_app.config.get('DB_N_PLUS_ONE_THRESHOLD', Config.DB_N_PLUS_ONE_THRESHOLD)
+    counts = Counter(record.fingerprint for record in records)
+    call_sites = {}
+    for record in records:
+        call_sites.setdefault(record.fingerprint, record.call_site)
+    repeated = [
+        {'fingerprint': fp, 'count': count, 'call_site': call_sites[fp]}
+        for fp, count in counts.most_common()
+        if count > threshold
+    ]
+    return {
+        'count': len(records),
+        'time_ms': round(sum(record.duration_ms for record in records), 3),
+        'rows': sum(max(record.rows, 0) for record in records),
+        'n_plus_one': repeated,
+    }
+
+
+def _emit_query_report(response):
+    """
+    after_request hook: log the request's query summary, and expose it as
+    response headers when the app runs in debug or testing mode (they reveal
+    database internals, so production clients never see them).
+    """
+    records = get_request_queries()
+    if not records:
+        return response
+    summary = summarize_queries(records)
+    if current_app.debug or current_app.testing:
+        response.headers['X-DB-Query-Count'] = str(summary['count'])
+        response.headers['X-DB-Query-Time-Ms'] = f"{summary['time_ms']:.3f}"
+        response.headers.add('Server-Timing', f'db;dur={summary["time_ms"]:.3f};desc="{summary["count"]} queries"')
+        if summary['n_plus_one']:
+            response.headers['X-DB-N-Plus-One'] = str(len(summary['n_plus_one']))
+    
+    level = logging.WARNING if summary['n_plus_one'] else logging.INFO
+    if query_logger.isEnabledFor(level):
+        query_logger.log(level, json.dumps({
+            'event': 'db_queries',
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': summary['count'],
+            'db_time_ms': summary['time_ms'],
+            'rows': summary['rows'],
+            'n_plus_one': summary['n_plus_one'],
+            'statements': [
+                {'fingerprint': r.fingerprint, 'ms': round(r.duration_ms, 3), 'rows': r.rows, 'call_site': r.call_site}
+                for r in records
+            ],
+        }, default=str))
+    return response
+
+
+@contextmanager
+def capture_queries():
+    """
+    Collect every query executed (in any app context) while the block runs.
+    
+    Usage:
+        with capture_queries() as queries:
+            client.get('/doctor/dashboard')
+        assert len(queries) <= 6
+    """
+    captured: List[QueryRecord] = []
+    with _listeners_lock:
+        _listeners.append(captured)
+    try:
+        yield captured
+    finally:
+        with _listeners_lock:
+            _listeners.remove(captured)
+
+
+@contextmanager
+def assert_max_queries(limit: int):
+    """
+    Fail with a per-fingerprint breakdown if the block runs more than limit queries.
+    
+    Usage:
+        with assert_max_queries(8):
+            client.get('/doctor/appointments/1')
+    """
+    with capture_queries() as captured:
+        yield captured
+    if len(captured) > limit:
+        counts = Counter(record.fingerprint for record in captured)
+        breakdown = '\n'.join(f"  {count}x {fp}" for fp, count in counts.most_common())
+        raise AssertionError(f"Expected at most {limit} queries, ran {len(captured)}:\n{breakdown}")
+
+
 def dict_fetch_all(cursor) -> List[Dict[str, Any]]:
     """
     Convert cursor results to list of dictionaries.
@@ -41,6 +685,36 @@ def dict_fetch_all(cursor) -> List[Dict[str, Any]]:
     return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
 
+def _one_dict(cursor) -> Optional[Dict[str, Any]]:
+    row = cursor.fetchone()
+    if row:
+        columns = [col[0] for col in cursor.description]
+        return dict(zip(columns, row))
+    return None
+
+
+def _first_value(cursor) -> int:
+    result = cursor.fetchone()
+    if result:
+        return result[0]
+    return 0
+
+
+def _read(sql, params, extract):
+    """Run a SELECT on the read connection; retry on the primary if a replica fails"""
+    conn = get_read_connection()
+    try:
+        with conn.cursor() as cursor:
+            _execute(cursor, sql, params)
+            return extract(cursor)
+    except pymysql.err.OperationalError:
+        if not _drop_read_connection(conn):
+            raise
+    with get_request_connection().cursor() as cursor:
+        _execute(cursor, sql, params)
+        return extract(cursor)
+
+
 def fetch_one(sql: str, params: Optional[Tuple] = None) -> Optional[Dict[str, Any]]:
     """
     Execute SELECT query and return single row.
@@ -52,17 +726,7 @@ def fetch_one(sql: str, params: Optional[Tuple] = None) -> Optional[Dict[str, An
     Returns:
         Dictionary representing single row, or None if not found
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(sql, params or ())
-            row = cursor.fetchone()
-            if row:
-                columns = [col[0] for col in cursor.description]
-                return dict(zip(columns, row))
-            return None
-    finally:
-        conn.close()
+    return _read(sql, params, _one_dict)
 
 
 def fetch_all(sql: str, params: Optional[Tuple] = None) -> List[Dict[str, Any]]:
@@ -76,13 +740,7 @@ def fetch_all(sql: str, params: Optional[Tuple] = None) -> List[Dict[str, Any]]:
     Returns:
         List of dictionaries representing rows
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(sql, params or ())
-            return dict_fetch_all(cursor)
-    finally:
-        conn.close()
+    return _read(sql, params, dict_fetch_all)
 
 
 def fetch_count(sql: str, params: Optional[Tuple] = None) -> int:
@@ -96,22 +754,120 @@ def fetch_count(sql: str, params: Optional[Tuple] = None) -> int:
     Returns:
         Integer count value
     """
-    conn = get_db_connection()
+    return _read(sql, params, _first_value)
+
+
+def _stream_connection():
+    """(pool, connection) to stream from: a replica when this request may read from one, else the primary"""
+    replicas = current_app.extensions.get('db_replicas')
+    if replicas is not None and _replica_reads_allowed():
+        replica = replicas.choose()
+        if replica is not None:
+            try:
+                return replica.pool, replica.pool.acquire()
+            except Exception:
+                replica.mark_down()
+    pool = get_pool()
+    return pool, pool.acquire()
+
+
+def stream(sql: str, params: Optional[Tuple] = None, chunk_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Execute SELECT query and yield its rows one at a time.
+    
+    Rows are read from an unbuffered server-side cursor chunk_size at a time,
+    so memory use does not grow with the result. The query runs on a pool
+    connection of its own, checked out on the first next() and tied to the
+    generator: it goes back to the pool once every row has been read, and is
+    closed (not reused, since unread rows are still pending on it) if the
+    generator is closed, garbage collected or raises before the end.
+    
+    Being a separate connection it does not see uncommitted writes of an open
+    transaction(). Outside one, the app context's own connections are handed
+    back to their pools first (later helpers check out new ones), so a slow
+    download holds a single connection rather than two. To stream from a
+    response, wrap the consuming generator in flask.stream_with_context so
+    the app context outlives the view.
+    
+    Args:
+        sql: SQL query string with %s placeholders
+        params: Tuple or list of parameters for query
+        chunk_size: Rows fetched per round trip (defaults to DB_STREAM_CHUNK_SIZE)
+    
+    Yields:
+        Dictionaries representing rows
+    """
+    chunk_size = chunk_size or current_app.config.get('DB_STREAM_CHUNK_SIZE', Config.DB_STREAM_CHUNK_SIZE)
+    if not in_transaction():
+        release_request_connection()
+    pool, conn = _stream_connection()
+    finished = False
     try:
+        # The server aborts an unbuffered result if we stop reading for net_write_timeout
+        # seconds, which a slow download can easily do with the default of 60. The old
+        # value is restored before the connection goes back to the pool
+        timeout = current_app.config.get('DB_STREAM_NET_WRITE_TIMEOUT', Config.DB_STREAM_NET_WRITE_TIMEOUT)
         with conn.cursor() as cursor:
-            cursor.execute(sql, params or ())
-            result = cursor.fetchone()
-            if result:
-                return result[0]
-            return 0
+            _execute(cursor, "SELECT @@SESSION.net_write_timeout")
+            previous_timeout = _first_value(cursor)
+            _execute(cursor, "SET SESSION net_write_timeout = %s", (timeout,))
+        
+        # Not a `with` block: SSCursor.close() reads every remaining row, which an
+        # abandoned stream must not do; its connection is closed instead
+        cursor = conn.cursor(pymysql.cursors.SSCursor)
+        _execute(cursor, sql, params)
+        columns = [col[0] for col in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
+        cursor.close()
+        finished = True
     finally:
-        conn.close()
+        if finished:
+            try:
+                with conn.cursor() as cursor:
+                    _execute(cursor, "SET SESSION net_write_timeout = %s", (previous_timeout,))
+            except Exception:
+                pool.discard(conn)
+            else:
+                _return_to_pool(pool, conn)
+        else:
+            pool.discard(conn)
+
+
+def in_transaction() -> bool:
+    """True inside a transaction() block of the current app context"""
+    return g.get('_db_tx_depth', 0) > 0
+
+
+def _write(sql, params) -> Tuple[int, int]:
+    """Run one write on the primary; commits on its own unless inside transaction()"""
+    conn = get_request_connection()
+    _mark_write()
+    if in_transaction():
+        # The enclosing transaction() commits, or rolls back if this raises
+        with conn.cursor() as cursor:
+            _execute(cursor, sql, params)
+            return cursor.rowcount, cursor.lastrowid
+    try:
+        with conn.cursor() as cursor:
+            _execute(cursor, sql, params)
+            conn.commit()
+            return cursor.rowcount, cursor.lastrowid
+    except Exception as e:
+        conn.rollback()
+        raise e
 
 
 def execute_update(sql: str, params: Optional[Tuple] = None) -> int:
     """
     Execute INSERT, UPDATE, or DELETE query.
     
+    Commits immediately, unless called inside transaction().
+    
     Args:
         sql: SQL query string with %s placeholders
         params: Tuple or list of parameters for query
@@ -119,23 +875,15 @@ def execute_update(sql: str, params: Optional[Tuple] = None) -> int:
     Returns:
         Number of affected rows
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(sql, params or ())
-            conn.commit()
-            return cursor.rowcount
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
+    return _write(sql, params)[0]
 
 
 def execute_insert(sql: str, params: Optional[Tuple] = None) -> int:
     """
     Execute INSERT query and return the last inserted ID.
     
+    Commits immediately, unless called inside transaction().
+    
     Args:
         sql: INSERT SQL query string with %s placeholders
         params: Tuple or list of parameters for query
@@ -143,17 +891,26 @@ def execute_insert(sql: str, params: Optional[Tuple] = None) -> int:
     Returns:
         Last inserted ID (primary key)
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cursor:
-            cursor.execute(sql, params or ())
-            conn.commit()
-            return cursor.lastrowid
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
+    return _write(sql, params)[1]
+
+
+def execute_write(sql: str, params: Optional[Tuple] = None) -> Tuple[int, int]:
+    """
+    Execute INSERT, UPDATE or DELETE and return both affected rows and last ID.
+    
+    Useful for conditional writes (``... WHERE stock_quantity >= %s``) where the
+    affected-row count says whether the write happened, and for UPDATEs that set
+    ``pk = LAST_INSERT_ID(pk)`` to report which row they touched. Commits
+    immediately, unless called inside transaction().
+    
+    Args:
+        sql: SQL query string with %s placeholders
+        params: Tuple or list of parameters for query
+    
+    Returns:
+        Tuple of (affected rows, last inserted/touched ID)
+    """
+    return _write(sql, params)
 
 
 def execute_transaction(queries: List[Tuple[str, Optional[Tuple]]]) -> List[Any]:
@@ -161,6 +918,9 @@ def execute_transaction(queries: List[Tuple[str, Optional[Tuple]]]) -> List[Any]
     Execute multiple queries in a single transaction.
     Rolls back all changes if any query fails.
     
+    For statements that depend on earlier results (e.g. an INSERT that needs
+    the previous lastrowid) use transaction() instead.
+    
     Args:
         queries: List of (sql, params) tuples
     
@@ -170,23 +930,148 @@ def execute_transaction(queries: List[Tuple[str, Optional[Tuple]]]) -> List[Any]
     Raises:
         Exception: If any query fails, transaction is rolled back
     """
-    conn = get_db_connection()
     results = []
-    try:
+    with transaction() as tx:
+        for sql, params in queries:
+            if sql.strip().upper().startswith('SELECT'):
+                results.append(tx.fetch_all(sql, params))
+            else:
+                results.append(tx.execute(sql, params))
+    return results
+
+
+class Transaction:
+    """
+    Statement helpers bound to one connection inside transaction().
+    Nothing is committed until the outermost transaction() block exits cleanly.
+    """
+    
+    def __init__(self, conn):
+        self.conn = conn
+    
+    def execute(self, sql: str, params: Optional[Tuple] = None) -> int:
+        """Execute a statement and return the number of affected rows"""
+        with self.conn.cursor() as cursor:
+            _execute(cursor, sql, params)
+            return cursor.rowcount
+    
+    def insert(self, sql: str, params: Optional[Tuple] = None) -> int:
+        """Execute an INSERT and return the last inserted ID"""
+        with self.conn.cursor() as cursor:
+            _execute(cursor, sql, params)
+            return cursor.lastrowid
+    
+    def insert_many(self, table: str, columns: List[str], rows: List[Tuple]) -> int:
+        """
+        Insert many rows with multi-row INSERT statements.
+        
+        PyMySQL's executemany() folds the rows into as few
+        ``INSERT ... VALUES (...), (...)`` statements as fit max_allowed_packet.
+        
+        Returns:
+            Number of rows inserted
+        """
+        if not rows:
+            return 0
+        placeholders = ', '.join(['%s'] * len(columns))
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+        with self.conn.cursor() as cursor:
+            _executemany(cursor, sql, rows)
+            return cursor.rowcount
+    
+    def fetch_one(self, sql: str, params: Optional[Tuple] = None) -> Optional[Dict[str, Any]]:
+        """Execute a SELECT and return a single row as a dict (or None)"""
+        with self.conn.cursor() as cursor:
+            _execute(cursor, sql, params)
+            return _one_dict(cursor)
+    
+    def fetch_all(self, sql: str, params: Optional[Tuple] = None) -> List[Dict[str, Any]]:
+        """Execute a SELECT and return all rows as dicts"""
+        with self.conn.cursor() as cursor:
+            _execute(cursor, sql, params)
+            return dict_fetch_all(cursor)
+    
+    def savepoint(self):
+        """
+        Nested scope that can be rolled back on its own.
+        
+        Usage:
+            try:
+                with tx.savepoint():
+                    tx.execute("INSERT INTO core_doctorqualification ...", (...))
+            except pymysql.err.IntegrityError:
+                pass  # only the savepoint's statements are undone
+        """
+        return transaction()
+
+
+@contextmanager
+def transaction():
+    """
+    Run several statements atomically on the request connection, committing once.
+    
+    Inside the block the module-level helpers (fetch_one, execute_insert,
+    get_or_create, ...) use the same connection and do not commit, so they
+    can be mixed with the ``tx`` methods and fed earlier results such as a
+    lastrowid. The block commits when it exits and rolls back if it raises.
+    
+    A nested transaction() (or tx.savepoint()) becomes a SAVEPOINT: if the
+    inner block raises, only its statements are rolled back and the
+    exception propagates to the caller.
+    
+    Usage:
+        with transaction() as tx:
+            user_id = tx.insert("INSERT INTO core_customuser ...", (...))
+            tx.insert("INSERT INTO core_patient (..., user_id) VALUES (..., %s)", (..., user_id))
+    """
+    conn = get_request_connection()
+    _mark_write()
+    depth = g.get('_db_tx_depth', 0)
+    
+    if depth:
+        name = f'sp_{depth}'
         with conn.cursor() as cursor:
-            for sql, params in queries:
-                cursor.execute(sql, params or ())
-                if sql.strip().upper().startswith('SELECT'):
-                    results.append(dict_fetch_all(cursor))
-                else:
-                    results.append(cursor.rowcount)
+            _execute(cursor, f'SAVEPOINT {name}')
+        g._db_tx_depth = depth + 1
+        try:
+            yield Transaction(conn)
+        except Exception:
+            with conn.cursor() as cursor:
+                _execute(cursor, f'ROLLBACK TO SAVEPOINT {name}')
+            raise
+        else:
+            with conn.cursor() as cursor:
+                _execute(cursor, f'RELEASE SAVEPOINT {name}')
+        finally:
+            g._db_tx_depth = depth
+        return
+    
+    conn.begin()
+    g._db_tx_depth = 1
+    try:
+        yield Transaction(conn)
         conn.commit()
-        return results
-    except Exception as e:
+    except Exception:
         conn.rollback()
-        raise e
+        raise
     finally:
-        conn.close()
+        g._db_tx_depth = 0
+
+
+def bulk_insert(table: str, columns: List[str], rows: List[Tuple]) -> int:
+    """
+    Insert many rows in one transaction using multi-row INSERT statements.
+    
+    Args:
+        table: Table name (e.g., 'core_district')
+        columns: Column names, in the order of each row tuple
+        rows: Parameter tuples, one per row
+    
+    Returns:
+        Number of rows inserted
+    """
+    with transaction() as tx:
+        return tx.insert_many(table, columns, rows)
 
 
 def check_exists(sql: str, params: Optional[Tuple] = None) -> bool:
@@ -204,11 +1089,77 @@ def check_exists(sql: str, params: Optional[Tuple] = None) -> bool:
     return result is not None
 
 
+@lru_cache(maxsize=None)
+def table_keys(table: str) -> Tuple[str, Tuple[frozenset, ...]]:
+    """
+    Primary key name and unique column sets of a table, read from models.py.
+    
+    Returns:
+        Tuple of (pk column name, tuple of frozensets of unique column names)
+    """
+    from sqlalchemy import UniqueConstraint
+    from models import db
+    
+    model_table = db.metadata.tables[table]
+    pk_columns = [column.name for column in model_table.primary_key.columns]
+    if len(pk_columns) != 1:
+        raise ValueError(f"{table} does not have a single-column primary key")
+    
+    unique_sets = [frozenset(pk_columns)]
+    unique_sets.extend(frozenset([column.name]) for column in model_table.columns if column.unique)
+    for constraint in model_table.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            unique_sets.append(frozenset(column.name for column in constraint.columns))
+    unique_sets.extend(
+        frozenset(column.name for column in index.columns)
+        for index in model_table.indexes if index.unique
+    )
+    return pk_columns[0], tuple(unique_sets)
+
+
+# (database, table, columns) confirmed by has_unique_index()
+_unique_indexes = set()
+
+
+def has_unique_index(table: str, columns: frozenset) -> bool:
+    """
+    True if the live database has a unique index (or primary key) on exactly columns.
+    
+    Unique flags in models.py only reach an existing database through
+    `flask create-indexes`, so get_or_create() checks here before relying on
+    ON DUPLICATE KEY. Only confirmed indexes are cached, so one created later
+    is picked up without a restart.
+    """
+    key = (current_app.config.get('DB_NAME', Config.DB_NAME), table, columns)
+    if key in _unique_indexes:
+        return True
+    rows = fetch_all(
+        """SELECT index_name AS index_name, column_name AS column_name
+           FROM information_schema.statistics
+           WHERE table_schema = DATABASE() AND table_name = %s AND non_unique = 0""",
+        (table,)
+    )
+    columns_by_index: Dict[str, set] = {}
+    for row in rows:
+        columns_by_index.setdefault(row['index_name'], set()).add(row['column_name'])
+    if columns not in [frozenset(index_columns) for index_columns in columns_by_index.values()]:
+        return False
+    _unique_indexes.add(key)
+    return True
+
+
 def get_or_create(table: str, lookup_fields: Dict[str, Any], defaults: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
     """
     Get existing record or create new one.
     Similar to Django's get_or_create but using raw SQL.
     
+    When lookup_fields cover a unique key of the table, and that key has a
+    unique index in the database, this is one atomic
+    ``INSERT ... ON DUPLICATE KEY UPDATE pk = LAST_INSERT_ID(pk)``, so
+    concurrent callers cannot create duplicates. Otherwise (including an
+    existing database where `flask create-indexes` has not been run yet) the
+    lookup runs as SELECT ... FOR UPDATE and INSERT inside one transaction.
+    
     Args:
         table: Table name (e.g., 'core_district')
         lookup_fields: Dictionary of fields to search for
@@ -217,33 +1168,32 @@ def get_or_create(table: str, lookup_fields: Dict[str, Any], defaults: Dict[str,
     Returns:
         Tuple of (record_dict, created_boolean)
     """
-    # Build WHERE clause
-    where_clauses = []
-    params = []
-    for field, value in lookup_fields.items():
-        where_clauses.append(f"{field} = %s")
-        params.append(value)
-    
-    where_sql = " AND ".join(where_clauses)
-    select_sql = f"SELECT * FROM {table} WHERE {where_sql} LIMIT 1"
-    
-    # Try to get existing record
-    existing = fetch_one(select_sql, tuple(params))
-    if existing:
-        return existing, False
-    
-    # Create new record
-    all_fields = {**lookup_fields, **defaults}
+    pk_name, unique_sets = table_keys(table)
+    all_fields = {**defaults, **lookup_fields}
     field_names = list(all_fields.keys())
-    field_values = [all_fields[f] for f in field_names]
+    field_values = tuple(all_fields[f] for f in field_names)
     placeholders = ', '.join(['%s'] * len(field_names))
-    
     insert_sql = f"INSERT INTO {table} ({', '.join(field_names)}) VALUES ({placeholders})"
-    new_id = execute_insert(insert_sql, tuple(field_values))
     
-    # Fetch the newly created record
-    # Get primary key name (assuming it ends with _id)
-    pk_name = f"{table.split('_')[-1]}_id"
-    created = fetch_one(f"SELECT * FROM {table} WHERE {pk_name} = %s", (new_id,))
-    return created, True
+    # Without a real unique index ON DUPLICATE KEY never fires and every call would insert
+    if any(unique <= lookup_fields.keys() and has_unique_index(table, unique) for unique in unique_sets):
+        # Existing row: affected rows is 0 and LAST_INSERT_ID() is its pk
+        rowcount, pk_value = execute_write(
+            f"{insert_sql} ON DUPLICATE KEY UPDATE {pk_name} = LAST_INSERT_ID({pk_name})",
+            field_values
+        )
+        row = fetch_one(f"SELECT * FROM {table} WHERE {pk_name} = %s", (pk_value,))
+        return row, rowcount == 1
+    
+    where_sql = " AND ".join(f"{field} = %s" for field in lookup_fields)
+    with transaction() as tx:
+        existing = tx.fetch_one(
+            f"SELECT * FROM {table} WHERE {where_sql} LIMIT 1 FOR UPDATE",
+            tuple(lookup_fields.values())
+        )
+        if existing:
+            return existing, False
+        pk_value = tx.insert(insert_sql, field_values)
+        row = tx.fetch_one(f"SELECT * FROM {table} WHERE {pk_name} = %s", (pk_value,))
+    return row, True
 
@@ -2,14 +2,51 @@
 Flask decorators for role-based access control
 """
 from functools import wraps
-from flask import redirect, url_for, flash
+from flask import redirect, url_for, flash, g
 from flask_login import current_user
+from cache_utils import TTLCache
+from config import Config
+from db_utils import fetch_one
 
+# Profile table for each role that has one
+PROFILE_TABLES = {
+    'DOCTOR': 'core_doctor',
+    'PATIENT': 'core_patient',
+}
 
-def role_required(role):
+# (role, user_id) -> profile row (or None when the account has no profile)
+profile_cache = TTLCache(maxsize=Config.PROFILE_CACHE_SIZE, ttl=Config.PROFILE_CACHE_TTL, name='profiles')
+
+
+def get_profile(role, user_id):
+    """
+    Get the doctor/patient profile row for a user, cached by user id.
+    
+    Returns:
+        Copy of the profile dict, or None if the user has no profile
+    """
+    table = PROFILE_TABLES[role]
+    profile = profile_cache.get_or_load(
+        (role, user_id),
+        lambda: fetch_one(f"SELECT * FROM {table} WHERE user_id = %s", (user_id,))
+    )
+    return dict(profile) if profile else None
+
+
+def invalidate_profile(user_id):
+    """Drop cached profiles for a user; call after writing core_doctor/core_patient"""
+    for role in PROFILE_TABLES:
+        profile_cache.invalidate((role, user_id))
+
+
+def role_required(role, with_profile=False):
     """
     Decorator to restrict access based on user role.
     Usage: @role_required('ADMIN') or @role_required('DOCTOR') or @role_required('PATIENT')
+    
+    With with_profile=True the user's doctor/patient profile row is resolved
+    once (through profile_cache) and stored on g.profile, None if missing.
+    Usage: @role_required('DOCTOR', with_profile=True)
     """
     def decorator(f):
         @wraps(f)
@@ -22,6 +59,9 @@ def role_required(role):
                 flash(f'Access denied. This page is only for {role.lower()}s.', 'error')
                 return redirect(url_for('auth.dashboard'))
             
+            if with_profile:
+                g.profile = get_profile(role, current_user.id)
+            
             return f(*args, **kwargs)
         return decorated_function
     return decorator
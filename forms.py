@@ -119,8 +119,9 @@ class PrescriptionForm(FlaskForm):
 
 class PrescriptionItemForm(FlaskForm):
     """Prescription item form"""
-    medicine = SelectField('Medicine', coerce=int, validators=[DataRequired()],
-                         render_kw={'class': 'form-control'})
+    # Filled in by the medicine typeahead (doctor.medicine_search), not a choice list
+    medicine = IntegerField('Medicine', validators=[DataRequired()],
+                           render_kw={'class': 'form-control', 'placeholder': 'Start typing a medicine name'})
     dosage = StringField('Dosage', validators=[DataRequired(), Length(max=100)],
                        render_kw={'class': 'form-control', 'placeholder': 'e.g., 500mg'})
     frequency = StringField('Frequency', validators=[DataRequired(), Length(max=100)],
@@ -134,20 +135,33 @@ class PrescriptionItemForm(FlaskForm):
                                     validators=[DataRequired()], render_kw={'class': 'form-control'})
     instructions = TextAreaField('Instructions', validators=[Optional()],
                                render_kw={'class': 'form-control', 'rows': 2})
+    
+    def validate_medicine(self, field):
+        """Check the submitted medicine against the in-memory catalog"""
+        from services.catalog import medicine_catalog
+        if medicine_catalog.get(field.data) is None:
+            raise ValidationError('Selected medicine does not exist.')
 
 
 class LabTestForm(FlaskForm):
     """Lab test ordering form"""
     lab = SelectField('Lab', coerce=int, validators=[DataRequired()],
                      render_kw={'class': 'form-control'})
-    patient = SelectField('Patient', coerce=int, validators=[DataRequired()],
-                         render_kw={'class': 'form-control'})
+    # Filled in by the patient search box (doctor.patient_search), not a choice list
+    patient = IntegerField('Patient', validators=[DataRequired()],
+                          render_kw={'class': 'form-control', 'placeholder': 'Search by name, national ID or phone'})
     test_type = StringField('Test Type', validators=[DataRequired(), Length(max=200)],
                            render_kw={'class': 'form-control', 'placeholder': 'e.g., Complete Blood Count'})
     test_cost = DecimalField('Test Cost', validators=[DataRequired(), NumberRange(min=0)],
                            places=2, render_kw={'class': 'form-control', 'step': '0.01'})
     remarks = TextAreaField('Remarks', validators=[Optional()],
                           render_kw={'class': 'form-control', 'rows': 3})
+    
+    def validate_patient(self, field):
+        """Check the submitted patient exists with a single point lookup"""
+        from services.patients import patient_exists
+        if not patient_exists(field.data):
+            raise ValidationError('Selected patient does not exist.')
 
 
 class LabTestUpdateForm(FlaskForm):
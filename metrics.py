@@ -0,0 +1,271 @@
+"""
+Prometheus-style metrics for requests and the database layer.
+
+Exposed at /metrics in the text exposition format when METRICS_ENABLED=1
+and METRICS_TOKEN is set (scrapers send "Authorization: Bearer <token>"):
+    - http_request_duration_seconds{endpoint,method,status}   histogram
+    - http_requests_in_flight{endpoint}                       gauge
+    - db_query_duration_seconds{fingerprint}                  histogram (its _count is the query count)
+    - db_pool_connections{state}, db_pool_size, db_pool_max_overflow
+    - db_replica_lag_seconds{replica}, db_replica_healthy{replica}  (with DB_REPLICAS)
+    - cache_hits_total / cache_misses_total / cache_hit_ratio / cache_entries{cache}
+
+Every thread writes to its own shard (a plain dict of preallocated series),
+so recording takes no lock and allocates nothing once a series exists;
+shards are only summed when /metrics is scraped. Query fingerprints are
+capped at METRICS_MAX_FINGERPRINTS distinct values, the rest are reported
+as "other", to keep label cardinality bounded.
+"""
+import hmac
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+from flask import Response, abort, current_app, g, request
+
+import db_utils
+from cache_utils import caches
+from config import Config
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+# name -> (type, help, label names, buckets)
+METRICS = {
+    'http_request_duration_seconds': (
+        'histogram', 'Request latency by endpoint', ('endpoint', 'method', 'status'), REQUEST_BUCKETS),
+    'http_requests_in_flight': (
+        'gauge', 'Requests currently being handled', ('endpoint',), None),
+    'db_query_duration_seconds': (
+        'histogram', 'Query latency by statement fingerprint', ('fingerprint',), QUERY_BUCKETS),
+}
+
+OTHER_FINGERPRINT = 'other'
+
+
+class _Shard:
+    """Series of one thread: (metric, label values) -> list of numbers"""
+    __slots__ = ('series',)
+
+    def __init__(self):
+        self.series: Dict[Tuple[str, Tuple], List[float]] = {}
+
+    def merge(self, other: '_Shard'):
+        # list() of a dict's items runs without releasing the GIL, so a
+        # concurrently writing thread cannot resize the dict under us
+        for key, values in list(other.series.items()):
+            mine = self.series.get(key)
+            if mine is None:
+                self.series[key] = list(values)
+            else:
+                for index, value in enumerate(values):
+                    mine[index] += value
+
+
+class Registry:
+    """Per-thread metric shards, summed on collect()"""
+
+    def __init__(self, max_fingerprints: int = 200):
+        self.max_fingerprints = max_fingerprints
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Tuple[threading.Thread, _Shard]] = []
+        self._retired = _Shard()
+        self._fingerprints = set()
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._sweep()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _sweep(self):
+        # Fold shards of finished threads into one, so thread-per-request servers do not leak
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self._retired.merge(shard)
+        self._shards = alive
+
+    def observe(self, metric: str, labels: Tuple, value: float):
+        """Record value in a histogram series"""
+        series = self._shard().series
+        values = series.get((metric, labels))
+        if values is None:
+            buckets = METRICS[metric][3]
+            # One slot per bucket plus +Inf, then the running sum
+            values = series[(metric, labels)] = [0] * (len(buckets) + 1) + [0.0]
+        values[bisect_left(METRICS[metric][3], value)] += 1
+        values[-1] += value
+
+    def add(self, metric: str, labels: Tuple, amount: float):
+        """Add amount to a gauge series"""
+        series = self._shard().series
+        values = series.get((metric, labels))
+        if values is None:
+            values = series[(metric, labels)] = [0]
+        values[0] += amount
+
+    def fingerprint_label(self, fingerprint: str) -> str:
+        """fingerprint itself while under the cardinality cap, else OTHER_FINGERPRINT"""
+        if fingerprint in self._fingerprints:
+            return fingerprint
+        with self._lock:
+            if len(self._fingerprints) < self.max_fingerprints:
+                self._fingerprints.add(fingerprint)
+                return fingerprint
+        return OTHER_FINGERPRINT
+
+    def collect(self) -> _Shard:
+        """Sum of all shards"""
+        total = _Shard()
+        with self._lock:
+            self._sweep()
+            total.merge(self._retired)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            total.merge(shard)
+        return total
+
+
+registry = Registry(max_fingerprints=Config.METRICS_MAX_FINGERPRINTS)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def render(shard: _Shard) -> str:
+    """Text exposition of the collected series plus pool and cache gauges"""
+    lines = []
+    by_metric: Dict[str, List] = {}
+    for (metric, labels), values in shard.series.items():
+        by_metric.setdefault(metric, []).append((labels, values))
+
+    for metric, (kind, help_text, label_names, buckets) in METRICS.items():
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {kind}')
+        for labels, values in sorted(by_metric.get(metric, []), key=lambda item: item[0]):
+            if kind == 'gauge':
+                lines.append(f'{metric}{_labels(label_names, labels)} {values[0]}')
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets, values):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{metric}_bucket{_labels(label_names, labels, le)} {cumulative}')
+            cumulative += values[len(buckets)]
+            le = 'le="+Inf"'
+            lines.append(f'{metric}_bucket{_labels(label_names, labels, le)} {cumulative}')
+            lines.append(f'{metric}_sum{_labels(label_names, labels)} {values[-1]}')
+            lines.append(f'{metric}_count{_labels(label_names, labels)} {cumulative}')
+
+    pool = current_app.extensions.get('db_pool')
+    if pool is not None:
+        stats = pool.stats()
+        lines.append('# HELP db_pool_connections Pooled connections by state')
+        lines.append('# TYPE db_pool_connections gauge')
+        for state in ('checked_out', 'idle', 'overflow'):
+            lines.append(f'db_pool_connections{{state="{state}"}} {stats[state]}')
+        lines.append('# TYPE db_pool_size gauge')
+        lines.append(f"db_pool_size {stats['size']}")
+        lines.append('# TYPE db_pool_max_overflow gauge')
+        lines.append(f"db_pool_max_overflow {stats['max_overflow']}")
+
+    replicas = current_app.extensions.get('db_replicas')
+    if replicas is not None:
+        replica_stats = sorted(replicas.stats().items())
+        lines.append('# HELP db_replica_lag_seconds Last measured replication lag (-1 if unknown)')
+        lines.append('# TYPE db_replica_lag_seconds gauge')
+        for name, stats in replica_stats:
+            lag = stats['lag'] if stats['lag'] is not None else -1
+            lines.append(f'db_replica_lag_seconds{{replica="{_escape(name)}"}} {lag}')
+        lines.append('# HELP db_replica_healthy Whether reads are routed to the replica')
+        lines.append('# TYPE db_replica_healthy gauge')
+        for name, stats in replica_stats:
+            lines.append(f'db_replica_healthy{{replica="{_escape(name)}"}} {int(stats["healthy"])}')
+
+    cache_lines = {'cache_hits_total': [], 'cache_misses_total': [], 'cache_hit_ratio': [], 'cache_entries': []}
+    for name, cache in sorted(caches.items()):
+        hits, misses = cache.hits, cache.misses
+        label = f'{{cache="{_escape(name)}"}}'
+        cache_lines['cache_hits_total'].append(f'cache_hits_total{label} {hits}')
+        cache_lines['cache_misses_total'].append(f'cache_misses_total{label} {misses}')
+        cache_lines['cache_hit_ratio'].append(f'cache_hit_ratio{label} {hits / (hits + misses) if hits + misses else 0.0}')
+        cache_lines['cache_entries'].append(f'cache_entries{label} {len(cache)}')
+    for metric, kind in (('cache_hits_total', 'counter'), ('cache_misses_total', 'counter'),
+                         ('cache_hit_ratio', 'gauge'), ('cache_entries', 'gauge')):
+        if cache_lines[metric]:
+            lines.append(f'# TYPE {metric} {kind}')
+            lines.extend(cache_lines[metric])
+
+    return '\n'.join(lines) + '\n'
+
+
+def _endpoint_label():
+    return request.endpoint or 'unmatched'
+
+
+def _start_request():
+    g._metrics_start = time.perf_counter()
+    g._metrics_endpoint = (_endpoint_label(),)
+    registry.add('http_requests_in_flight', g._metrics_endpoint, 1)
+
+
+def _finish_request(response):
+    start = g.get('_metrics_start')
+    if start is not None:
+        registry.observe(
+            'http_request_duration_seconds',
+            (_endpoint_label(), request.method, str(response.status_code)),
+            time.perf_counter() - start
+        )
+    return response
+
+
+def _end_request(exc=None):
+    endpoint = g.pop('_metrics_endpoint', None)
+    if endpoint is not None:
+        registry.add('http_requests_in_flight', endpoint, -1)
+
+
+def _observe_query(sql, duration):
+    registry.observe('db_query_duration_seconds', (registry.fingerprint_label(db_utils.fingerprint(sql)),), duration)
+
+
+def metrics_view():
+    """Prometheus scrape endpoint (bearer token required)"""
+    token = current_app.config.get('METRICS_TOKEN', Config.METRICS_TOKEN)
+    supplied = request.headers.get('Authorization', '')
+    if not token or not hmac.compare_digest(supplied, f'Bearer {token}'):
+        abort(401)
+    return Response(render(registry.collect()), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """Register request hooks, the query observer and the /metrics endpoint (METRICS_TOKEN required)"""
+    if not app.config.get('METRICS_ENABLED', Config.METRICS_ENABLED):
+        return
+    if not app.config.get('METRICS_TOKEN', Config.METRICS_TOKEN):
+        # Query fingerprints, pool state and cache stats are not for anonymous clients
+        app.logger.warning('METRICS_ENABLED is set without METRICS_TOKEN; /metrics is not registered')
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
+    if _observe_query not in db_utils._query_observers:
+        db_utils.add_query_observer(_observe_query)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -67,7 +67,7 @@ class District(db.Model):
     __tablename__ = 'core_district'
     
     district_id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String(100), nullable=False)
+    name = Column(String(100), unique=True, nullable=False)
     division = Column(String(100), nullable=False)
     
     hospitals = relationship('Hospital', backref='district')
@@ -108,7 +108,7 @@ class ServiceType(db.Model):
     __tablename__ = 'core_servicetype'
     
     service_type_id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String(100), nullable=False)
+    name = Column(String(100), unique=True, nullable=False)
     description = Column(Text, nullable=True)
     
     bills = relationship('Bill', backref='service_type')
@@ -478,7 +478,8 @@ class Bill(db.Model):
     discount = Column(Numeric(10, 2), default=Decimal('0.00'), nullable=False)
     tax = Column(Numeric(10, 2), default=Decimal('0.00'), nullable=False)
     due_date = Column(Date, nullable=False)
-    transaction_id = Column(String(100), nullable=True)
+    # Unique so automatic billing (e.g. LAB-<test_id>) is idempotent; NULLs may repeat
+    transaction_id = Column(String(100), nullable=True, unique=True)
     
     pharmacy_bill = relationship('PharmacyBill', backref='bill', uselist=False)
     
@@ -0,0 +1,236 @@
+"""
+Opt-in per-request sampling profiler.
+
+When PROFILING_ENABLED is set, a request is profiled if it carries a valid
+signed token in the PROFILING_HEADER header (see `flask profile-token`) or
+is picked by PROFILING_SAMPLE_RATE. A background thread samples the request
+thread's stack every PROFILING_INTERVAL seconds; the samples are written to
+PROFILES_DIR as collapsed stacks (``frame;frame;frame count``, readable by
+flamegraph.pl or speedscope) next to a JSON summary that attributes the time
+to view code, db_utils, row hydration (services/rows.py) and Jinja rendering.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from flask import current_app, g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from config import BASE_DIR, Config
+
+CATEGORIES = ('view', 'db_utils', 'hydration', 'jinja')
+
+# Profile ids are generated here; anything else is rejected before touching the filesystem
+PROFILE_ID = re.compile(r'^[0-9]{8}T[0-9]{6}-[A-Za-z0-9_.]+-[0-9a-f]{8}$')
+
+_DB_UTILS_FILE = str(BASE_DIR / 'db_utils.py')
+# services/rows.py and the row __init__ methods it compiles
+_ROWS_FILES = (str(BASE_DIR / 'services' / 'rows.py'), '<services.rows>')
+_APP_ROOT = str(BASE_DIR)
+
+
+def _config(name):
+    return current_app.config.get(name, getattr(Config, name))
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='request-profiling')
+
+
+def make_profile_token() -> str:
+    """Signed token that enables profiling for requests carrying it"""
+    return _serializer().dumps('profile')
+
+
+def _has_valid_token() -> bool:
+    token = request.headers.get(_config('PROFILING_HEADER'))
+    if not token:
+        return False
+    try:
+        return _serializer().loads(token, max_age=_config('PROFILING_TOKEN_MAX_AGE')) == 'profile'
+    except BadSignature:
+        return False
+
+
+def categorize(frames) -> str:
+    """
+    Category of one sample, from its frames ordered root to leaf.
+
+    The innermost matching frame wins, so a query issued while a template
+    renders counts as db_utils time.
+    """
+    for frame in reversed(frames):
+        filename = frame.f_code.co_filename
+        if filename == _DB_UTILS_FILE:
+            return 'db_utils'
+        if filename in _ROWS_FILES:
+            return 'hydration'
+        if 'jinja2' in filename or filename.endswith('.html'):
+            return 'jinja'
+    return 'view'
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(_APP_ROOT):
+        filename = os.path.relpath(filename, _APP_ROOT)
+    else:
+        filename = os.path.basename(filename)
+    return f'{code.co_name} ({filename}:{frame.f_lineno})'.replace(';', ':')
+
+
+class Sampler:
+    """Samples one thread's stack from a background thread"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.categories: Counter = Counter()
+        self.started = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> float:
+        self._stop.set()
+        self._thread.join()
+        return time.perf_counter() - self.started
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(frame)
+                frame = frame.f_back
+            frames.reverse()
+            # Drop the server and Flask dispatch frames above the view function
+            for index in range(len(frames) - 1, -1, -1):
+                code = frames[index].f_code
+                if code.co_name == 'dispatch_request' and 'flask' in code.co_filename:
+                    frames = frames[index + 1:]
+                    break
+            self.stacks[';'.join(_label(f) for f in frames)] += 1
+            self.categories[categorize(frames)] += 1
+
+
+def profiles_dir() -> Path:
+    return Path(_config('PROFILES_DIR'))
+
+
+def _start_profile():
+    if request.endpoint in (None, 'static') or (request.endpoint or '').startswith('admin.profile'):
+        return
+    if not _config('PROFILING_ENABLED'):
+        return
+    if not _has_valid_token() and random.random() >= _config('PROFILING_SAMPLE_RATE'):
+        return
+    sampler = Sampler(threading.get_ident(), _config('PROFILING_INTERVAL'))
+    sampler.start()
+    g._profiler = sampler
+
+
+def _finish_profile(response):
+    sampler = g.pop('_profiler', None)
+    if sampler is None:
+        return response
+    duration = sampler.stop()
+    profile_id = save_profile(sampler, duration, response.status_code)
+    response.headers['X-Profile-Id'] = profile_id
+    return response
+
+
+def _abandon_profile(exc=None):
+    # Only reached with a sampler still attached if after_request never ran
+    sampler = g.pop('_profiler', None)
+    if sampler is not None:
+        sampler.stop()
+
+
+def save_profile(sampler: Sampler, duration: float, status_code: int) -> str:
+    """Write the collapsed stacks and summary of a profiled request; returns its id"""
+    directory = profiles_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    endpoint = re.sub(r'[^A-Za-z0-9_.]', '_', request.endpoint or 'unknown')
+    profile_id = f"{datetime.now():%Y%m%dT%H%M%S}-{endpoint}-{uuid.uuid4().hex[:8]}"
+
+    root = request.endpoint or 'unknown'
+    with open(directory / f'{profile_id}.folded', 'w') as handle:
+        for stack, count in sampler.stacks.most_common():
+            handle.write(f'{root};{stack} {count}\n' if stack else f'{root} {count}\n')
+
+    total = sum(sampler.categories.values()) or 1
+    summary = {
+        'id': profile_id,
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'path': request.path,
+        'status': status_code,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'duration_ms': round(duration * 1000.0, 2),
+        'interval_ms': sampler.interval * 1000.0,
+        'samples': sum(sampler.categories.values()),
+        'categories': {
+            name: {'samples': sampler.categories[name],
+                   'share': round(sampler.categories[name] / total, 3)}
+            for name in CATEGORIES
+        },
+    }
+    with open(directory / f'{profile_id}.json', 'w') as handle:
+        json.dump(summary, handle, indent=2)
+
+    _prune(directory, _config('PROFILING_MAX_FILES'))
+    return profile_id
+
+
+def _prune(directory: Path, keep: int):
+    summaries = sorted(directory.glob('*.json'))
+    for stale in summaries[:max(0, len(summaries) - keep)]:
+        stale.unlink(missing_ok=True)
+        stale.with_suffix('.folded').unlink(missing_ok=True)
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    """Summaries of stored profiles, newest first"""
+    directory = profiles_dir()
+    if not directory.is_dir():
+        return []
+    summaries = []
+    for path in sorted(directory.glob('*.json'), reverse=True):
+        try:
+            with open(path) as handle:
+                summaries.append(json.load(handle))
+        except (OSError, ValueError):
+            continue
+    return summaries
+
+
+def profile_path(profile_id: str) -> Optional[Path]:
+    """Collapsed-stack file of a stored profile, or None if the id is invalid or unknown"""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    path = profiles_dir() / f'{profile_id}.folded'
+    return path if path.is_file() else None
+
+
+def init_app(app):
+    """Register the profiling hooks"""
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_abandon_profile)
@@ -1,105 +1,47 @@
 """
 Hospital Admin routes for Flask application
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask import (Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify, send_file,
+                   Response, stream_with_context)
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta, date
 from decimal import Decimal
-from decorators import role_required
+from decorators import role_required, invalidate_profile
 from forms import DepartmentForm, LabForm, DoctorCreationForm, PharmacyStockUpdateForm
-from db_utils import fetch_one, fetch_all, fetch_count, execute_insert, execute_update
-from models import Department, Lab, Doctor, Pharmacy, PharmacyMedicine, Medicine, Hospital, Appointment
+from db_utils import fetch_one, fetch_all, fetch_count, execute_insert, execute_update, transaction
+from services.rows import APPOINTMENT, DEPARTMENT, LAB, DOCTOR, PHARMACY, STOCK_ITEM, MEDICINE
+from services.dashboard import get_dashboard_stats
+from services.hospitals import current_hospital
+from services.exports import EXPORTS, csv_chunks, export_rows, parse_export_range
+from profiling import list_profiles, profile_path
 from werkzeug.security import generate_password_hash
 
 admin_bp = Blueprint('admin', __name__)
 
 
-# Helper function to convert dict to model instance
-def dict_to_model(model_class, data_dict):
-    """Convert dictionary to model instance for template compatibility"""
-    if not data_dict:
-        return None
-    instance = model_class()
-    for key, value in data_dict.items():
-        setattr(instance, key, value)
-    return instance
-
-
 @admin_bp.route('/dashboard')
 @role_required('ADMIN')
 def dashboard():
     """Hospital admin dashboard"""
-    hospital = current_user.hospital
+    hospital = current_hospital()
     
     if not hospital:
         flash('No hospital assigned to this admin account.', 'error')
         return render_template('admin/dashboard.html', {})
     
-    hospital_id = hospital.hospital_id
-    today = date.today()
-    
-    # Get statistics using raw SQL
-    departments_count = fetch_count(
-        "SELECT COUNT(*) FROM core_department WHERE hospital_id = %s",
-        (hospital_id,)
-    )
-    
-    doctors_count = fetch_count(
-        "SELECT COUNT(*) FROM core_doctor WHERE hospital_id = %s",
-        (hospital_id,)
-    )
-    
-    labs_count = fetch_count(
-        "SELECT COUNT(*) FROM core_lab WHERE hospital_id = %s",
-        (hospital_id,)
-    )
-    
-    # Today's appointments
-    today_appointments = fetch_count(
-        """SELECT COUNT(*) FROM core_appointment a
-           INNER JOIN core_doctor d ON a.doctor_id = d.doctor_id
-           WHERE d.hospital_id = %s AND DATE(a.date_and_time) = %s""",
-        (hospital_id, today)
-    )
-    
-    # Recent appointments with JOINs
-    recent_appointments_data = fetch_all(
-        """SELECT a.*, d.full_name as doctor_name, p.full_name as patient_name
-           FROM core_appointment a
-           INNER JOIN core_doctor d ON a.doctor_id = d.doctor_id
-           INNER JOIN core_patient p ON a.patient_id = p.patient_id
-           WHERE d.hospital_id = %s
-           ORDER BY a.date_and_time DESC
-           LIMIT 10""",
-        (hospital_id,)
-    )
+    stats = get_dashboard_stats(hospital.hospital_id)
     
-    # Convert to model-like objects for template compatibility
-    recent_appointments = [dict_to_model(Appointment, apt) for apt in recent_appointments_data]
-    
-    # Appointments per day for last 7 days (for chart)
-    appointments_data = []
-    for i in range(6, -1, -1):
-        day_date = today - timedelta(days=i)
-        count = fetch_count(
-            """SELECT COUNT(*) FROM core_appointment a
-               INNER JOIN core_doctor d ON a.doctor_id = d.doctor_id
-               WHERE d.hospital_id = %s AND DATE(a.date_and_time) = %s""",
-            (hospital_id, day_date)
-        )
-        appointments_data.append({
-            'date': day_date.strftime('%b %d'),
-            'count': count
-        })
+    # Lightweight row objects for the template
+    recent_appointments = APPOINTMENT.many(stats.recent_appointments)
     
     context = {
         'hospital': hospital,
-        'departments_count': departments_count,
-        'doctors_count': doctors_count,
-        'labs_count': labs_count,
-        'today_appointments': today_appointments,
+        'departments_count': stats.departments_count,
+        'doctors_count': stats.doctors_count,
+        'labs_count': stats.labs_count,
+        'today_appointments': stats.today_appointments,
         'recent_appointments': recent_appointments,
-        'appointments_data': appointments_data,
+        'appointments_data': stats.chart_data(),
     }
     
     return render_template('admin/dashboard.html', **context)
@@ -109,14 +51,14 @@ def dashboard():
 @role_required('ADMIN')
 def departments():
     """List all departments"""
-    hospital = current_user.hospital
+    hospital = current_hospital()
     hospital_id = hospital.hospital_id
     
     departments_data = fetch_all(
         "SELECT * FROM core_department WHERE hospital_id = %s ORDER BY dept_name",
         (hospital_id,)
     )
-    departments = [dict_to_model(Department, dept) for dept in departments_data]
+    departments = DEPARTMENT.many(departments_data)
     
     return render_template('admin/departments.html', departments=departments, hospital=hospital)
 
@@ -125,7 +67,7 @@ def departments():
 @role_required('ADMIN')
 def department_add():
     """Add new department"""
-    hospital = current_user.hospital
+    hospital = current_hospital()
     hospital_id = hospital.hospital_id
     
     form = DepartmentForm()
@@ -150,7 +92,7 @@ def department_add():
 @role_required('ADMIN')
 def department_edit(dept_id):
     """Edit department"""
-    hospital = current_user.hospital
+    hospital = current_hospital()
     hospital_id = hospital.hospital_id
     
     # Get department using raw SQL
@@ -162,7 +104,7 @@ def department_edit(dept_id):
     if not department_data:
         abort(404)
     
-    department = dict_to_model(Department, department_data)
+    department = DEPARTMENT.one(department_data)
     
     form = DepartmentForm()
     if form.validate_on_submit():
@@ -193,14 +135,14 @@ def department_edit(dept_id):
 @role_required('ADMIN')
 def labs():
     """List all labs"""
-    hospital = current_user.hospital
+    hospital = current_hospital()
     hospital_id = hospital.hospital_id
     
     labs_data = fetch_all(
         "SELECT * FROM core_lab WHERE hospital_id = %s ORDER BY lab_name",
         (hospital_id,)
     )
-    labs = [dict_to_model(Lab, lab) for lab in labs_data]
+    labs = LAB.many(labs_data)
     
     return render_template('admin/labs.html', labs=labs, hospital=hospital)
 
@@ -209,7 +151,7 @@ def labs():
 @role_required('ADMIN')
 def lab_add():
     """Add new lab"""
-    hospital = current_user.hospital
+    hospital = current_hospital()
     hospital_id = hospital.hospital_id
     
     form = LabForm()
@@ -233,7 +175,7 @@ def lab_add():
 @role_required('ADMIN')
 def doctors():
     """List all doctors"""
-    hospital = current_user.hospital
+    hospital = current_hospital()
     hospital_id = hospital.hospital_id
     
     # Get doctors with department info using JOIN
@@ -246,16 +188,8 @@ def doctors():
         (hospital_id,)
     )
     
-    # Convert to model-like objects
-    doctors = []
-    for doc_data in doctors_data:
-        doctor = dict_to_model(Doctor, doc_data)
-        if doc_data.get('dept_name'):
-            # Create a minimal dept object for template
-            dept = Department()
-            dept.dept_name = doc_data['dept_name']
-            doctor.dept = dept
-        doctors.append(doctor)
+    # Row objects with .dept set from the joined dept_name (None without a department)
+    doctors = DOCTOR.many(doctors_data)
     
     return render_template('admin/doctors.html', doctors=doctors, hospital=hospital)
 
@@ -264,7 +198,7 @@ def doctors():
 @role_required('ADMIN')
 def doctor_add():
     """Add new doctor"""
-    hospital = current_user.hospital
+    hospital = current_hospital()
     hospital_id = hospital.hospital_id
     
     # Get departments for this hospital
@@ -296,7 +230,7 @@ def doctor_add():
             flash('License number already exists.', 'error')
             return render_template('admin/doctor_form.html', form=form, title='Add Doctor')
         
-        # Create user account
+        # User account and doctor profile are created together or not at all
         hashed_password = generate_password_hash(form.password.data)
         user_sql = """INSERT INTO core_customuser 
                      (username, password, email, first_name, last_name, is_active, 
@@ -308,12 +242,6 @@ def doctor_add():
         first_name = name_parts[0]
         last_name = name_parts[1] if len(name_parts) > 1 else ''
         
-        user_id = execute_insert(
-            user_sql,
-            (form.username.data, hashed_password, form.email.data, first_name, last_name,
-             True, False, False, datetime.utcnow(), 'DOCTOR', hospital_id)
-        )
-        
         # Insert doctor using raw SQL
         sql = """INSERT INTO core_doctor 
                  (license_no, full_name, specialization, phone, email, experience_yrs, 
@@ -322,20 +250,27 @@ def doctor_add():
         
         dept_id = form.dept.data if form.dept.data else None
         
-        doctor_id = execute_insert(sql, (
-            form.license_no.data,
-            form.full_name.data,
-            form.specialization.data,
-            form.phone.data,
-            form.email.data,
-            form.experience_yrs.data,
-            form.gender.data,
-            form.shift_timing.data,
-            form.join_date.data,
-            hospital_id,
-            dept_id,
-            user_id
-        ))
+        with transaction() as tx:
+            user_id = tx.insert(
+                user_sql,
+                (form.username.data, hashed_password, form.email.data, first_name, last_name,
+                 True, False, False, datetime.utcnow(), 'DOCTOR', hospital_id)
+            )
+            tx.insert(sql, (
+                form.license_no.data,
+                form.full_name.data,
+                form.specialization.data,
+                form.phone.data,
+                form.email.data,
+                form.experience_yrs.data,
+                form.gender.data,
+                form.shift_timing.data,
+                form.join_date.data,
+                hospital_id,
+                dept_id,
+                user_id
+            ))
+        invalidate_profile(user_id)
         
         flash(f'Doctor "{form.full_name.data}" added successfully.', 'success')
         return redirect(url_for('admin.doctors'))
@@ -347,7 +282,7 @@ def doctor_add():
 @role_required('ADMIN')
 def pharmacy_stock():
     """View and manage pharmacy stock"""
-    hospital = current_user.hospital
+    hospital = current_hospital()
     hospital_id = hospital.hospital_id
     
     # Get pharmacies for this hospital
@@ -355,7 +290,7 @@ def pharmacy_stock():
         "SELECT * FROM core_pharmacy WHERE hospital_id = %s",
         (hospital_id,)
     )
-    pharmacies = [dict_to_model(Pharmacy, pharm) for pharm in pharmacies_data]
+    pharmacies = PHARMACY.many(pharmacies_data)
     
     # Get pharmacy from request or first pharmacy
     pharmacy_id = request.args.get('pharmacy')
@@ -368,9 +303,9 @@ def pharmacy_stock():
             (pharmacy_id, hospital_id)
         )
         if pharmacy_data:
-            selected_pharmacy = dict_to_model(Pharmacy, pharmacy_data)
+            selected_pharmacy = PHARMACY.one(pharmacy_data)
     elif pharmacies_data:
-        selected_pharmacy = dict_to_model(Pharmacy, pharmacies_data[0])
+        selected_pharmacy = pharmacies[0]
     
     if selected_pharmacy:
         # Get stock items with medicine info using JOIN
@@ -382,15 +317,8 @@ def pharmacy_stock():
                ORDER BY m.name""",
             (selected_pharmacy.pharmacy_id,)
         )
-        
-        # Convert to model-like objects
-        for item_data in stock_items_data:
-            item = dict_to_model(PharmacyMedicine, item_data)
-            medicine = Medicine()
-            medicine.name = item_data['medicine_name']
-            medicine.type = item_data['medicine_type']
-            item.medicine = medicine
-            stock_items.append(item)
+        # Row objects with .medicine built from the joined columns
+        stock_items = STOCK_ITEM.many(stock_items_data)
     
     context = {
         'pharmacies': pharmacies,
@@ -406,7 +334,7 @@ def pharmacy_stock():
 @role_required('ADMIN')
 def pharmacy_stock_update(stock_id):
     """Update pharmacy stock"""
-    hospital = current_user.hospital
+    hospital = current_hospital()
     hospital_id = hospital.hospital_id
     
     # Get stock item with pharmacy check
@@ -421,7 +349,7 @@ def pharmacy_stock_update(stock_id):
     if not stock_item_data:
         abort(404)
     
-    stock_item = dict_to_model(PharmacyMedicine, stock_item_data)
+    stock_item = STOCK_ITEM.one(stock_item_data)
     
     # Get medicine info
     medicine_data = fetch_one(
@@ -429,7 +357,7 @@ def pharmacy_stock_update(stock_id):
         (stock_item_data['medicine_id'],)
     )
     if medicine_data:
-        stock_item.medicine = dict_to_model(Medicine, medicine_data)
+        stock_item.medicine = MEDICINE.one(medicine_data)
     
     form = PharmacyStockUpdateForm()
     if form.validate_on_submit():
@@ -453,3 +381,48 @@ def pharmacy_stock_update(stock_id):
     
     return render_template('admin/stock_form.html', form=form, stock_item=stock_item)
 
+
+@admin_bp.route('/export/<any(appointments, lab_tests, bills):kind>.csv', defaults={'compressed': False})
+@admin_bp.route('/export/<any(appointments, lab_tests, bills):kind>.csv.gz', defaults={'compressed': True})
+@role_required('ADMIN')
+def export(kind, compressed):
+    """Download the hospital's appointments, lab tests or bills for ?start=&end= (YYYY-MM-DD, inclusive) as CSV"""
+    hospital = current_hospital()
+    if not hospital:
+        abort(404)
+    try:
+        start, end = parse_export_range(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        abort(400)
+    
+    # Rows are read from a server-side cursor while the body is sent, so the
+    # request context must stay alive until the generator is exhausted
+    rows = export_rows(kind, hospital.hospital_id, start, end)
+    body = stream_with_context(csv_chunks(EXPORTS[kind].columns, rows, compress=compressed))
+    filename = f'hospital-{hospital.hospital_id}-{kind}-{start}-to-{end}.csv'
+    if compressed:
+        response = Response(body, mimetype='application/gzip')
+        filename += '.gz'
+    else:
+        response = Response(body, mimetype='text/csv')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Tell nginx not to buffer the whole export before passing it on
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@admin_bp.route('/profiles')
+@role_required('ADMIN')
+def profiles():
+    """List stored request profiles (newest first) as JSON"""
+    return jsonify(profiles=list_profiles())
+
+
+@admin_bp.route('/profiles/<profile_id>')
+@role_required('ADMIN')
+def profile_download(profile_id):
+    """Download the collapsed stacks of one request profile"""
+    path = profile_path(profile_id)
+    if path is None:
+        abort(404)
+    return send_file(path, mimetype='text/plain', as_attachment=True, download_name=path.name)
@@ -5,7 +5,9 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
 from models import User, db
 from forms import LoginForm, PatientRegistrationForm
-from db_utils import fetch_one, execute_insert
+from db_utils import fetch_one, transaction
+from decorators import invalidate_profile
+from services.users import cache_user
 from werkzeug.security import check_password_hash
 
 auth_bp = Blueprint('auth', __name__)
@@ -31,15 +33,14 @@ def login():
         
         if user_data:
             # Create User object from data
-            user = User.query.get(user_data['id'])
-            if not user:
-                # If user not in SQLAlchemy session, create it
-                user = User()
-                for key, value in user_data.items():
-                    setattr(user, key, value)
+            user = User()
+            for key, value in user_data.items():
+                setattr(user, key, value)
             
             # Check password
             if user.check_password(password):
+                # Fresh row: prime the user cache so the next request skips the lookup
+                cache_user(user_data)
                 login_user(user, remember=True)
                 flash(f'Welcome back, {user.username}!', 'success')
                 return redirect(url_for('auth.dashboard'))
@@ -105,7 +106,7 @@ def patient_registration():
             flash('National ID already registered.', 'error')
             return render_template('patient/registration.html', form=form)
         
-        # Create user account
+        # User account and patient record are created together or not at all
         from werkzeug.security import generate_password_hash
         from datetime import datetime
         
@@ -120,11 +121,6 @@ def patient_registration():
         last_name = name_parts[1] if len(name_parts) > 1 else ''
         
         hashed_password = generate_password_hash(form.password.data)
-        user_id = execute_insert(
-            user_sql,
-            (form.username.data, hashed_password, form.email.data, first_name, last_name,
-             True, False, False, datetime.utcnow(), 'PATIENT', None)
-        )
         
         # Create patient record
         patient_sql = """INSERT INTO core_patient 
@@ -132,13 +128,20 @@ def patient_registration():
                          blood_type, occupation, marital_status, birth_place, father_name, mother_name, user_id)
                         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
         
-        patient_id = execute_insert(
-            patient_sql,
-            (form.national_id.data, form.full_name.data, form.date_of_birth.data,
-             form.gender.data, form.phone.data, form.email.data, form.address.data,
-             form.blood_type.data, form.occupation.data or None, form.marital_status.data,
-             form.birth_place.data, form.father_name.data, form.mother_name.data, user_id)
-        )
+        with transaction() as tx:
+            user_id = tx.insert(
+                user_sql,
+                (form.username.data, hashed_password, form.email.data, first_name, last_name,
+                 True, False, False, datetime.utcnow(), 'PATIENT', None)
+            )
+            tx.insert(
+                patient_sql,
+                (form.national_id.data, form.full_name.data, form.date_of_birth.data,
+                 form.gender.data, form.phone.data, form.email.data, form.address.data,
+                 form.blood_type.data, form.occupation.data or None, form.marital_status.data,
+                 form.birth_place.data, form.father_name.data, form.mother_name.data, user_id)
+            )
+        invalidate_profile(user_id)
         
         flash('Registration successful! Please log in.', 'success')
         return redirect(url_for('auth.login'))
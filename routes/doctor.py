@@ -1,58 +1,50 @@
 """
 Doctor routes for Flask application
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, g, current_app, jsonify
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta, date
 from decimal import Decimal
 from decorators import role_required
+from utils import day_bounds
+from services.prescriptions import attach_prescription_items, load_prescription_items
+from services.pagination import paginate_appointments
+from services.patients import search_patients
+from services.catalog import medicine_catalog
+from services.reference import get_service_type_id
 from forms import AppointmentUpdateForm, PrescriptionForm, PrescriptionItemForm, LabTestForm, LabTestUpdateForm
-from db_utils import fetch_one, fetch_all, fetch_count, execute_insert, execute_update
-from models import Doctor, Appointment, Patient, Prescription, PrescriptionItem, Medicine, LabTest, Lab
+from db_utils import fetch_one, fetch_all, execute_insert, execute_update, transaction
+from services.rows import DOCTOR, APPOINTMENT, APPOINTMENT_WITH_PATIENT, PRESCRIPTION, LAB_TEST
 
 doctor_bp = Blueprint('doctor', __name__)
 
 
-# Helper function to convert dict to model instance
-def dict_to_model(model_class, data_dict):
-    """Convert dictionary to model instance for template compatibility"""
-    if not data_dict:
-        return None
-    instance = model_class()
-    for key, value in data_dict.items():
-        setattr(instance, key, value)
-    return instance
-
-
 @doctor_bp.route('/dashboard')
-@role_required('DOCTOR')
+@role_required('DOCTOR', with_profile=True)
 def dashboard():
     """Doctor dashboard"""
-    # Get doctor profile using raw SQL
-    doctor_data = fetch_one(
-        "SELECT * FROM core_doctor WHERE user_id = %s",
-        (current_user.id,)
-    )
+    # Doctor profile resolved (and cached) by role_required
+    doctor_data = g.profile
     
     if not doctor_data:
         flash('No doctor profile found for this account.', 'error')
         return render_template('doctor/dashboard.html', {})
     
-    doctor = dict_to_model(Doctor, doctor_data)
+    doctor = DOCTOR.one(doctor_data)
     doctor_id = doctor_data['doctor_id']
-    today = date.today()
+    day_start, day_end = day_bounds(date.today())
     now = datetime.now()
     
-    # Today's appointments
+    # Today's appointments (range predicate keeps the (doctor_id, date_and_time) index usable)
     today_appointments_data = fetch_all(
         """SELECT a.*, p.full_name as patient_name
            FROM core_appointment a
            INNER JOIN core_patient p ON a.patient_id = p.patient_id
-           WHERE a.doctor_id = %s AND DATE(a.date_and_time) = %s
+           WHERE a.doctor_id = %s AND a.date_and_time >= %s AND a.date_and_time < %s
            ORDER BY a.date_and_time""",
-        (doctor_id, today)
+        (doctor_id, day_start, day_end)
     )
-    today_appointments = [dict_to_model(Appointment, apt) for apt in today_appointments_data]
+    today_appointments = APPOINTMENT.many(today_appointments_data)
     
     # Upcoming appointments
     upcoming_appointments_data = fetch_all(
@@ -64,7 +56,7 @@ def dashboard():
            LIMIT 10""",
         (doctor_id, now)
     )
-    upcoming_appointments = [dict_to_model(Appointment, apt) for apt in upcoming_appointments_data]
+    upcoming_appointments = APPOINTMENT.many(upcoming_appointments_data)
     
     # Recent completed appointments
     completed_appointments_data = fetch_all(
@@ -76,7 +68,7 @@ def dashboard():
            LIMIT 5""",
         (doctor_id,)
     )
-    completed_appointments = [dict_to_model(Appointment, apt) for apt in completed_appointments_data]
+    completed_appointments = APPOINTMENT.many(completed_appointments_data)
     
     context = {
         'doctor': doctor,
@@ -89,63 +81,56 @@ def dashboard():
 
 
 @doctor_bp.route('/appointments')
-@role_required('DOCTOR')
+@role_required('DOCTOR', with_profile=True)
 def appointments():
     """List all appointments for doctor"""
-    # Get doctor profile
-    doctor_data = fetch_one(
-        "SELECT * FROM core_doctor WHERE user_id = %s",
-        (current_user.id,)
-    )
+    # Doctor profile resolved (and cached) by role_required
+    doctor_data = g.profile
     
     if not doctor_data:
         flash('No doctor profile found.', 'error')
         return redirect(url_for('auth.dashboard'))
     
-    doctor = dict_to_model(Doctor, doctor_data)
+    doctor = DOCTOR.one(doctor_data)
     doctor_id = doctor_data['doctor_id']
     
     # Build query with optional status filter
     status = request.args.get('status')
+    where_sql = "a.doctor_id = %s"
+    params = [doctor_id]
     if status:
-        appointments_data = fetch_all(
-            """SELECT a.*, p.full_name as patient_name
-               FROM core_appointment a
-               INNER JOIN core_patient p ON a.patient_id = p.patient_id
-               WHERE a.doctor_id = %s AND a.status = %s
-               ORDER BY a.date_and_time DESC""",
-            (doctor_id, status)
-        )
-    else:
-        appointments_data = fetch_all(
-            """SELECT a.*, p.full_name as patient_name
-               FROM core_appointment a
-               INNER JOIN core_patient p ON a.patient_id = p.patient_id
-               WHERE a.doctor_id = %s
-               ORDER BY a.date_and_time DESC""",
-            (doctor_id,)
-        )
-    
-    appointments = [dict_to_model(Appointment, apt) for apt in appointments_data]
-    
-    return render_template('doctor/appointments.html', appointments=appointments, doctor=doctor)
+        where_sql += " AND a.status = %s"
+        params.append(status)
+    
+    # One keyset page at a time (newest first)
+    page = paginate_appointments(
+        """SELECT a.*, p.full_name as patient_name
+           FROM core_appointment a
+           INNER JOIN core_patient p ON a.patient_id = p.patient_id""",
+        where_sql,
+        params,
+        request.args.get('cursor'),
+        current_app.config['APPOINTMENTS_PAGE_SIZE']
+    )
+    
+    appointments = APPOINTMENT.many(page.items)
+    
+    return render_template('doctor/appointments.html', appointments=appointments, doctor=doctor,
+                           status=status, next_cursor=page.next_cursor, prev_cursor=page.prev_cursor)
 
 
 @doctor_bp.route('/appointments/<int:appointment_id>', methods=['GET', 'POST'])
-@role_required('DOCTOR')
+@role_required('DOCTOR', with_profile=True)
 def appointment_detail(appointment_id):
     """View and update appointment details"""
-    # Get doctor profile
-    doctor_data = fetch_one(
-        "SELECT * FROM core_doctor WHERE user_id = %s",
-        (current_user.id,)
-    )
+    # Doctor profile resolved (and cached) by role_required
+    doctor_data = g.profile
     
     if not doctor_data:
         flash('No doctor profile found.', 'error')
         return redirect(url_for('auth.dashboard'))
     
-    doctor = dict_to_model(Doctor, doctor_data)
+    doctor = DOCTOR.one(doctor_data)
     doctor_id = doctor_data['doctor_id']
     
     # Get appointment with patient info
@@ -160,9 +145,8 @@ def appointment_detail(appointment_id):
     if not appointment_data:
         abort(404)
     
-    appointment = dict_to_model(Appointment, appointment_data)
-    patient = dict_to_model(Patient, appointment_data)
-    appointment.patient = patient
+    # .patient is built from the same joined row
+    appointment = APPOINTMENT_WITH_PATIENT.one(appointment_data)
     
     form = AppointmentUpdateForm()
     if form.validate_on_submit():
@@ -191,27 +175,9 @@ def appointment_detail(appointment_id):
         (appointment_id,)
     )
     
-    prescriptions = []
-    for presc_data in prescriptions_data:
-        prescription = dict_to_model(Prescription, presc_data)
-        # Get prescription items with medicine info
-        items_data = fetch_all(
-            """SELECT pi.*, m.name as medicine_name, m.type as medicine_type
-               FROM core_prescriptionitem pi
-               INNER JOIN core_medicine m ON pi.medicine_id = m.medicine_id
-               WHERE pi.prescription_id = %s""",
-            (presc_data['prescription_id'],)
-        )
-        items = []
-        for item_data in items_data:
-            item = dict_to_model(PrescriptionItem, item_data)
-            medicine = Medicine()
-            medicine.name = item_data['medicine_name']
-            medicine.type = item_data['medicine_type']
-            item.medicine = medicine
-            items.append(item)
-        prescription.items = items
-        prescriptions.append(prescription)
+    prescriptions = PRESCRIPTION.many(prescriptions_data)
+    # Load items for all prescriptions in one query
+    attach_prescription_items(prescriptions)
     
     context = {
         'appointment': appointment,
@@ -224,20 +190,17 @@ def appointment_detail(appointment_id):
 
 
 @doctor_bp.route('/appointments/<int:appointment_id>/prescription/create', methods=['GET', 'POST'])
-@role_required('DOCTOR')
+@role_required('DOCTOR', with_profile=True)
 def create_prescription(appointment_id):
     """Create prescription for appointment"""
-    # Get doctor profile
-    doctor_data = fetch_one(
-        "SELECT * FROM core_doctor WHERE user_id = %s",
-        (current_user.id,)
-    )
+    # Doctor profile resolved (and cached) by role_required
+    doctor_data = g.profile
     
     if not doctor_data:
         flash('No doctor profile found.', 'error')
         return redirect(url_for('auth.dashboard'))
     
-    doctor = dict_to_model(Doctor, doctor_data)
+    doctor = DOCTOR.one(doctor_data)
     doctor_id = doctor_data['doctor_id']
     
     # Get appointment
@@ -252,7 +215,7 @@ def create_prescription(appointment_id):
     if not appointment_data:
         abort(404)
     
-    appointment = dict_to_model(Appointment, appointment_data)
+    appointment = APPOINTMENT.one(appointment_data)
     
     form = PrescriptionForm()
     if form.validate_on_submit():
@@ -275,20 +238,17 @@ def create_prescription(appointment_id):
 
 
 @doctor_bp.route('/prescription/<int:prescription_id>/add-items', methods=['GET', 'POST'])
-@role_required('DOCTOR')
+@role_required('DOCTOR', with_profile=True)
 def add_prescription_items(prescription_id):
     """Add items to prescription"""
-    # Get doctor profile
-    doctor_data = fetch_one(
-        "SELECT * FROM core_doctor WHERE user_id = %s",
-        (current_user.id,)
-    )
+    # Doctor profile resolved (and cached) by role_required
+    doctor_data = g.profile
     
     if not doctor_data:
         flash('No doctor profile found.', 'error')
         return redirect(url_for('auth.dashboard'))
     
-    doctor = dict_to_model(Doctor, doctor_data)
+    doctor = DOCTOR.one(doctor_data)
     doctor_id = doctor_data['doctor_id']
     
     # Get prescription with appointment check
@@ -303,30 +263,13 @@ def add_prescription_items(prescription_id):
     if not prescription_data:
         abort(404)
     
-    prescription = dict_to_model(Prescription, prescription_data)
+    prescription = PRESCRIPTION.one(prescription_data)
     
     # Get existing items
-    existing_items_data = fetch_all(
-        """SELECT pi.*, m.name as medicine_name, m.type as medicine_type
-           FROM core_prescriptionitem pi
-           INNER JOIN core_medicine m ON pi.medicine_id = m.medicine_id
-           WHERE pi.prescription_id = %s""",
-        (prescription_id,)
-    )
+    existing_items = load_prescription_items([prescription_id])[prescription_id]
     
-    existing_items = []
-    for item_data in existing_items_data:
-        item = dict_to_model(PrescriptionItem, item_data)
-        medicine = Medicine()
-        medicine.name = item_data['medicine_name']
-        medicine.type = item_data['medicine_type']
-        item.medicine = medicine
-        existing_items.append(item)
-    
-    # Get medicines for form
-    medicines_data = fetch_all("SELECT * FROM core_medicine ORDER BY name")
+    # Medicines are picked through doctor.medicine_search; the form validates against the catalog
     form = PrescriptionItemForm()
-    form.medicine.choices = [(m['medicine_id'], m['name']) for m in medicines_data]
     
     if form.validate_on_submit():
         # Insert prescription item using raw SQL
@@ -345,8 +288,8 @@ def add_prescription_items(prescription_id):
             form.before_after_meal.data,
             form.instructions.data or ''
         ))
-        # Get medicine name for flash message
-        medicine_data = fetch_one("SELECT name FROM core_medicine WHERE medicine_id = %s", (medicine_id,))
+        # Get medicine name for flash message (from the in-memory catalog)
+        medicine_data = medicine_catalog.get(medicine_id)
         medicine_name = medicine_data['name'] if medicine_data else 'Medicine'
         flash(f'Added {medicine_name} to prescription.', 'success')
         return redirect(url_for('doctor.add_prescription_items', prescription_id=prescription_id))
@@ -360,21 +303,30 @@ def add_prescription_items(prescription_id):
     return render_template('doctor/add_prescription_items.html', **context)
 
 
-@doctor_bp.route('/lab-test/order', methods=['GET', 'POST'])
+@doctor_bp.route('/medicines/search')
 @role_required('DOCTOR')
+def medicine_search():
+    """Medicine typeahead for prescription entry (JSON, served from memory)"""
+    limit = current_app.config['MEDICINE_SEARCH_LIMIT']
+    medicines = medicine_catalog.search(request.args.get('q', ''), limit)
+    return jsonify(results=[
+        {'id': m['medicine_id'], 'name': m['name'], 'type': m['type']}
+        for m in medicines
+    ])
+
+
+@doctor_bp.route('/lab-test/order', methods=['GET', 'POST'])
+@role_required('DOCTOR', with_profile=True)
 def order_lab_test():
     """Order lab test"""
-    # Get doctor profile
-    doctor_data = fetch_one(
-        "SELECT * FROM core_doctor WHERE user_id = %s",
-        (current_user.id,)
-    )
+    # Doctor profile resolved (and cached) by role_required
+    doctor_data = g.profile
     
     if not doctor_data:
         flash('No doctor profile found.', 'error')
         return redirect(url_for('auth.dashboard'))
     
-    doctor = dict_to_model(Doctor, doctor_data)
+    doctor = DOCTOR.one(doctor_data)
     doctor_id = doctor_data['doctor_id']
     hospital_id = doctor_data['hospital_id']
     
@@ -384,12 +336,9 @@ def order_lab_test():
         (hospital_id,)
     )
     
-    # Get patients for form
-    patients_data = fetch_all("SELECT * FROM core_patient ORDER BY full_name")
-    
+    # Patients are picked through doctor.patient_search; the form validates the id
     form = LabTestForm()
     form.lab.choices = [(lab['lab_id'], lab['lab_name']) for lab in labs_data]
-    form.patient.choices = [(p['patient_id'], p['full_name']) for p in patients_data]
     
     if form.validate_on_submit():
         # Insert lab test using raw SQL
@@ -412,21 +361,30 @@ def order_lab_test():
     return render_template('doctor/lab_test_form.html', form=form, doctor=doctor)
 
 
-@doctor_bp.route('/lab-test/<int:test_id>/update', methods=['GET', 'POST'])
+@doctor_bp.route('/patients/search')
 @role_required('DOCTOR')
+def patient_search():
+    """Patient lookup-as-you-type for the lab test form (JSON)"""
+    limit = current_app.config['PATIENT_SEARCH_LIMIT']
+    patients = search_patients(request.args.get('q', ''), limit)
+    return jsonify(results=[
+        {'id': p['patient_id'], 'name': p['full_name'], 'national_id': p['national_id']}
+        for p in patients
+    ])
+
+
+@doctor_bp.route('/lab-test/<int:test_id>/update', methods=['GET', 'POST'])
+@role_required('DOCTOR', with_profile=True)
 def update_lab_test(test_id):
     """Update lab test status and result - triggers auto-billing when completed"""
-    # Get doctor profile
-    doctor_data = fetch_one(
-        "SELECT * FROM core_doctor WHERE user_id = %s",
-        (current_user.id,)
-    )
+    # Doctor profile resolved (and cached) by role_required
+    doctor_data = g.profile
     
     if not doctor_data:
         flash('No doctor profile found.', 'error')
         return redirect(url_for('auth.dashboard'))
     
-    doctor = dict_to_model(Doctor, doctor_data)
+    doctor = DOCTOR.one(doctor_data)
     doctor_id = doctor_data['doctor_id']
     
     # Get lab test with doctor check
@@ -438,63 +396,63 @@ def update_lab_test(test_id):
     if not lab_test_data:
         abort(404)
     
-    old_status = lab_test_data['status']
-    
     form = LabTestUpdateForm()
     if form.validate_on_submit():
         new_status = form.status.data
         result = form.result.data or None
         
-        # Update lab test using raw SQL
-        sql = """UPDATE core_labtest 
-                 SET status = %s, result = %s
-                 WHERE test_id = %s"""
-        execute_update(sql, (new_status, result, test_id))
+        completing = new_status == 'Completed'
+        if completing:
+            # Resolved before the transaction; cached per worker after the first lookup
+            service_type_id = get_service_type_id('Laboratory', 'Lab test services')
         
-        # Auto-billing: If status changed to 'Completed', create bill
-        if old_status != 'Completed' and new_status == 'Completed':
-            from datetime import timedelta
-            from db_utils import get_or_create
-            
-            patient_id = lab_test_data['patient_id']
-            test_cost = lab_test_data['test_cost']
-            transaction_id = f'LAB-{test_id}'
+        with transaction() as tx:
+            tx.execute(
+                """UPDATE core_labtest 
+                   SET status = %s, result = %s
+                   WHERE test_id = %s""",
+                (new_status, result, test_id)
+            )
             
-            # Check if bill already exists using raw SQL
-            existing_bill = fetch_count(
-                """SELECT COUNT(*) FROM core_bill b
-                   INNER JOIN core_servicetype st ON b.service_type_id = st.service_type_id
-                   WHERE b.patient_id = %s AND st.name = 'Laboratory' AND b.transaction_id = %s""",
-                (patient_id, transaction_id)
-            ) > 0
-            
-            if not existing_bill:
-                # Get or create Laboratory service type using raw SQL
-                lab_service_data, _ = get_or_create(
-                    'core_servicetype',
-                    {'name': 'Laboratory'},
-                    {'description': 'Lab test services'}
+            bill_created = False
+            if completing:
+                # Auto-billing whenever the test is Completed, so a test completed
+                # without its bill is billed on the next save. The UPDATE above
+                # locks the lab test row, so a concurrent save of the same test waits
+                # for this transaction and then sees its bill.
+                # uniq_bill_transaction_id (flask create-indexes) also turns a
+                # duplicate insert into a no-op.
+                transaction_id = f'LAB-{test_id}'
+                billed = tx.fetch_one(
+                    "SELECT bill_id FROM core_bill WHERE transaction_id = %s",
+                    (transaction_id,)
                 )
-                
-                service_type_id = lab_service_data['service_type_id']
-                
-                # Create bill using raw SQL
-                due_date = date.today() + timedelta(days=30)
-                bill_sql = """INSERT INTO core_bill 
-                             (patient_id, service_type_id, total_amount, status, due_date, transaction_id, bill_date)
-                             VALUES (%s, %s, %s, %s, %s, %s, %s)"""
-                execute_insert(bill_sql, (
-                    patient_id,
-                    service_type_id,
-                    test_cost,
-                    'Pending',
-                    due_date,
-                    transaction_id,
-                    date.today()
-                ))
-                flash('Lab test updated and bill created automatically.', 'success')
-            else:
-                flash('Lab test updated. Bill already exists.', 'info')
+                if not billed:
+                    today = date.today()
+                    bill_created = tx.execute(
+                        """INSERT INTO core_bill 
+                           (patient_id, service_type_id, total_amount, status, insurance_covered,
+                            discount, tax, due_date, transaction_id, bill_date)
+                           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                           ON DUPLICATE KEY UPDATE bill_id = bill_id""",
+                        (
+                            lab_test_data['patient_id'],
+                            service_type_id,
+                            lab_test_data['test_cost'],
+                            'Pending',
+                            Decimal('0.00'),
+                            Decimal('0.00'),
+                            Decimal('0.00'),
+                            today + timedelta(days=30),
+                            transaction_id,
+                            today
+                        )
+                    ) == 1
+        
+        if bill_created:
+            flash('Lab test updated and bill created automatically.', 'success')
+        elif completing:
+            flash('Lab test updated. Bill already exists.', 'info')
         else:
             flash('Lab test updated successfully.', 'success')
         
@@ -504,6 +462,6 @@ def update_lab_test(test_id):
         form.status.data = lab_test_data['status']
         form.result.data = lab_test_data.get('result', '')
     
-    lab_test = dict_to_model(LabTest, lab_test_data)
+    lab_test = LAB_TEST.one(lab_test_data)
     return render_template('doctor/lab_test_update.html', form=form, lab_test=lab_test, doctor=doctor)
 
@@ -1,42 +1,30 @@
 """
 Patient routes for Flask application
 """
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, g, current_app
 from flask_login import login_required, current_user
 from datetime import datetime
 from decorators import role_required
 from db_utils import fetch_one, fetch_all
-from models import Patient, Appointment, Bill, PharmacyBill, Pharmacy, PatientEmergencyContact, Doctor, Prescription, PrescriptionItem, Medicine
+from services.prescriptions import attach_prescription_items
+from services.pagination import paginate_appointments
+from services.rows import PATIENT, EMERGENCY_CONTACT, APPOINTMENT, BILL, PHARMACY_BILL, PRESCRIPTION
 
 patient_bp = Blueprint('patient', __name__)
 
 
-# Helper function to convert dict to model instance
-def dict_to_model(model_class, data_dict):
-    """Convert dictionary to model instance for template compatibility"""
-    if not data_dict:
-        return None
-    instance = model_class()
-    for key, value in data_dict.items():
-        setattr(instance, key, value)
-    return instance
-
-
 @patient_bp.route('/dashboard')
-@role_required('PATIENT')
+@role_required('PATIENT', with_profile=True)
 def dashboard():
     """Patient dashboard"""
-    # Get patient profile
-    patient_data = fetch_one(
-        "SELECT * FROM core_patient WHERE user_id = %s",
-        (current_user.id,)
-    )
+    # Patient profile resolved (and cached) by role_required
+    patient_data = g.profile
     
     if not patient_data:
         flash('No patient profile found for this account.', 'error')
         return render_template('patient/dashboard.html', {})
     
-    patient = dict_to_model(Patient, patient_data)
+    patient = PATIENT.one(patient_data)
     patient_id = patient_data['patient_id']
     now = datetime.now()
     
@@ -45,7 +33,7 @@ def dashboard():
         "SELECT * FROM core_patientemergencycontact WHERE patient_id = %s AND is_primary = 1",
         (patient_id,)
     )
-    emergency_contacts = [dict_to_model(PatientEmergencyContact, ec) for ec in emergency_contacts_data]
+    emergency_contacts = EMERGENCY_CONTACT.many(emergency_contacts_data)
     
     # Upcoming appointments
     upcoming_appointments_data = fetch_all(
@@ -58,7 +46,7 @@ def dashboard():
            LIMIT 5""",
         (patient_id, now)
     )
-    upcoming_appointments = [dict_to_model(Appointment, apt) for apt in upcoming_appointments_data]
+    upcoming_appointments = APPOINTMENT.many(upcoming_appointments_data)
     
     # Recent bills
     recent_bills_data = fetch_all(
@@ -70,7 +58,7 @@ def dashboard():
            LIMIT 5""",
         (patient_id,)
     )
-    recent_bills = [dict_to_model(Bill, bill) for bill in recent_bills_data]
+    recent_bills = BILL.many(recent_bills_data)
     
     context = {
         'patient': patient,
@@ -83,51 +71,48 @@ def dashboard():
 
 
 @patient_bp.route('/appointments')
-@role_required('PATIENT')
+@role_required('PATIENT', with_profile=True)
 def appointments():
     """List all appointments for patient"""
-    # Get patient profile
-    patient_data = fetch_one(
-        "SELECT * FROM core_patient WHERE user_id = %s",
-        (current_user.id,)
-    )
+    # Patient profile resolved (and cached) by role_required
+    patient_data = g.profile
     
     if not patient_data:
         flash('No patient profile found.', 'error')
         return redirect(url_for('auth.dashboard'))
     
-    patient = dict_to_model(Patient, patient_data)
+    patient = PATIENT.one(patient_data)
     patient_id = patient_data['patient_id']
     
-    appointments_data = fetch_all(
+    # One keyset page at a time (newest first)
+    page = paginate_appointments(
         """SELECT a.*, d.full_name as doctor_name, d.specialization, h.name as hospital_name
            FROM core_appointment a
            INNER JOIN core_doctor d ON a.doctor_id = d.doctor_id
-           INNER JOIN core_hospital h ON d.hospital_id = h.hospital_id
-           WHERE a.patient_id = %s
-           ORDER BY a.date_and_time DESC""",
-        (patient_id,)
+           INNER JOIN core_hospital h ON d.hospital_id = h.hospital_id""",
+        "a.patient_id = %s",
+        (patient_id,),
+        request.args.get('cursor'),
+        current_app.config['APPOINTMENTS_PAGE_SIZE']
     )
-    appointments = [dict_to_model(Appointment, apt) for apt in appointments_data]
+    appointments = APPOINTMENT.many(page.items)
     
-    return render_template('patient/appointments.html', appointments=appointments, patient=patient)
+    return render_template('patient/appointments.html', appointments=appointments, patient=patient,
+                           next_cursor=page.next_cursor, prev_cursor=page.prev_cursor)
 
 
 @patient_bp.route('/appointments/<int:appointment_id>')
-@role_required('PATIENT')
+@role_required('PATIENT', with_profile=True)
 def appointment_detail(appointment_id):
     """View appointment details"""
-    # Get patient profile
-    patient_data = fetch_one(
-        "SELECT * FROM core_patient WHERE user_id = %s",
-        (current_user.id,)
-    )
+    # Patient profile resolved (and cached) by role_required
+    patient_data = g.profile
     
     if not patient_data:
         flash('No patient profile found.', 'error')
         return redirect(url_for('auth.dashboard'))
     
-    patient = dict_to_model(Patient, patient_data)
+    patient = PATIENT.one(patient_data)
     patient_id = patient_data['patient_id']
     
     # Get appointment with doctor info
@@ -145,11 +130,8 @@ def appointment_detail(appointment_id):
     if not appointment_data:
         abort(404)
     
-    appointment = dict_to_model(Appointment, appointment_data)
-    doctor = Doctor()
-    doctor.full_name = appointment_data['doctor_name']
-    doctor.specialization = appointment_data['specialization']
-    appointment.doctor = doctor
+    # .doctor is built from the joined doctor_name / specialization
+    appointment = APPOINTMENT.one(appointment_data)
     
     # Get prescriptions with items
     prescriptions_data = fetch_all(
@@ -157,28 +139,9 @@ def appointment_detail(appointment_id):
         (appointment_id,)
     )
     
-    prescriptions = []
-    for presc_data in prescriptions_data:
-        prescription = dict_to_model(Prescription, presc_data)
-        # Get prescription items
-        items_data = fetch_all(
-            """SELECT pi.*, m.name as medicine_name, m.type as medicine_type
-               FROM core_prescriptionitem pi
-               INNER JOIN core_medicine m ON pi.medicine_id = m.medicine_id
-               WHERE pi.prescription_id = %s""",
-            (presc_data['prescription_id'],)
-        )
-        items = []
-        for item_data in items_data:
-            item = dict_to_model(PrescriptionItem, item_data)
-            from models import Medicine
-            medicine = Medicine()
-            medicine.name = item_data['medicine_name']
-            medicine.type = item_data['medicine_type']
-            item.medicine = medicine
-            items.append(item)
-        prescription.items = items
-        prescriptions.append(prescription)
+    prescriptions = PRESCRIPTION.many(prescriptions_data)
+    # Load items for all prescriptions in one query
+    attach_prescription_items(prescriptions)
     
     context = {
         'appointment': appointment,
@@ -190,20 +153,17 @@ def appointment_detail(appointment_id):
 
 
 @patient_bp.route('/bills')
-@role_required('PATIENT')
+@role_required('PATIENT', with_profile=True)
 def bills():
     """View all bills"""
-    # Get patient profile
-    patient_data = fetch_one(
-        "SELECT * FROM core_patient WHERE user_id = %s",
-        (current_user.id,)
-    )
+    # Patient profile resolved (and cached) by role_required
+    patient_data = g.profile
     
     if not patient_data:
         flash('No patient profile found.', 'error')
         return redirect(url_for('auth.dashboard'))
     
-    patient = dict_to_model(Patient, patient_data)
+    patient = PATIENT.one(patient_data)
     patient_id = patient_data['patient_id']
     
     # Get all bills
@@ -215,7 +175,7 @@ def bills():
            ORDER BY b.bill_date DESC""",
         (patient_id,)
     )
-    bills = [dict_to_model(Bill, bill) for bill in bills_data]
+    bills = BILL.many(bills_data)
     
     # Get pharmacy bills with JOINs
     pharmacy_bills_data = fetch_all(
@@ -227,16 +187,8 @@ def bills():
            ORDER BY pb.purchase_date DESC""",
         (patient_id,)
     )
-    
-    pharmacy_bills = []
-    for pb_data in pharmacy_bills_data:
-        pb = dict_to_model(PharmacyBill, pb_data)
-        bill = dict_to_model(Bill, pb_data)
-        pharmacy = Pharmacy()
-        pharmacy.name = pb_data['pharmacy_name']
-        pb.bill = bill
-        pb.pharmacy = pharmacy
-        pharmacy_bills.append(pb)
+    # .bill is built from the same joined row, .pharmacy from pharmacy_name
+    pharmacy_bills = PHARMACY_BILL.many(pharmacy_bills_data)
     
     context = {
         'bills': bills,
@@ -248,20 +200,17 @@ def bills():
 
 
 @patient_bp.route('/profile')
-@role_required('PATIENT')
+@role_required('PATIENT', with_profile=True)
 def profile():
     """View patient profile"""
-    # Get patient profile
-    patient_data = fetch_one(
-        "SELECT * FROM core_patient WHERE user_id = %s",
-        (current_user.id,)
-    )
+    # Patient profile resolved (and cached) by role_required
+    patient_data = g.profile
     
     if not patient_data:
         flash('No patient profile found.', 'error')
         return redirect(url_for('auth.dashboard'))
     
-    patient = dict_to_model(Patient, patient_data)
+    patient = PATIENT.one(patient_data)
     patient_id = patient_data['patient_id']
     
     # Get emergency contacts
@@ -269,7 +218,7 @@ def profile():
         "SELECT * FROM core_patientemergencycontact WHERE patient_id = %s",
         (patient_id,)
     )
-    emergency_contacts = [dict_to_model(PatientEmergencyContact, ec) for ec in emergency_contacts_data]
+    emergency_contacts = EMERGENCY_CONTACT.many(emergency_contacts_data)
     
     context = {
         'patient': patient,
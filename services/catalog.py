@@ -0,0 +1,67 @@
+"""
+In-process medicine catalog for prescription entry.
+
+The catalog is small and read on every prescription page, so it is kept in
+memory as a sorted name index (parallel list + array of ids, searched with
+bisect) and an id -> record map, reloaded from core_medicine at most every
+MEDICINE_CATALOG_TTL seconds. Each worker process has its own copy, so a
+medicine added or renamed in the database (the app itself never writes
+core_medicine; flask load-data / generate-data and manual SQL do) can take
+up to that long to appear in search or pass prescription validation.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional
+from config import Config
+from db_utils import fetch_all
+
+
+class MedicineCatalog:
+    """Sorted prefix index and id map over core_medicine"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._loaded_at = None
+        # (lower-cased names sorted, array of medicine_id at the same positions, id -> record)
+        self._index = ([], array('q'), {})
+        self._reload_lock = threading.Lock()
+
+    def _is_stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    def _ensure_loaded(self) -> None:
+        if not self._is_stale():
+            return
+        with self._reload_lock:
+            if not self._is_stale():
+                return
+            rows = fetch_all("SELECT medicine_id, name, type FROM core_medicine")
+            rows.sort(key=lambda row: (row['name'].lower(), row['medicine_id']))
+            names = [row['name'].lower() for row in rows]
+            ids = array('q', (row['medicine_id'] for row in rows))
+            by_id = {row['medicine_id']: row for row in rows}
+            # Swap in one tuple so readers never see a partial index
+            self._index = (names, ids, by_id)
+            self._loaded_at = time.monotonic()
+
+    def get(self, medicine_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        """Medicine record (medicine_id, name, type) by id, or None"""
+        self._ensure_loaded()
+        return self._index[2].get(medicine_id)
+
+    def search(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        """Medicines whose name starts with prefix (case-insensitive), by name"""
+        self._ensure_loaded()
+        names, ids, by_id = self._index
+        prefix = (prefix or '').strip().lower()
+        results = []
+        position = bisect_left(names, prefix)
+        while position < len(names) and len(results) < limit and names[position].startswith(prefix):
+            results.append(by_id[ids[position]])
+            position += 1
+        return results
+
+
+medicine_catalog = MedicineCatalog(ttl=Config.MEDICINE_CATALOG_TTL)
@@ -0,0 +1,102 @@
+"""
+Hospital admin dashboard statistics using raw SQL.
+All counters and the appointments-per-day chart come from one query.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from db_utils import fetch_one, fetch_all
+from utils import day_bounds
+
+# Number of days shown in the dashboard appointments chart (ending today)
+CHART_DAYS = 7
+
+
+@dataclass(frozen=True)
+class DailyCount:
+    """Appointment count for one calendar day"""
+    day: date
+    count: int
+    
+    @property
+    def label(self) -> str:
+        return self.day.strftime('%b %d')
+
+
+@dataclass(frozen=True)
+class DashboardStats:
+    """Everything the admin dashboard displays for one hospital"""
+    departments_count: int
+    doctors_count: int
+    labs_count: int
+    today_appointments: int
+    appointments_per_day: Tuple[DailyCount, ...]
+    recent_appointments: Tuple[Dict[str, Any], ...]
+    
+    def chart_data(self) -> List[Dict[str, Any]]:
+        """Chart rows in the {'date': 'Jan 01', 'count': n} shape the template expects"""
+        return [{'date': day.label, 'count': day.count} for day in self.appointments_per_day]
+
+
+def _build_stats_sql(days: int) -> str:
+    day_columns = ',\n                  '.join(
+        f"COALESCE(SUM(a.date_and_time >= %s AND a.date_and_time < %s), 0) AS day_{i}"
+        for i in range(days)
+    )
+    return f"""SELECT (SELECT COUNT(*) FROM core_department WHERE hospital_id = %s) AS departments_count,
+                  (SELECT COUNT(*) FROM core_doctor WHERE hospital_id = %s) AS doctors_count,
+                  (SELECT COUNT(*) FROM core_lab WHERE hospital_id = %s) AS labs_count,
+                  {day_columns}
+           FROM core_appointment a
+           INNER JOIN core_doctor d ON a.doctor_id = d.doctor_id
+           WHERE d.hospital_id = %s AND a.date_and_time >= %s AND a.date_and_time < %s"""
+
+
+_STATS_SQL = _build_stats_sql(CHART_DAYS)
+
+
+def get_dashboard_stats(hospital_id: int, today: Optional[date] = None,
+                        recent_limit: int = 10) -> DashboardStats:
+    """
+    Compute dashboard counters, the appointments chart and recent appointments.
+    
+    Args:
+        hospital_id: Hospital to report on
+        today: Last day of the chart (defaults to date.today())
+        recent_limit: Number of recent appointments to return
+    
+    Returns:
+        DashboardStats for the hospital
+    """
+    today = today or date.today()
+    days = [today - timedelta(days=offset) for offset in range(CHART_DAYS - 1, -1, -1)]
+    bounds = [day_bounds(day)[0] for day in days]
+    bounds.append(day_bounds(today)[1])
+    
+    params: List[Any] = [hospital_id, hospital_id, hospital_id]
+    for i in range(CHART_DAYS):
+        params.extend((bounds[i], bounds[i + 1]))
+    params.extend((hospital_id, bounds[0], bounds[-1]))
+    
+    row = fetch_one(_STATS_SQL, tuple(params))
+    per_day = tuple(DailyCount(day, int(row[f'day_{i}'])) for i, day in enumerate(days))
+    
+    recent_appointments = fetch_all(
+        """SELECT a.*, d.full_name as doctor_name, p.full_name as patient_name
+           FROM core_appointment a
+           INNER JOIN core_doctor d ON a.doctor_id = d.doctor_id
+           INNER JOIN core_patient p ON a.patient_id = p.patient_id
+           WHERE d.hospital_id = %s
+           ORDER BY a.date_and_time DESC
+           LIMIT %s""",
+        (hospital_id, recent_limit)
+    )
+    
+    return DashboardStats(
+        departments_count=int(row['departments_count']),
+        doctors_count=int(row['doctors_count']),
+        labs_count=int(row['labs_count']),
+        today_appointments=per_day[-1].count,
+        appointments_per_day=per_day,
+        recent_appointments=tuple(recent_appointments),
+    )
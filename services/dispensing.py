@@ -0,0 +1,231 @@
+"""
+Whole-prescription dispensing using raw SQL.
+
+A pharmacy can hold several batches of the same medicine (core_pharmacymedicine
+is unique on pharmacy, medicine and batch number). Dispensing allocates every
+prescription item across the unexpired batches first-expiry-first-out, then
+writes the stock decrements, the core_bill and the core_pharmacybill in one
+transaction.
+"""
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from db_utils import transaction
+from services.reference import get_service_type_id
+from utils import ValidationError, validate_prescription_expiry
+
+# Days until a pharmacy bill is due
+BILL_DUE_DAYS = 30
+
+
+@dataclass(frozen=True)
+class BatchAllocation:
+    """Quantity taken from one pharmacy stock batch"""
+    pharmacy_medicine_id: int
+    medicine_id: int
+    batch_number: str
+    expiry_date: date
+    quantity: int
+    unit_price: Decimal
+
+    @property
+    def amount(self) -> Decimal:
+        return self.unit_price * self.quantity
+
+
+@dataclass(frozen=True)
+class DispenseResult:
+    """Outcome of dispensing a prescription"""
+    bill_id: int
+    pharmacy_bill_id: int
+    total_amount: Decimal
+    allocations: Tuple[BatchAllocation, ...]
+
+
+def allocate_fefo(items: Iterable[Dict[str, Any]], batches: Iterable[Dict[str, Any]],
+                  today: date) -> List[BatchAllocation]:
+    """
+    Allocate requested quantities across batches, earliest expiry first.
+
+    Args:
+        items: Dicts with medicine_id, quantity and name (one per medicine)
+        batches: core_pharmacymedicine rows for the pharmacy
+        today: Batches expiring before this date are skipped
+
+    Returns:
+        List of BatchAllocation covering every item
+
+    Raises:
+        ValidationError: If any medicine lacks enough unexpired stock
+    """
+    batches_by_medicine: Dict[int, List[Dict[str, Any]]] = {}
+    for batch in batches:
+        if batch['expiry_date'] < today or batch['stock_quantity'] <= 0:
+            continue
+        batches_by_medicine.setdefault(batch['medicine_id'], []).append(batch)
+
+    allocations = []
+    shortages = []
+    for item in items:
+        needed = item['quantity']
+        candidates = sorted(
+            batches_by_medicine.get(item['medicine_id'], []),
+            key=lambda batch: (batch['expiry_date'], batch['pharmacy_medicine_id'])
+        )
+        available = sum(batch['stock_quantity'] for batch in candidates)
+        if available < needed:
+            shortages.append(f"{item.get('name', item['medicine_id'])} (requested {needed}, available {available})")
+            continue
+        for batch in candidates:
+            if needed == 0:
+                break
+            take = min(needed, batch['stock_quantity'])
+            allocations.append(BatchAllocation(
+                pharmacy_medicine_id=batch['pharmacy_medicine_id'],
+                medicine_id=batch['medicine_id'],
+                batch_number=batch['batch_number'],
+                expiry_date=batch['expiry_date'],
+                quantity=take,
+                unit_price=Decimal(batch['unit_price']),
+            ))
+            needed -= take
+
+    if shortages:
+        raise ValidationError("Insufficient stock for " + ", ".join(shortages))
+    return allocations
+
+
+def take_stock(tx, pharmacy_id: int, items: List[Dict[str, Any]], today: date) -> List[BatchAllocation]:
+    """
+    Lock a pharmacy's unexpired batches of the items' medicines and decrement them.
+
+    The batches are locked with SELECT ... FOR UPDATE, allocated with
+    allocate_fefo() and decremented in one UPDATE. Every stock decrement
+    goes through here, so concurrent dispensing can never oversell.
+
+    Args:
+        tx: Open db_utils.Transaction; the locks are held until it ends
+        pharmacy_id: Pharmacy to take the stock from
+        items: Dicts with medicine_id, quantity and name (one per medicine)
+        today: Batches expiring before this date are not used
+
+    Returns:
+        The BatchAllocation of every batch decremented
+
+    Raises:
+        ValidationError: If any medicine lacks enough unexpired stock
+    """
+    medicine_ids = [item['medicine_id'] for item in items]
+    placeholders = ', '.join(['%s'] * len(medicine_ids))
+    batches = tx.fetch_all(
+        f"""SELECT pharmacy_medicine_id, medicine_id, stock_quantity, unit_price,
+                   expiry_date, batch_number
+            FROM core_pharmacymedicine
+            WHERE pharmacy_id = %s AND medicine_id IN ({placeholders})
+              AND expiry_date >= %s AND stock_quantity > 0
+            ORDER BY pharmacy_medicine_id
+            FOR UPDATE""",
+        (pharmacy_id, *medicine_ids, today)
+    )
+    allocations = allocate_fefo(items, batches, today)
+
+    # All decrements in one statement
+    cases = ' '.join(['WHEN %s THEN %s'] * len(allocations))
+    id_placeholders = ', '.join(['%s'] * len(allocations))
+    case_params = [value for a in allocations for value in (a.pharmacy_medicine_id, a.quantity)]
+    tx.execute(
+        f"""UPDATE core_pharmacymedicine
+            SET stock_quantity = stock_quantity - CASE pharmacy_medicine_id {cases} END
+            WHERE pharmacy_medicine_id IN ({id_placeholders})""",
+        (*case_params, *(a.pharmacy_medicine_id for a in allocations))
+    )
+    return allocations
+
+
+def dispense_prescription(prescription_id: int, pharmacy_id: int,
+                          today: Optional[date] = None) -> DispenseResult:
+    """
+    Dispense every item of a prescription from a pharmacy and bill the patient.
+
+    A prescription can be dispensed once plus refill_count refills. The
+    prescription row is locked first, so concurrent dispenses of the same
+    prescription run one after the other and the later one sees the earlier
+    core_pharmacybill. Stock is then taken with take_stock(), so concurrent
+    dispenses cannot oversell.
+
+    Args:
+        prescription_id: core_prescription primary key
+        pharmacy_id: Pharmacy dispensing the medicines
+        today: Dispensing date (defaults to date.today())
+
+    Returns:
+        DispenseResult with the bill ids, total and batch allocations
+
+    Raises:
+        ValidationError: If the prescription is missing, expired, already
+            dispensed (with no refills left), empty or cannot be covered by
+            unexpired stock
+    """
+    today = today or date.today()
+    service_type_id = get_service_type_id('Pharmacy', 'Medicine purchase')
+
+    with transaction() as tx:
+        # Lock the prescription so concurrent dispenses of it are serialized
+        prescription = tx.fetch_one(
+            """SELECT p.prescription_id, p.valid_until, p.refill_count, a.patient_id
+               FROM core_prescription p
+               INNER JOIN core_appointment a ON p.appointment_id = a.appointment_id
+               WHERE p.prescription_id = %s
+               FOR UPDATE""",
+            (prescription_id,)
+        )
+        if not prescription:
+            raise ValidationError("Prescription not found")
+        is_valid, message = validate_prescription_expiry(prescription)
+        if not is_valid:
+            raise ValidationError(message)
+
+        dispensed = tx.fetch_one(
+            "SELECT COUNT(*) AS times FROM core_pharmacybill WHERE prescription_id = %s",
+            (prescription_id,)
+        )['times']
+        if dispensed > prescription['refill_count']:
+            if prescription['refill_count']:
+                raise ValidationError(
+                    f"Prescription has no refills left (dispensed {dispensed} times, "
+                    f"{prescription['refill_count']} refills allowed)"
+                )
+            raise ValidationError("Prescription has already been dispensed")
+
+        items = tx.fetch_all(
+            """SELECT pi.medicine_id, SUM(pi.quantity) AS quantity, MAX(m.name) AS name
+               FROM core_prescriptionitem pi
+               INNER JOIN core_medicine m ON pi.medicine_id = m.medicine_id
+               WHERE pi.prescription_id = %s
+               GROUP BY pi.medicine_id
+               ORDER BY pi.medicine_id""",
+            (prescription_id,)
+        )
+        if not items:
+            raise ValidationError("Prescription has no items to dispense")
+
+        allocations = take_stock(tx, pharmacy_id, items, today)
+
+        total_amount = sum((a.amount for a in allocations), Decimal('0.00'))
+        bill_id = tx.insert(
+            """INSERT INTO core_bill
+               (patient_id, service_type_id, bill_date, total_amount, status,
+                insurance_covered, discount, tax, due_date, transaction_id)
+               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+            (prescription['patient_id'], service_type_id, today, total_amount,
+             'Pending', Decimal('0.00'), Decimal('0.00'), Decimal('0.00'),
+             today + timedelta(days=BILL_DUE_DAYS), None)
+        )
+        pharmacy_bill_id = tx.insert(
+            """INSERT INTO core_pharmacybill (pharmacy_id, bill_id, purchase_date, prescription_id)
+               VALUES (%s, %s, %s, %s)""",
+            (pharmacy_id, bill_id, today, prescription_id)
+        )
+
+    return DispenseResult(bill_id, pharmacy_bill_id, total_amount, tuple(allocations))
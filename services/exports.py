@@ -0,0 +1,183 @@
+"""
+CSV exports of a hospital's appointments, lab tests and bills using raw SQL.
+
+Rows come from db_utils.stream() (an unbuffered server-side cursor) and are
+encoded a few hundred at a time, optionally through a gzip compressor, so a
+year of data for a large hospital is never held in memory: the response
+body is a generator of byte chunks that Flask sends as a chunked response.
+
+Bills have no hospital column; a bill belongs to a hospital through its
+pharmacy (core_pharmacybill) or, for lab bills, through the lab test named
+by its ``LAB-<test_id>`` transaction_id. Both are found from the bills in
+the date range (idx_bill_date), never by scanning the hospital's history.
+Other bills (e.g. consultations) cannot be attributed to a hospital and
+are not exported.
+"""
+import csv
+import io
+import zlib
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+from db_utils import stream
+from utils import day_bounds
+
+# Default export range when ?start= is not given (ending today)
+DEFAULT_EXPORT_DAYS = 30
+
+# Rows encoded per response chunk
+FLUSH_ROWS = 500
+
+# zlib wbits for a gzip container (header and CRC) instead of a raw zlib stream
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+# Spreadsheet apps evaluate cells starting with these as formulas
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+@dataclass(frozen=True)
+class Export:
+    """One export: CSV header (the SELECT column aliases, in order), query and its parameters"""
+    columns: Tuple[str, ...]
+    sql: str
+    params: Callable[[int, date, date], Tuple]
+
+
+def _datetime_range_params(hospital_id: int, start: date, end: date) -> Tuple:
+    return hospital_id, day_bounds(start)[0], day_bounds(end)[1]
+
+
+def _bill_params(hospital_id: int, start: date, end: date) -> Tuple:
+    return hospital_id, start, end, start, end, hospital_id
+
+
+_BILL_COLUMNS = """b.bill_id, b.bill_date, b.due_date, b.status, st.name AS service_type,
+                  b.patient_id, p.full_name AS patient_name, b.total_amount,
+                  b.insurance_covered, b.discount, b.tax, b.transaction_id"""
+
+EXPORTS: Dict[str, Export] = {
+    'appointments': Export(
+        columns=('appointment_id', 'date_and_time', 'status', 'visit_type', 'patient_id', 'patient_name',
+                 'doctor_id', 'doctor_name', 'dept_name', 'reason_for_visit', 'diagnosis', 'follow_up_date'),
+        sql="""SELECT a.appointment_id, a.date_and_time, a.status, a.visit_type,
+                      a.patient_id, p.full_name AS patient_name,
+                      a.doctor_id, d.full_name AS doctor_name, dept.dept_name,
+                      a.reason_for_visit, a.diagnosis, a.follow_up_date
+               FROM core_appointment a
+               INNER JOIN core_doctor d ON a.doctor_id = d.doctor_id
+               INNER JOIN core_patient p ON a.patient_id = p.patient_id
+               LEFT JOIN core_department dept ON d.dept_id = dept.dept_id
+               WHERE d.hospital_id = %s AND a.date_and_time >= %s AND a.date_and_time < %s
+               ORDER BY a.date_and_time, a.appointment_id""",
+        params=_datetime_range_params,
+    ),
+    'lab_tests': Export(
+        columns=('test_id', 'date_and_time', 'lab_name', 'test_type', 'status', 'patient_id', 'patient_name',
+                 'ordered_by', 'test_cost', 'result', 'remarks'),
+        sql="""SELECT t.test_id, t.date_and_time, l.lab_name, t.test_type, t.status,
+                      t.patient_id, p.full_name AS patient_name, d.full_name AS ordered_by,
+                      t.test_cost, t.result, t.remarks
+               FROM core_labtest t
+               INNER JOIN core_lab l ON t.lab_id = l.lab_id
+               INNER JOIN core_patient p ON t.patient_id = p.patient_id
+               INNER JOIN core_doctor d ON t.ordered_by_id = d.doctor_id
+               WHERE l.hospital_id = %s AND t.date_and_time >= %s AND t.date_and_time < %s
+               ORDER BY t.date_and_time, t.test_id""",
+        params=_datetime_range_params,
+    ),
+    'bills': Export(
+        columns=('bill_id', 'bill_date', 'due_date', 'status', 'service_type', 'patient_id', 'patient_name',
+                 'total_amount', 'insurance_covered', 'discount', 'tax', 'transaction_id', 'source', 'issued_by'),
+        sql=f"""SELECT {_BILL_COLUMNS}, 'Pharmacy' AS source, ph.name AS issued_by
+                FROM core_pharmacybill pb
+                INNER JOIN core_pharmacy ph ON pb.pharmacy_id = ph.pharmacy_id
+                INNER JOIN core_bill b ON pb.bill_id = b.bill_id
+                INNER JOIN core_servicetype st ON b.service_type_id = st.service_type_id
+                INNER JOIN core_patient p ON b.patient_id = p.patient_id
+                WHERE ph.hospital_id = %s AND b.bill_date >= %s AND b.bill_date <= %s
+                UNION ALL
+                SELECT {_BILL_COLUMNS}, 'Lab' AS source, l.lab_name AS issued_by
+                FROM core_bill b
+                INNER JOIN core_labtest t ON t.test_id = CAST(SUBSTRING(b.transaction_id, 5) AS UNSIGNED)
+                INNER JOIN core_lab l ON t.lab_id = l.lab_id
+                INNER JOIN core_servicetype st ON b.service_type_id = st.service_type_id
+                INNER JOIN core_patient p ON b.patient_id = p.patient_id
+                WHERE b.bill_date >= %s AND b.bill_date <= %s AND b.transaction_id LIKE 'LAB-%%'
+                  AND l.hospital_id = %s
+                ORDER BY bill_date, bill_id""",
+        params=_bill_params,
+    ),
+}
+
+
+def parse_export_range(start: Optional[str], end: Optional[str],
+                       today: Optional[date] = None) -> Tuple[date, date]:
+    """
+    Parse the inclusive ?start=&end= (YYYY-MM-DD) range of an export.
+
+    Missing end defaults to today and missing start to DEFAULT_EXPORT_DAYS
+    days before end.
+
+    Raises:
+        ValueError: If a date is malformed or start is after end
+    """
+    end_date = date.fromisoformat(end) if end else (today or date.today())
+    start_date = date.fromisoformat(start) if start else end_date - timedelta(days=DEFAULT_EXPORT_DAYS - 1)
+    if start_date > end_date:
+        raise ValueError('start must not be after end')
+    return start_date, end_date
+
+
+def export_rows(kind: str, hospital_id: int, start: date, end: date) -> Iterator[Dict[str, Any]]:
+    """Stream the rows of one export for a hospital and inclusive date range"""
+    export = EXPORTS[kind]
+    return stream(export.sql, export.params(hospital_id, start, end))
+
+
+def _cell(value):
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(columns: Iterable[str], rows: Iterable[Dict[str, Any]], compress: bool = False,
+               flush_rows: int = FLUSH_ROWS) -> Iterator[bytes]:
+    """
+    Encode rows as UTF-8 CSV (with a BOM so Excel detects the encoding).
+
+    Args:
+        columns: Header row; row dicts must have their values in this order
+        rows: Row dicts, e.g. from export_rows()
+        compress: Gzip the output
+        flush_rows: Rows per yielded chunk
+
+    Yields:
+        Chunks of CSV (or gzip) bytes
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, GZIP_WBITS) if compress else None
+
+    def drain() -> bytes:
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    pending = 0
+    for row in rows:
+        writer.writerow([_cell(value) for value in row.values()])
+        pending += 1
+        if pending >= flush_rows:
+            pending = 0
+            chunk = drain()
+            # The compressor buffers internally and often returns nothing yet
+            if chunk:
+                yield chunk
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
@@ -0,0 +1,51 @@
+"""
+Hospital lookups for the current admin using raw SQL.
+Hospital rows change rarely, so they are cached per hospital_id instead of
+being lazy-loaded through the ORM relationship on current_user.
+"""
+from typing import Optional
+from flask import g
+from flask_login import current_user
+from cache_utils import TTLCache
+from config import Config
+from db_utils import fetch_one
+from models import Hospital
+
+# hospital_id -> core_hospital row (or None if it does not exist)
+hospital_cache = TTLCache(maxsize=Config.HOSPITAL_CACHE_SIZE, ttl=Config.HOSPITAL_CACHE_TTL, name='hospitals')
+
+
+def get_hospital(hospital_id: Optional[int]) -> Optional[Hospital]:
+    """
+    Get a hospital as a detached Hospital object (no ORM session involved).
+    
+    Args:
+        hospital_id: core_hospital primary key (None returns None)
+    
+    Returns:
+        Hospital object, or None if not found
+    """
+    if hospital_id is None:
+        return None
+    hospital_data = hospital_cache.get_or_load(
+        hospital_id,
+        lambda: fetch_one("SELECT * FROM core_hospital WHERE hospital_id = %s", (hospital_id,))
+    )
+    if not hospital_data:
+        return None
+    hospital = Hospital()
+    for key, value in hospital_data.items():
+        setattr(hospital, key, value)
+    return hospital
+
+
+def invalidate_hospital(hospital_id: int) -> None:
+    """Drop a cached hospital; call after updating core_hospital"""
+    hospital_cache.invalidate(hospital_id)
+
+
+def current_hospital() -> Optional[Hospital]:
+    """Hospital of the logged-in user, resolved once per request"""
+    if '_current_hospital' not in g:
+        g._current_hospital = get_hospital(getattr(current_user, 'hospital_id', None))
+    return g._current_hospital
@@ -0,0 +1,107 @@
+"""
+Keyset (cursor) pagination for appointment lists using raw SQL.
+
+Pages are ordered newest first on (date_and_time, appointment_id) and
+continue from the last row seen instead of using OFFSET, so each page is a
+short range scan on the (doctor_id, date_and_time) or
+(patient_id, date_and_time) index no matter how deep the user pages.
+"""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from db_utils import fetch_all
+
+NEXT = 'next'
+PREV = 'prev'
+
+
+@dataclass(frozen=True)
+class Page:
+    """One page of rows plus opaque cursors for the neighbouring pages"""
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+
+def encode_cursor(direction: str, date_and_time: datetime, appointment_id: int) -> str:
+    """Encode a page boundary as an opaque URL-safe token"""
+    payload = json.dumps([direction, date_and_time.isoformat(), appointment_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: Optional[str]) -> Optional[Tuple[str, datetime, int]]:
+    """
+    Decode a cursor produced by encode_cursor().
+
+    Returns:
+        (direction, date_and_time, appointment_id), or None if the token is
+        missing or malformed
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, moment, appointment_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if direction not in (NEXT, PREV):
+            return None
+        return direction, datetime.fromisoformat(moment), int(appointment_id)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+
+
+def _boundary(direction, row):
+    return encode_cursor(direction, row['date_and_time'], row['appointment_id'])
+
+
+def paginate_appointments(select_sql: str, where_sql: str, params: Sequence[Any],
+                          cursor: Optional[str], page_size: int) -> Page:
+    """
+    Fetch one page of appointments, newest first.
+
+    Args:
+        select_sql: "SELECT ... FROM core_appointment a ..." without WHERE/ORDER BY
+        where_sql: Filter on the appointment alias ``a``, e.g. "a.doctor_id = %s"
+        params: Parameters for where_sql
+        cursor: Token from a previous Page (None for the first page)
+        page_size: Maximum rows per page
+
+    Returns:
+        Page with the rows and next/prev cursors (None at either end)
+    """
+    position = decode_cursor(cursor)
+    conditions = [where_sql]
+    query_params = list(params)
+    order = 'DESC'
+
+    if position:
+        direction, moment, appointment_id = position
+        if direction == NEXT:
+            conditions.append("a.date_and_time <= %s AND (a.date_and_time < %s OR a.appointment_id < %s)")
+        else:
+            conditions.append("a.date_and_time >= %s AND (a.date_and_time > %s OR a.appointment_id > %s)")
+            order = 'ASC'
+        query_params.extend((moment, moment, appointment_id))
+
+    rows = fetch_all(
+        f"""{select_sql}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY a.date_and_time {order}, a.appointment_id {order}
+            LIMIT %s""",
+        tuple(query_params) + (page_size + 1,)
+    )
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if order == 'ASC':
+        # Walking backwards: restore newest-first order
+        rows.reverse()
+        next_cursor = _boundary(NEXT, rows[-1]) if rows else None
+        prev_cursor = _boundary(PREV, rows[0]) if rows and has_more else None
+    else:
+        next_cursor = _boundary(NEXT, rows[-1]) if rows and has_more else None
+        prev_cursor = _boundary(PREV, rows[0]) if rows and position else None
+
+    return Page(rows, next_cursor, prev_cursor)
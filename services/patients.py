@@ -0,0 +1,57 @@
+"""
+Patient lookup helpers using raw SQL
+"""
+from typing import Any, Dict, List
+from db_utils import fetch_all, check_exists
+
+# Name prefixes shorter than this are not searched (too unselective)
+MIN_NAME_PREFIX = 2
+
+
+def _escape_like(value: str) -> str:
+    """Escape LIKE wildcards so user input only matches literally"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_patients(query: str, limit: int) -> List[Dict[str, Any]]:
+    """
+    Find patients by name prefix, exact national ID or exact phone number.
+    
+    Each branch of the UNION is a point or prefix lookup on its own index
+    (core_patient.full_name, national_id, phone), so cost does not grow with
+    the number of patients.
+    
+    Args:
+        query: Search text typed by the user
+        limit: Maximum number of results
+    
+    Returns:
+        List of compact patient dicts (patient_id, full_name, national_id)
+    """
+    query = (query or '').strip()
+    if not query:
+        return []
+    
+    branches = [
+        "(SELECT patient_id, full_name, national_id FROM core_patient WHERE national_id = %s)",
+        "(SELECT patient_id, full_name, national_id FROM core_patient WHERE phone = %s)",
+    ]
+    params: List[Any] = [query, query]
+    if len(query) >= MIN_NAME_PREFIX:
+        branches.append(
+            """(SELECT patient_id, full_name, national_id FROM core_patient
+                WHERE full_name LIKE %s ORDER BY full_name LIMIT %s)"""
+        )
+        params.extend((_escape_like(query) + '%', limit))
+    
+    return fetch_all(
+        f"""{' UNION '.join(branches)}
+            ORDER BY full_name
+            LIMIT %s""",
+        tuple(params) + (limit,)
+    )
+
+
+def patient_exists(patient_id: int) -> bool:
+    """Point lookup used to validate a submitted patient id"""
+    return check_exists("SELECT 1 FROM core_patient WHERE patient_id = %s", (patient_id,))
@@ -0,0 +1,54 @@
+"""
+Prescription loading helpers using raw SQL
+"""
+from typing import Dict, Iterable, List
+from db_utils import fetch_all
+from services.rows import PRESCRIPTION_ITEM
+
+
+def load_prescription_items(prescription_ids: Iterable[int]) -> Dict[int, List]:
+    """
+    Fetch the items of many prescriptions with a single IN (...) query.
+    
+    Args:
+        prescription_ids: Prescription primary keys
+    
+    Returns:
+        Dictionary mapping every requested prescription_id to its items
+        (an empty list when it has none)
+    """
+    ids = list(dict.fromkeys(prescription_ids))
+    if not ids:
+        return {}
+    
+    placeholders = ', '.join(['%s'] * len(ids))
+    items_data = fetch_all(
+        f"""SELECT pi.*, m.name as medicine_name, m.type as medicine_type
+            FROM core_prescriptionitem pi
+            INNER JOIN core_medicine m ON pi.medicine_id = m.medicine_id
+            WHERE pi.prescription_id IN ({placeholders})
+            ORDER BY pi.prescription_id, pi.item_id""",
+        tuple(ids)
+    )
+    
+    items_by_prescription = {prescription_id: [] for prescription_id in ids}
+    # Row objects with .medicine built from the joined name/type
+    for item in PRESCRIPTION_ITEM.many(items_data):
+        items_by_prescription[item.prescription_id].append(item)
+    return items_by_prescription
+
+
+def attach_prescription_items(prescriptions):
+    """
+    Set ``.items`` on each prescription object using one batched query.
+    
+    Args:
+        prescriptions: Prescription objects with prescription_id set
+    
+    Returns:
+        The same list, for convenience
+    """
+    items_by_prescription = load_prescription_items(p.prescription_id for p in prescriptions)
+    for prescription in prescriptions:
+        prescription.items = items_by_prescription[prescription.prescription_id]
+    return prescriptions
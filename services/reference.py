@@ -0,0 +1,65 @@
+"""
+Reference data cached in-process.
+
+Rows of small reference tables (service types, districts, qualifications,
+manufacturers) are read on hot write paths and almost never change, so
+lookups through this module are memoized per worker for REFERENCE_CACHE_TTL
+seconds and repeat lookups cost no queries.
+"""
+from typing import Any, Dict, Optional
+from cache_utils import TTLCache
+from config import Config
+from db_utils import get_or_create
+
+# Tables small and static enough to memoize whole rows for
+REFERENCE_TABLES = frozenset({
+    'core_servicetype',
+    'core_district',
+    'core_qualification',
+    'core_manufacturer',
+})
+
+reference_cache = TTLCache(maxsize=256, ttl=Config.REFERENCE_CACHE_TTL, name='reference')
+
+
+def _cache_key(table, lookup_fields):
+    return table, tuple(sorted(lookup_fields.items()))
+
+
+def get_reference(table: str, lookup_fields: Dict[str, Any],
+                  defaults: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Row of a reference table matching lookup_fields, creating it if missing.
+
+    Args:
+        table: One of REFERENCE_TABLES
+        lookup_fields: Columns identifying the row (a unique key for an atomic upsert)
+        defaults: Extra columns used only when the row has to be created
+
+    Returns:
+        A copy of the row as a dict
+    """
+    if table not in REFERENCE_TABLES:
+        raise ValueError(f"{table} is not a reference table")
+
+    def load():
+        row, _ = get_or_create(table, lookup_fields, defaults or {})
+        return row
+
+    return dict(reference_cache.get_or_load(_cache_key(table, lookup_fields), load))
+
+
+def get_service_type_id(name: str, description: Optional[str] = None) -> int:
+    """
+    Id of the core_servicetype row with this name, creating it if missing.
+
+    Args:
+        name: Service type name (e.g. 'Laboratory', 'Pharmacy')
+        description: Used only when the row has to be created
+    """
+    return get_reference('core_servicetype', {'name': name}, {'description': description})['service_type_id']
+
+
+def invalidate_reference(table: str, lookup_fields: Dict[str, Any]) -> None:
+    """Drop a cached reference row after it is updated or deleted"""
+    reference_cache.invalidate(_cache_key(table, lookup_fields))
@@ -0,0 +1,199 @@
+"""
+Lightweight read models for templates.
+
+Routes used to copy every row dict onto a new SQLAlchemy model instance
+(``Appointment()``, ``Doctor()``, ...) so templates could use attribute
+access, paying for SQLAlchemy's instrumented attributes and instance state
+on every field of every row. A RowView instead builds plain ``__slots__``
+classes, one per (model, column set), whose generated __init__ unpacks a
+row in a single statement. Rows keep the model's attribute names: columns
+that were not selected read as None (collections as ()), model properties
+such as Prescription.is_expired still work, and related objects
+(``.medicine``, ``.doctor``, ``.patient``, ...) are built from the joined
+columns of the same row.
+
+Views shared by the blueprints are defined at the bottom of this module.
+"""
+import keyword
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.orm import RelationshipProperty
+
+from models import (Appointment, Bill, Department, Doctor, Lab, LabTest, Medicine, Patient,
+                    PatientEmergencyContact, Pharmacy, PharmacyBill, PharmacyMedicine, Prescription,
+                    PrescriptionItem)
+
+
+def _model_defaults(model) -> Dict[str, Any]:
+    """What an unset attribute reads as on a transient instance of model"""
+    defaults = {}
+    for prop in sa_inspect(model).attrs:
+        defaults[prop.key] = () if isinstance(prop, RelationshipProperty) and prop.uselist else None
+    return defaults
+
+
+def _model_extras(model, mapped) -> Dict[str, Any]:
+    """Plain class attributes of model (properties, methods, choice lists) to copy onto rows"""
+    extras = {}
+    for klass in reversed(model.__mro__):
+        if klass.__module__ != model.__module__:
+            continue
+        for name, value in vars(klass).items():
+            if not name.startswith('_') and name not in mapped:
+                extras[name] = value
+    return extras
+
+
+def _is_attribute(name: str) -> bool:
+    return name.isidentifier() and not keyword.iskeyword(name)
+
+
+def _make_row_class(model, columns: Tuple[str, ...], related: Tuple[str, ...]):
+    defaults = _model_defaults(model)
+    namespace = _model_extras(model, defaults)
+    # Columns that cannot be attribute names (e.g. "COUNT(*)") are dropped
+    targets = [f'self.{name}' if _is_attribute(name) else '_' for name in columns]
+    slots = tuple(name for name in columns if _is_attribute(name))
+    slots += tuple(name for name in related if name not in slots)
+    for name in slots:
+        namespace.pop(name, None)
+
+    # Same technique as collections.namedtuple: compile a tailored __init__ once per class
+    body = f"{', '.join(targets)}, = values" if targets else 'pass'
+    source = f'def __init__(self, values):\n    {body}\n'
+    scope = {}
+    exec(compile(source, '<services.rows>', 'exec'), scope)
+
+    def __getattr__(self, name):
+        # Only reached for unset slots and unknown names
+        try:
+            return defaults[name]
+        except KeyError:
+            raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}') from None
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in columns if _is_attribute(name))
+        return f'{type(self).__name__}({fields})'
+
+    namespace.update(__slots__=slots, __init__=scope['__init__'], __getattr__=__getattr__,
+                     __repr__=__repr__, __module__=__name__)
+    return type(f'{model.__name__}Row', (), namespace)
+
+
+class RowView:
+    """
+    Builds read-only-by-convention row objects for one model.
+
+    Usage:
+        PRESCRIPTION_ITEM = RowView(PrescriptionItem,
+                                    medicine=Related(Medicine, name='medicine_name', type='medicine_type'))
+        items = PRESCRIPTION_ITEM.many(fetch_all("SELECT pi.*, m.name AS medicine_name ..."))
+        items[0].medicine.name
+
+    Args:
+        model: SQLAlchemy model whose attribute names the rows mirror
+        extra: Attribute names the caller sets after building (e.g. ``items``)
+        **related: Attribute name -> Related object built from the same row
+    """
+
+    def __init__(self, model, extra: Iterable[str] = (), **related: 'Related'):
+        self.model = model
+        self.related = related
+        self.extra = tuple(extra)
+        self._classes = {}
+
+    def row_class(self, columns: Tuple[str, ...]):
+        """Row class for rows with exactly these columns (created on first use)"""
+        cls = self._classes.get(columns)
+        if cls is None:
+            cls = self._classes[columns] = _make_row_class(
+                self.model, columns, tuple(self.related) + self.extra)
+        return cls
+
+    def one(self, data: Optional[Dict[str, Any]]):
+        """Row object for a single row dict, or None for a missing row"""
+        if not data:
+            return None
+        row = self.row_class(tuple(data))(data.values())
+        for name, related in self.related.items():
+            setattr(row, name, related.build(data))
+        return row
+
+    def many(self, rows: Iterable[Dict[str, Any]]) -> List[Any]:
+        """Row objects for a list of row dicts from one query"""
+        rows = list(rows)
+        if not rows:
+            return []
+        cls = self.row_class(tuple(rows[0]))
+        if not self.related:
+            return [cls(data.values()) for data in rows]
+        result = []
+        related = tuple(self.related.items())
+        for data in rows:
+            row = cls(data.values())
+            for name, builder in related:
+                setattr(row, name, builder.build(data))
+            result.append(row)
+        return result
+
+
+class Related:
+    """
+    Related object built from joined columns of the outer row.
+
+    Args:
+        model: Model of the related object
+        **columns: Attribute name -> column of the outer row. Without
+            columns the whole outer row is used (for ``a.*, p.*`` joins).
+
+    The related object is None when every mapped column is NULL (e.g. a
+    doctor without a department on a LEFT JOIN).
+    """
+
+    def __init__(self, model, **columns: str):
+        self.view = RowView(model)
+        self.attributes = tuple(columns)
+        self.columns = tuple(columns.values())
+
+    def build(self, data: Dict[str, Any]):
+        if not self.columns:
+            return self.view.one(data)
+        values = tuple(data.get(column) for column in self.columns)
+        if all(value is None for value in values):
+            return None
+        return self.view.row_class(self.attributes)(values)
+
+
+# ==================== Shared views ====================
+PATIENT = RowView(Patient)
+EMERGENCY_CONTACT = RowView(PatientEmergencyContact)
+DEPARTMENT = RowView(Department)
+LAB = RowView(Lab)
+LAB_TEST = RowView(LabTest)
+PHARMACY = RowView(Pharmacy)
+MEDICINE = RowView(Medicine)
+BILL = RowView(Bill)
+
+# Doctor rows, with the department name of a LEFT JOIN as .dept
+DOCTOR = RowView(Doctor, dept=Related(Department, dept_name='dept_name'))
+
+# Appointment lists join the other party's name as doctor_name / patient_name
+APPOINTMENT = RowView(
+    Appointment,
+    doctor=Related(Doctor, full_name='doctor_name', specialization='specialization'),
+    patient=Related(Patient, full_name='patient_name'),
+)
+
+# "SELECT a.*, p.*" appointment detail: the whole row doubles as the patient
+APPOINTMENT_WITH_PATIENT = RowView(Appointment, patient=Related(Patient))
+
+PRESCRIPTION = RowView(Prescription, extra=('items',))
+
+PRESCRIPTION_ITEM = RowView(
+    PrescriptionItem, medicine=Related(Medicine, name='medicine_name', type='medicine_type'))
+
+STOCK_ITEM = RowView(
+    PharmacyMedicine, medicine=Related(Medicine, name='medicine_name', type='medicine_type'))
+
+PHARMACY_BILL = RowView(PharmacyBill, bill=Related(Bill), pharmacy=Related(Pharmacy, name='pharmacy_name'))
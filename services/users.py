@@ -0,0 +1,68 @@
+"""
+Cached user loading for Flask-Login.
+Keeps an immutable snapshot of each core_customuser row so authenticated
+requests can rebuild current_user without a database round trip.
+
+The app only ever inserts users, and a snapshot is refreshed at every login.
+A change made to an existing row outside the app (password, role, hospital,
+is_active) reaches a worker once its snapshot is older than USER_CACHE_TTL,
+which is therefore the longest a deactivated account stays logged in.
+"""
+from collections import namedtuple
+from functools import lru_cache
+from typing import Any, Dict, Optional
+from cache_utils import TTLCache
+from config import Config
+from db_utils import fetch_one
+from models import User
+
+# Columns never kept in the cache; they are only needed to log in
+UNCACHED_COLUMNS = ('password',)
+
+# user_id -> UserSnapshot
+user_cache = TTLCache(maxsize=Config.USER_CACHE_SIZE, ttl=Config.USER_CACHE_TTL, name='users')
+
+
+@lru_cache(maxsize=8)
+def _snapshot_class(columns):
+    return namedtuple('UserSnapshot', columns)
+
+
+def snapshot_user(user_data: Dict[str, Any]):
+    """Build an immutable, compact snapshot (a namedtuple) of a user row"""
+    columns = tuple(key for key in user_data if key not in UNCACHED_COLUMNS)
+    return _snapshot_class(columns)(*(user_data[key] for key in columns))
+
+
+def build_user(snapshot) -> User:
+    """Rebuild a detached User object from a snapshot"""
+    user = User()
+    for key, value in zip(snapshot._fields, snapshot):
+        setattr(user, key, value)
+    return user
+
+
+def cache_user(user_data: Dict[str, Any]) -> None:
+    """Prime the cache with a freshly read user row (e.g. at login)"""
+    user_cache.set(user_data['id'], snapshot_user(user_data))
+
+
+def load_user_by_id(user_id: int) -> Optional[User]:
+    """
+    Load a user for Flask-Login, hitting the database only on a cache miss.
+    
+    Returns:
+        User object, or None if no such user exists
+    """
+    user_id = int(user_id)
+    snapshot = user_cache.get(user_id, None)
+    if snapshot is None:
+        user_data = fetch_one(
+            "SELECT * FROM core_customuser WHERE id = %s",
+            (user_id,)
+        )
+        if not user_data:
+            return None
+        snapshot = snapshot_user(user_data)
+        user_cache.set(user_id, snapshot)
+    return build_user(snapshot)
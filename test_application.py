@@ -1,9 +1,12 @@
 """
 Test script to verify Flask application structure and imports
 """
+import os
 import sys
 import traceback
 
+import pytest
+
 def test_imports():
     """Test that all modules can be imported"""
     print("=" * 60)
@@ -271,6 +274,1647 @@ def test_utils():
         return False
 
 
+def fake_database(app, answers, size=2):
+    """
+    Point app's primary pool at fake connections for route tests (no MySQL needed).
+    
+    answers maps an SQL fragment to the row dicts a statement containing it
+    reads (first match wins, and the dict may be changed between requests);
+    other statements read nothing and affect one row.
+    
+    Returns:
+        The pool and the list of (sql, params) executed through it
+    """
+    import db_utils
+    executed = []
+    
+    class FakeCursor:
+        lastrowid = 1
+        
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, *exc):
+            return False
+        
+        def execute(self, sql, params=None):
+            executed.append((sql, params))
+            found = next((rows for fragment, rows in answers.items() if fragment in sql), None)
+            columns = tuple(found[0]) if found else ()
+            self.description = tuple((column,) for column in columns)
+            self.rows = [tuple(row[column] for column in columns) for row in found or ()]
+            self.rowcount = len(self.rows) if found is not None else 1
+            return self.rowcount
+        
+        def fetchone(self):
+            return self.rows.pop(0) if self.rows else None
+        
+        def fetchall(self):
+            rows, self.rows = self.rows, []
+            return rows
+        
+        def fetchmany(self, size):
+            chunk, self.rows = self.rows[:size], self.rows[size:]
+            return chunk
+        
+        def close(self):
+            pass
+    
+    class FakeConnection:
+        open = True
+        
+        def cursor(self, cursorclass=None):
+            return FakeCursor()
+        
+        def ping(self, reconnect=False):
+            pass
+        
+        def begin(self):
+            pass
+        
+        def commit(self):
+            pass
+        
+        def rollback(self):
+            pass
+        
+        def close(self):
+            self.open = False
+    
+    pool = app.extensions['db_pool'] = db_utils.ConnectionPool(FakeConnection, size=size, max_overflow=0, timeout=0.05)
+    return pool, executed
+
+
+def log_in(client, user_id, role, **fields):
+    """Log the test client in as a cached user; call user_cache.invalidate(user_id) when done"""
+    from services.users import cache_user
+    cache_user(dict({'id': user_id, 'username': f'user{user_id}', 'role': role, 'is_active': True}, **fields))
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+
+
+def test_connection_pool():
+    """Test connection pool reuse, overflow and pre-ping (no MySQL needed)"""
+    print("\n" + "=" * 60)
+    print("Testing Connection Pool")
+    print("=" * 60)
+    
+    from db_utils import ConnectionPool, PoolTimeoutError
+    
+    class FakeConnection:
+        def __init__(self):
+            self.open = True
+            self.alive = True
+        
+        def ping(self, reconnect=False):
+            if not self.alive:
+                raise OSError('gone away')
+        
+        def close(self):
+            self.open = False
+    
+    created = []
+    
+    def creator():
+        conn = FakeConnection()
+        created.append(conn)
+        return conn
+    
+    pool = ConnectionPool(creator, size=1, max_overflow=1, timeout=0.05)
+    
+    first = pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first, "Idle connection was not reused"
+    print("[OK] Idle connection reused")
+    
+    overflow = pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    print("[OK] Pool exhaustion raises PoolTimeoutError")
+    
+    pool.release(overflow)
+    pool.release(first)
+    assert not first.open, "Pool kept more than size idle connections"
+    assert pool.stats()['idle'] == 1, "Pool kept more than size idle connections"
+    print("[OK] Connections beyond pool size closed on release")
+    
+    overflow.alive = False
+    replacement = pool.acquire()
+    assert replacement is not overflow, "Dead connection passed pre-ping"
+    assert not overflow.open, "Dead connection passed pre-ping"
+    print("[OK] Pre-ping replaces dead connections")
+
+
+def test_query_instrumentation():
+    """Test query fingerprints, N+1 flagging and the query budget fixture"""
+    print("\n" + "=" * 60)
+    print("Testing Query Instrumentation")
+    print("=" * 60)
+    
+    import db_utils
+    from app import create_app
+    from config import Config
+    
+    class FakeCursor:
+        rowcount = 2
+        
+        def execute(self, sql, params=None):
+            return self.rowcount
+    
+    item_sql = """SELECT pi.* FROM core_prescriptionitem pi
+                  WHERE pi.prescription_id = %s"""
+    fingerprint = db_utils.fingerprint(item_sql)
+    assert fingerprint == "SELECT pi.* FROM core_prescriptionitem pi WHERE pi.prescription_id = ?", \
+        f"Unexpected fingerprint: {fingerprint}"
+    assert db_utils.fingerprint("SELECT 1 FROM t WHERE a IN (%s, %s) AND b = 'x'") == "SELECT ? FROM t WHERE a IN (...) AND b = ?", "Literals and IN lists not normalized"
+    print("[OK] Statements normalized to fingerprints")
+    
+    app = create_app(Config)
+    with app.test_request_context('/doctor/appointments/1'):
+        with db_utils.capture_queries() as captured:
+            for prescription_id in range(5):
+                db_utils._execute(FakeCursor(), item_sql, (prescription_id,))
+        summary = db_utils.summarize_queries(db_utils.get_request_queries(), threshold=3)
+        assert len(captured) == 5, f"Unexpected query summary: {summary}"
+        assert summary['count'] == 5, f"Unexpected query summary: {summary}"
+        assert summary['rows'] == 10, f"Unexpected query summary: {summary}"
+        assert summary['n_plus_one'], f"Repeated statement not flagged: {summary['n_plus_one']}"
+        assert 'test_application.py' in summary['n_plus_one'][0]['call_site'], f"Repeated statement not flagged: {summary['n_plus_one']}"
+        print("[OK] Repeated fingerprint flagged with call site")
+        
+        response = db_utils._emit_query_report(app.response_class('ok'))
+        assert response.headers.get('X-DB-Query-Count') == '5', "Query headers missing from response"
+        assert 'X-DB-N-Plus-One' in response.headers, "Query headers missing from response"
+        print("[OK] Query summary exposed as response headers")
+        
+        app.debug = False
+        try:
+            response = db_utils._emit_query_report(app.response_class('ok'))
+        finally:
+            app.debug = True
+        assert not any(name in response.headers for name in ('X-DB-Query-Count', 'X-DB-N-Plus-One', 'Server-Timing')), "Query headers sent outside debug/testing"
+        print("[OK] Query headers withheld in production")
+        
+        with pytest.raises(AssertionError):
+            with db_utils.assert_max_queries(1):
+                db_utils._execute(FakeCursor(), item_sql, (1,))
+                db_utils._execute(FakeCursor(), item_sql, (2,))
+        print("[OK] assert_max_queries enforces a query budget")
+
+
+def test_read_replicas():
+    """Test replica routing, lag-aware selection, read-your-writes and fallback (no MySQL needed)"""
+    print("\n" + "=" * 60)
+    print("Testing Read Replicas")
+    print("=" * 60)
+    
+    import time
+    import pymysql
+    import db_utils
+    from flask import session
+    from app import create_app
+    from config import Config
+    
+    assert db_utils.parse_replicas('db-r1:3307, db-r2', 3306) == [('db-r1', 3307), ('db-r2', 3306)], "DB_REPLICAS not parsed"
+    
+    class FakeCursor:
+        rowcount = 1
+        lastrowid = 1
+        description = (('server',),)
+        
+        def __init__(self, conn):
+            self.conn = conn
+        
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, *exc):
+            return False
+        
+        def execute(self, sql, params=None):
+            if self.conn.server in failing:
+                raise pymysql.err.OperationalError(2013, 'Lost connection to MySQL server during query')
+            return 1
+        
+        def fetchone(self):
+            return (self.conn.server,)
+        
+        def fetchall(self):
+            return [(self.conn.server,)]
+    
+    class FakeConnection:
+        def __init__(self, server):
+            self.server = server
+            self.open = True
+        
+        def cursor(self):
+            return FakeCursor(self)
+        
+        def ping(self, reconnect=False):
+            pass
+        
+        def begin(self):
+            pass
+        
+        def commit(self):
+            pass
+        
+        def rollback(self):
+            pass
+        
+        def close(self):
+            self.open = False
+    
+    lags = {'r1': 0.0, 'r2': 3.0}
+    failing = set()
+    
+    def make_pool(server):
+        return db_utils.ConnectionPool(lambda: FakeConnection(server), size=2, max_overflow=0, timeout=0.05)
+    
+    app = create_app(Config)
+    app.extensions['db_pool'] = make_pool('primary')
+    replicas = db_utils.ReplicaSet(
+        [db_utils.Replica('r1', make_pool('r1')), db_utils.Replica('r2', make_pool('r2'))],
+        max_lag=5.0, check_interval=0.0, lag_probe=lambda conn: lags[conn.server]
+    )
+    app.extensions['db_replicas'] = replicas
+    
+    def read_server():
+        return db_utils.fetch_one("SELECT @@hostname AS server")['server']
+    
+    with app.test_request_context('/doctor/dashboard'):
+        assert read_server() == 'r1', "Reads did not go to the least lagged replica"
+        assert db_utils.fetch_count("SELECT 1") == 'r1', "Reads did not go to the least lagged replica"
+    lags['r1'] = 10.0
+    with app.test_request_context('/doctor/dashboard'):
+        assert read_server() == 'r2', "Replica beyond DB_REPLICA_MAX_LAG was not skipped"
+    lags['r2'] = None
+    with app.test_request_context('/doctor/dashboard'):
+        assert read_server() == 'primary', "Reads did not fall back to the primary without a usable replica"
+    print("[OK] Lag-aware replica selection with primary fallback")
+    
+    lags.update(r1=0.0, r2=0.0)
+    with app.test_request_context('/doctor/appointments/1', method='POST'):
+        read_server()
+        db_utils.execute_update("UPDATE core_appointment SET diagnosis = %s WHERE appointment_id = %s", ('Flu', 1))
+        assert read_server() == 'primary', "Read after a write in the same request went to a replica"
+        sticky_until = session.get(db_utils.READ_YOUR_WRITES_KEY, 0)
+    with app.test_request_context('/doctor/appointments/1'):
+        session[db_utils.READ_YOUR_WRITES_KEY] = sticky_until
+        assert read_server() == 'primary', "Session did not stick to the primary after its write"
+        session[db_utils.READ_YOUR_WRITES_KEY] = time.time() - 1
+        db_utils.release_request_connection()
+        assert read_server() != 'primary', "Session stayed on the primary after the window"
+    print("[OK] Writes stick the request and session to the primary")
+    
+    failing.add('r1')
+    with app.test_request_context('/doctor/dashboard'):
+        assert read_server() == 'primary', "Failed replica read not retried on the primary"
+    failing.clear()
+    assert not replicas.replicas[0].healthy, "Failed replica not marked down"
+    assert replicas.replicas[1].healthy, "Failed replica not marked down"
+    stats = replicas.stats()
+    assert not app.extensions['db_pool'].stats()['checked_out'], "Connections not returned to their pools at teardown"
+    assert not any(r['checked_out'] for r in stats.values()), "Connections not returned to their pools at teardown"
+    print("[OK] Failed replica reads retried on the primary, connections returned")
+
+
+def test_create_indexes():
+    """Test index coverage rules and reporting of duplicates that block unique indexes"""
+    print("\n" + "=" * 60)
+    print("Testing Create Indexes")
+    print("=" * 60)
+    
+    import commands.create_indexes as create_indexes
+    originals = (create_indexes.get_existing_indexes, create_indexes.execute_update, create_indexes.find_duplicates)
+    
+    try:
+        import pymysql
+        from app import create_app
+        
+        existing = {
+            'idx_doctor_datetime_status': (('doctor_id', 'date_and_time', 'status'), False),
+            'uniq_bill_txn_patient': (('transaction_id', 'patient_id'), True),
+            'uniq_name': (('name',), True),
+        }
+        find = create_indexes.find_covering_index
+        assert find(existing, ('doctor_id', 'date_and_time'), False) == 'idx_doctor_datetime_status', "Leading columns should cover a plain index"
+        assert find(existing, ('transaction_id',), True) is None, "Unique requirements need an exact unique match"
+        assert find(existing, ('name',), True) == 'uniq_name', "Unique requirements need an exact unique match"
+        print("[OK] Unique indexes need an exact column match")
+        
+        def fake_execute_update(sql, params=None):
+            if 'UNIQUE' in sql:
+                raise pymysql.err.IntegrityError(1062, "Duplicate entry 'Laboratory'")
+            return 0
+        
+        create_indexes.get_existing_indexes = lambda table: {}
+        create_indexes.execute_update = fake_execute_update
+        create_indexes.find_duplicates = lambda table, columns, limit=10: [
+            dict({column: 'Laboratory' for column in columns}, copies=2)]
+        
+        app = create_app()
+        result = app.test_cli_runner().invoke(args=['create-indexes', '--no-explain'])
+        assert result.exit_code == 1, f"Expected a clean failure, got {result.exit_code}: {result.exception!r}"
+        assert isinstance(result.exception, SystemExit), f"Expected a clean failure, got {result.exit_code}: {result.exception!r}"
+        assert "Could not create uniq_servicetype_name" in result.output, f"Duplicates not reported:\n{result.output}"
+        assert "name='Laboratory' (2 rows)" in result.output, f"Duplicates not reported:\n{result.output}"
+        print("[OK] Duplicate values blocking unique indexes are reported without a traceback")
+    finally:
+        create_indexes.get_existing_indexes, create_indexes.execute_update, create_indexes.find_duplicates = originals
+
+
+def test_transactions():
+    """Test transaction() commits once, shares its connection and nests as savepoints"""
+    print("\n" + "=" * 60)
+    print("Testing Transactions")
+    print("=" * 60)
+    
+    import db_utils
+    from app import create_app
+    from config import Config
+    
+    log = []
+    
+    class FakeCursor:
+        rowcount = 1
+        description = (('id',),)
+        
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, *exc):
+            return False
+        
+        def execute(self, sql, params=None):
+            log.append(sql.split()[0] if not sql.startswith(('SAVEPOINT', 'RELEASE', 'ROLLBACK')) else sql)
+            if 'core_doctorqualification' in sql:
+                raise ValueError('duplicate qualification')
+            self.lastrowid = len(log)
+            return 1
+        
+        def fetchall(self):
+            return [(1,)]
+    
+    class FakeConnection:
+        open = True
+        
+        def cursor(self):
+            return FakeCursor()
+        
+        def ping(self, reconnect=False):
+            pass
+        
+        def begin(self):
+            log.append('BEGIN')
+        
+        def commit(self):
+            log.append('COMMIT')
+        
+        def rollback(self):
+            log.append('ROLLBACK')
+        
+        def close(self):
+            pass
+    
+    app = create_app(Config)
+    app.extensions['db_pool'] = db_utils.ConnectionPool(FakeConnection, size=1, max_overflow=0, timeout=0.05)
+    
+    with app.test_request_context('/admin/doctors/add', method='POST'):
+        with db_utils.transaction() as tx:
+            user_id = tx.insert("INSERT INTO core_customuser (username) VALUES (%s)", ('dr',))
+            db_utils.execute_insert("INSERT INTO core_doctor (user_id) VALUES (%s)", (user_id,))
+            assert db_utils.in_transaction(), "in_transaction() is False inside the block"
+        assert log == ['BEGIN', 'INSERT', 'INSERT', 'COMMIT'], f"Expected one commit for dependent inserts: {log}"
+        print("[OK] Helpers inside transaction() share it and commit once")
+        
+        log.clear()
+        with db_utils.transaction() as tx:
+            tx.insert("INSERT INTO core_doctor (user_id) VALUES (%s)", (1,))
+            try:
+                with tx.savepoint():
+                    tx.execute("INSERT INTO core_doctorqualification (doctor_id) VALUES (%s)", (1,))
+            except ValueError:
+                pass
+            with tx.savepoint():
+                db_utils.execute_update("UPDATE core_doctor SET phone = %s", ('1',))
+        expected = ['BEGIN', 'INSERT', 'SAVEPOINT sp_1', 'INSERT', 'ROLLBACK TO SAVEPOINT sp_1',
+                    'SAVEPOINT sp_1', 'UPDATE', 'RELEASE SAVEPOINT sp_1', 'COMMIT']
+        assert log == expected, f"Unexpected savepoint statements: {log}"
+        print("[OK] Nested scopes roll back to their savepoint only")
+        
+        log.clear()
+        with pytest.raises(ValueError):
+            with db_utils.transaction() as tx:
+                tx.insert("INSERT INTO core_customuser (username) VALUES (%s)", ('dr',))
+                tx.insert("INSERT INTO core_doctorqualification (doctor_id) VALUES (%s)", (1,))
+        assert 'COMMIT' not in log, f"Failed transaction not rolled back: {log}"
+        assert log[-1] == 'ROLLBACK', f"Failed transaction not rolled back: {log}"
+        assert not db_utils.in_transaction(), f"Failed transaction not rolled back: {log}"
+        
+        log.clear()
+        db_utils.execute_transaction([("UPDATE core_bill SET status = %s", ('Paid',)), ("SELECT 1", None)])
+        assert log == ['BEGIN', 'UPDATE', 'SELECT', 'COMMIT'], f"execute_transaction not atomic: {log}"
+        print("[OK] Failures roll back everything; execute_transaction uses the same scope")
+
+
+def test_lab_test_billing():
+    """Test saving a lab test as Completed bills it once, even if it was completed unbilled before"""
+    print("\n" + "=" * 60)
+    print("Testing Lab Test Billing")
+    print("=" * 60)
+    
+    from decimal import Decimal
+    from app import create_app
+    from config import Config
+    from decorators import invalidate_profile
+    from services.users import user_cache
+    
+    class FormConfig(Config):
+        WTF_CSRF_ENABLED = False
+    
+    app = create_app(FormConfig)
+    answers = {
+        'FROM core_doctor WHERE user_id': [{'doctor_id': 7, 'user_id': 90011, 'full_name': 'Dr. Karim'}],
+        'FROM core_labtest WHERE test_id': [{'test_id': 55, 'ordered_by_id': 7, 'patient_id': 11,
+                                              'status': 'Completed', 'result': None,
+                                              'test_cost': Decimal('800.00')}],
+        'FROM core_servicetype': [{'service_type_id': 3, 'name': 'Laboratory'}],
+        'FROM core_bill WHERE transaction_id': [],
+    }
+    pool, executed = fake_database(app, answers)
+    client = app.test_client()
+    log_in(client, 90011, 'DOCTOR')
+    try:
+        def save_completed():
+            executed.clear()
+            response = client.post('/doctor/lab-test/55/update', data={'status': 'Completed', 'result': 'Normal'})
+            assert response.status_code == 302, f"Unexpected response: {response.status_code}"
+            return [params for sql, params in executed if sql.lstrip().startswith('INSERT INTO core_bill')]
+        
+        bills = save_completed()
+        assert len(bills) == 1, f"Already completed test without a bill was not billed: {executed}"
+        assert bills[0][0] == 11, f"Unexpected bill: {bills[0]}"
+        assert bills[0][8] == 'LAB-55', f"Unexpected bill: {bills[0]}"
+        print("[OK] Completed test without a bill is billed on save")
+        
+        answers['FROM core_bill WHERE transaction_id'] = [{'bill_id': 901}]
+        bills = save_completed()
+        assert not bills, f"Billed test billed again: {bills}"
+        print("[OK] Saving a billed test does not bill it again")
+    finally:
+        user_cache.invalidate(90011)
+        invalidate_profile(90011)
+
+
+def test_streaming():
+    """Test stream() yields dicts in constant memory and ties its connection to the generator"""
+    print("\n" + "=" * 60)
+    print("Testing Streaming Cursor")
+    print("=" * 60)
+    
+    import gc
+    import tracemalloc
+    import db_utils
+    from app import create_app
+    from config import Config
+    
+    closed = []
+    timeouts = []
+    
+    class FakeCursor:
+        rowcount = 0
+        description = None
+        
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, *exc):
+            return False
+        
+        def execute(self, sql, params=None):
+            if sql.startswith('SET SESSION net_write_timeout'):
+                timeouts.append(params[0])
+            return 0
+        
+        def fetchone(self):
+            return (60,)
+    
+    class FakeSSCursor(FakeCursor):
+        """Generates rows on demand like an unbuffered result"""
+        description = (('bill_id',), ('total_amount',))
+        
+        def __init__(self, total):
+            self.total = total
+            self.position = 0
+        
+        def execute(self, sql, params=None):
+            self.rowcount = db_utils._UNKNOWN_ROWCOUNT
+            return self.rowcount
+        
+        def fetchmany(self, size):
+            end = min(self.position + size, self.total)
+            rows = [(i, i * 10) for i in range(self.position, end)]
+            self.position = end
+            return rows
+        
+        def close(self):
+            self.position = self.total
+    
+    class FakeConnection:
+        open = True
+        total = 0
+        
+        def cursor(self, cursorclass=None):
+            return FakeSSCursor(self.total) if cursorclass is not None else FakeCursor()
+        
+        def ping(self, reconnect=False):
+            pass
+        
+        def rollback(self):
+            pass
+        
+        def close(self):
+            self.open = False
+            closed.append(self)
+    
+    app = create_app(Config)
+    pool = app.extensions['db_pool'] = db_utils.ConnectionPool(FakeConnection, size=2, max_overflow=0)
+    
+    with app.app_context():
+        FakeConnection.total = 2500
+        with db_utils.capture_queries() as queries:
+            rows = list(db_utils.stream("SELECT bill_id, total_amount FROM core_bill", chunk_size=1000))
+        assert len(rows) == 2500, f"Unexpected streamed rows: {len(rows)}"
+        assert rows[-1] == {'bill_id': 2499, 'total_amount': 24990}, f"Unexpected streamed rows: {len(rows)}"
+        assert pool.stats()['idle'] == 1, f"Consumed stream should release its connection: {pool.stats()}, {queries}"
+        assert not closed, f"Consumed stream should release its connection: {pool.stats()}, {queries}"
+        assert timeouts[-2:] == [600, 60], f"Consumed stream should release its connection: {pool.stats()}, {queries}"
+        assert [q.rows for q in queries if 'core_bill' in q.sql] == [-1], f"Consumed stream should release its connection: {pool.stats()}, {queries}"
+        print("[OK] Fully consumed stream yields dicts and returns its connection with its timeout restored")
+        
+        FakeConnection.total = 200000
+        gc.collect()
+        tracemalloc.start()
+        count = sum(1 for _ in db_utils.stream("SELECT bill_id, total_amount FROM core_bill", chunk_size=500))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert count == 200000, f"Streaming {count} rows peaked at {peak} bytes"
+        assert peak <= 1024 * 1024, f"Streaming {count} rows peaked at {peak} bytes"
+        print(f"[OK] 200000 rows streamed with a {peak // 1024} KB peak")
+        
+        rows = db_utils.stream("SELECT bill_id, total_amount FROM core_bill", chunk_size=100)
+        next(rows)
+        assert pool.stats()['checked_out'] == 1, "Stream should hold a connection while open"
+        del rows
+        gc.collect()
+        assert len(closed) == 1, f"Abandoned stream leaked its connection: {pool.stats()}"
+        assert pool.stats()['checked_out'] == 0, f"Abandoned stream leaked its connection: {pool.stats()}"
+        print("[OK] Abandoned stream closes its connection instead of reusing it")
+        
+        db_utils.fetch_count("SELECT COUNT(*) FROM core_bill")
+        assert pool.stats()['checked_out'] == 1, "Read did not check out the request connection"
+        rows = db_utils.stream("SELECT bill_id, total_amount FROM core_bill", chunk_size=100)
+        next(rows)
+        assert pool.stats()['checked_out'] == 1, f"Stream held the request connection too: {pool.stats()}"
+        rows.close()
+        print("[OK] Stream hands the request's idle connection back before taking its own")
+
+
+def test_csv_export():
+    """Test the admin CSV export streams hospital-scoped rows as CSV and gzipped CSV"""
+    print("\n" + "=" * 60)
+    print("Testing CSV Export")
+    print("=" * 60)
+    
+    import csv
+    import gzip
+    import io
+    from datetime import date, datetime
+    import db_utils
+    from app import create_app
+    from config import Config
+    from services.exports import EXPORTS, csv_chunks, parse_export_range
+    from services.hospitals import hospital_cache
+    from services.users import cache_user, user_cache
+    
+    executed = []
+    checked_out = []
+    rows = [
+        (1, datetime(2024, 1, 5, 9, 30), 'Completed', 'First Visit', 11, 'Rahim Uddin',
+         4, 'Dr. Karim', 'Cardiology', 'Chest pain', '=HYPERLINK("x")', None),
+        (2, datetime(2024, 1, 6, 10, 0), 'Scheduled', 'Follow-up', 12, 'Ayesha, Begum',
+         4, 'Dr. Karim', None, 'Review', None, date(2024, 2, 1)),
+    ]
+    
+    class FakeCursor:
+        rowcount = 0
+        description = (('hospital_id',), ('name',))
+        
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, *exc):
+            return False
+        
+        def execute(self, sql, params=None):
+            self.sql = sql
+            return 0
+        
+        def fetchone(self):
+            return (90001, 'Dhaka Medical College Hospital') if 'core_hospital' in self.sql else (60,)
+    
+    class FakeSSCursor(FakeCursor):
+        description = tuple((column,) for column in EXPORTS['appointments'].columns)
+        
+        def execute(self, sql, params=None):
+            executed.append(params)
+            self.pending = list(rows)
+            return 0
+        
+        def fetchmany(self, size):
+            checked_out.append(pool.stats()['checked_out'])
+            chunk, self.pending = self.pending[:size], self.pending[size:]
+            return chunk
+        
+        def close(self):
+            pass
+    
+    class FakeConnection:
+        open = True
+        
+        def cursor(self, cursorclass=None):
+            return FakeSSCursor() if cursorclass is not None else FakeCursor()
+        
+        def ping(self, reconnect=False):
+            pass
+        
+        def rollback(self):
+            pass
+        
+        def close(self):
+            self.open = False
+    
+    app = create_app(Config)
+    pool = app.extensions['db_pool'] = db_utils.ConnectionPool(FakeConnection, size=2, max_overflow=0)
+    cache_user({'id': 90001, 'username': 'dmch_admin', 'role': 'ADMIN', 'hospital_id': 90001, 'is_active': True})
+    # Loaded by the first export, so that request holds a connection before streaming
+    hospital_cache.invalidate(90001)
+    try:
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = '90001'
+            sess['_fresh'] = True
+        
+        response = client.get('/admin/export/appointments.csv?start=2024-01-01&end=2024-01-31')
+        body = response.get_data()
+        disposition = response.headers.get('Content-Disposition', '')
+        assert response.status_code == 200, f"Unexpected export response: {response.status_code} {disposition}"
+        assert 'appointments-2024-01-01-to-2024-01-31.csv' in disposition, f"Unexpected export response: {response.status_code} {disposition}"
+        assert executed[-1] == (90001, datetime(2024, 1, 1), datetime(2024, 2, 1)), f"Export not scoped to the admin's hospital and range: {executed[-1]}"
+        lines = list(csv.reader(io.StringIO(body.decode('utf-8-sig'))))
+        assert lines[0] == list(EXPORTS['appointments'].columns), f"Unexpected CSV: {lines}"
+        assert len(lines) == 3, f"Unexpected CSV: {lines}"
+        assert lines[2][5] == 'Ayesha, Begum', f"Values not quoted or formulas not neutralized: {lines}"
+        assert lines[1][10] == '\'=HYPERLINK("x")', f"Values not quoted or formulas not neutralized: {lines}"
+        assert pool.stats()['checked_out'] == 0, "Export kept its streaming connection"
+        assert checked_out and max(checked_out) == 1, f"Export held more than one connection while streaming: {checked_out}"
+        print("[OK] Appointments stream as CSV scoped to the admin's hospital on one connection")
+        
+        response = client.get('/admin/export/appointments.csv.gz?start=2024-01-01&end=2024-01-31')
+        assert response.mimetype == 'application/gzip', "Gzipped export does not match the CSV"
+        assert gzip.decompress(response.get_data()) == body, "Gzipped export does not match the CSV"
+        assert client.get('/admin/export/bills.csv?start=2024-02-01&end=2024-01-01').status_code == 400, "Reversed range accepted"
+        print("[OK] Gzipped export matches; bad ranges are rejected")
+        
+        client.get('/admin/export/bills.csv?start=2024-01-01&end=2024-01-31').get_data()
+        assert executed[-1] == (90001, date(2024, 1, 1), date(2024, 1, 31), date(2024, 1, 1), date(2024, 1, 31), 90001), f"Bill export not bounded by the bill date range: {executed[-1]}"
+        print("[OK] Bill export is bounded by bill_date in both branches")
+    finally:
+        user_cache.invalidate(90001)
+        hospital_cache.invalidate(90001)
+    
+    assert parse_export_range(None, None, today=date(2024, 3, 30)) == (date(2024, 3, 1), date(2024, 3, 30)), "Default range is not the last 30 days"
+    many = ({'n': i} for i in range(2000))
+    chunks = list(csv_chunks(('n',), many, flush_rows=500))
+    assert len(chunks) == 4, f"Expected incremental chunks, got {len(chunks)}"
+    assert b''.join(chunks).decode('utf-8-sig').splitlines()[-1] == '1999', f"Expected incremental chunks, got {len(chunks)}"
+    print("[OK] Output is produced in chunks as rows arrive")
+
+
+def test_ttl_cache():
+    """Test TTL expiry, LRU eviction and invalidation of the shared cache"""
+    print("\n" + "=" * 60)
+    print("Testing TTL Cache")
+    print("=" * 60)
+    
+    import time
+    from cache_utils import TTLCache, MISSING
+    
+    cache = TTLCache(maxsize=2, ttl=0.05)
+    loads = []
+    cache.get_or_load('a', lambda: loads.append('a') or 1)
+    cache.get_or_load('a', lambda: loads.append('a') or 1)
+    assert loads == ['a'], "Cached value was loaded twice"
+    assert cache.hits == 1, "Cached value was loaded twice"
+    print("[OK] Cached value served without reloading")
+    
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('b') is MISSING, "Least recently used entry was not evicted"
+    assert cache.get('a') == 1, "Least recently used entry was not evicted"
+    print("[OK] Least recently used entry evicted")
+    
+    cache.invalidate('a')
+    assert cache.get('a') is MISSING, "Invalidated entry still cached"
+    time.sleep(0.06)
+    assert cache.get('c') is MISSING, "Expired entry still cached"
+    print("[OK] Invalidation and TTL expiry work")
+
+
+def test_user_cache():
+    """Test that cached users are rebuilt without a database query and reloaded after the TTL"""
+    print("\n" + "=" * 60)
+    print("Testing User Cache")
+    print("=" * 60)
+    
+    from app import create_app
+    from config import Config
+    from db_utils import capture_queries
+    from services.users import cache_user, load_user_by_id, user_cache
+    
+    user_data = {'id': 987654, 'username': 'cached.doctor', 'password': 'pbkdf2:secret',
+                 'role': 'DOCTOR', 'hospital_id': 3, 'is_active': True}
+    cache_user(user_data)
+    assert 'password' not in user_cache.get(987654)._fields, "Password hash kept in user cache"
+    print("[OK] Snapshot excludes password hash")
+    
+    app = create_app(Config)
+    with app.app_context(), capture_queries() as queries:
+        user = load_user_by_id('987654')
+    assert not queries, "Cached user not rebuilt from snapshot"
+    assert user.username == 'cached.doctor', "Cached user not rebuilt from snapshot"
+    assert user.role == 'DOCTOR', "Cached user not rebuilt from snapshot"
+    print("[OK] User rebuilt from cache without a query")
+    
+    # Deactivated and moved to another hospital outside the app; seen once the snapshot expires
+    fake_database(app, {'FROM core_customuser': [dict(user_data, hospital_id=4, is_active=False)]})
+    user_cache.set(987654, user_cache.get(987654), ttl=0)
+    try:
+        with app.app_context(), capture_queries() as queries:
+            user = load_user_by_id(987654)
+        assert len(queries) == 1, f"Expired user not reloaded: {queries}"
+        assert user.hospital_id == 4, "Changed user row not picked up"
+        assert not user.is_active, "Changed user row not picked up"
+        assert not user_cache.get(987654).is_active, "Reloaded user not cached"
+        print("[OK] Expired snapshot reloads the changed user row")
+    finally:
+        user_cache.invalidate(987654)
+
+
+def test_pagination_cursors():
+    """Test opaque keyset pagination cursors"""
+    print("\n" + "=" * 60)
+    print("Testing Pagination Cursors")
+    print("=" * 60)
+    
+    from datetime import datetime
+    from services.pagination import encode_cursor, decode_cursor, NEXT
+    
+    moment = datetime(2025, 3, 14, 9, 30)
+    token = encode_cursor(NEXT, moment, 42)
+    assert decode_cursor(token) == (NEXT, moment, 42), "Cursor did not round-trip"
+    print("[OK] Cursor round-trips (direction, date_and_time, appointment_id)")
+    
+    for bad in [None, '', 'not-a-cursor', encode_cursor('sideways', moment, 1)]:
+        assert decode_cursor(bad) is None, f"Malformed cursor accepted: {bad!r}"
+    print("[OK] Malformed cursors fall back to the first page")
+
+
+def test_medicine_catalog():
+    """Test medicine catalog prefix search, id lookup and TTL reloads"""
+    print("\n" + "=" * 60)
+    print("Testing Medicine Catalog")
+    print("=" * 60)
+    
+    import services.catalog as catalog_module
+    original_fetch_all = catalog_module.fetch_all
+    try:
+        rows = [
+            {'medicine_id': 3, 'name': 'Paracetamol', 'type': 'Tablet'},
+            {'medicine_id': 1, 'name': 'Napa Extra', 'type': 'Tablet'},
+            {'medicine_id': 2, 'name': 'napa syrup', 'type': 'Syrup'},
+        ]
+        loads = []
+        catalog_module.fetch_all = lambda sql, params=None: loads.append(sql) or [dict(r) for r in rows]
+        catalog = catalog_module.MedicineCatalog(ttl=60)
+        
+        names = [m['name'] for m in catalog.search('NAPA', limit=10)]
+        assert names == ['Napa Extra', 'napa syrup'], f"Unexpected prefix search results: {names}"
+        assert catalog.search('napa', limit=1)[0]['medicine_id'] == 1, f"Unexpected prefix search results: {names}"
+        print("[OK] Case-insensitive prefix search in name order")
+        
+        assert catalog.get(3)['name'] == 'Paracetamol', "Id lookup missing"
+        assert catalog.get(99) is None, "Unknown id found"
+        assert len(loads) == 1, "Catalog reloaded within its TTL"
+        print("[OK] Id lookups served from memory")
+        
+        rows.append({'medicine_id': 4, 'name': 'Napadol', 'type': 'Tablet'})
+        assert len(catalog.search('napa', limit=10)) == 2, "New medicine visible before the TTL expired"
+        catalog._loaded_at -= 61
+        assert len(catalog.search('napa', limit=10)) == 3, "Expired catalog not reloaded"
+        assert len(loads) == 2, "Expired catalog not reloaded"
+        print("[OK] Catalog reloads once its TTL expires")
+    finally:
+        catalog_module.fetch_all = original_fetch_all
+
+
+@pytest.mark.skipif(not os.environ.get('TEST_DB_NAME'),
+                    reason="Set TEST_DB_NAME to a scratch MySQL database to run this test")
+def test_stock_concurrency():
+    """
+    Stress test: many threads taking stock (services.dispensing.take_stock()
+    through reduce_stock()) from one batch must never oversell.
+    Needs a scratch MySQL database with the schema loaded: set TEST_DB_NAME
+    (and DB_HOST/DB_USER/DB_PASSWORD as usual) to run it.
+    """
+    print("\n" + "=" * 60)
+    print("Testing Stock Concurrency")
+    print("=" * 60)
+    
+    import threading
+    import uuid
+    from datetime import date, timedelta
+    from app import create_app
+    from config import Config
+    from db_utils import execute_insert, execute_update, fetch_one
+    from utils import reduce_stock, ValidationError
+    
+    workers, per_request, initial_stock = 64, 3, 100
+    
+    class StressConfig(Config):
+        DB_NAME = os.environ['TEST_DB_NAME']
+        DB_POOL_SIZE = workers
+        DB_POOL_MAX_OVERFLOW = 0
+    
+    app = create_app(StressConfig)
+    tag = uuid.uuid4().hex[:8]
+    with app.app_context():
+        district_id = execute_insert(
+            "INSERT INTO core_district (name, division) VALUES (%s, %s)", (f'Stress {tag}', 'Test'))
+        hospital_id = execute_insert(
+            """INSERT INTO core_hospital (name, address, phone, capacity, registration_no, email,
+               emergency_services, established_date, district_id)
+               VALUES (%s, 'n/a', '000', 1, %s, 'stress@example.com', 0, %s, %s)""",
+            (f'Stress {tag}', f'STRESS-{tag}', date.today(), district_id))
+        pharmacy_id = execute_insert(
+            "INSERT INTO core_pharmacy (name, location, employee_count, hospital_id) VALUES (%s, 'n/a', 1, %s)",
+            (f'Stress {tag}', hospital_id))
+        manufacturer_id = execute_insert(
+            "INSERT INTO core_manufacturer (name, phone, address, license_no) VALUES (%s, '000', 'n/a', %s)",
+            (f'Stress {tag}', f'STRESS-{tag}'))
+        medicine_id = execute_insert(
+            """INSERT INTO core_medicine (name, type, dosage_info, manufacturer_id)
+               VALUES (%s, 'Tablet', 'n/a', %s)""",
+            (f'Stress {tag}', manufacturer_id))
+        execute_insert(
+            """INSERT INTO core_pharmacymedicine (pharmacy_id, medicine_id, stock_quantity, unit_price,
+               expiry_date, batch_number, last_restocked)
+               VALUES (%s, %s, %s, 1.00, %s, %s, %s)""",
+            (pharmacy_id, medicine_id, initial_stock, date.today() + timedelta(days=365),
+             f'B-{tag}', date.today()))
+    
+    successes = []
+    failures = []
+    start = threading.Barrier(workers)
+    
+    def dispense():
+        with app.app_context():
+            start.wait()
+            try:
+                reduce_stock({'pharmacy_id': pharmacy_id}, {'medicine_id': medicine_id}, per_request)
+                successes.append(1)
+            except ValidationError:
+                failures.append(1)
+    
+    threads = [threading.Thread(target=dispense) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    with app.app_context():
+        remaining = fetch_one(
+            "SELECT stock_quantity FROM core_pharmacymedicine WHERE pharmacy_id = %s AND medicine_id = %s",
+            (pharmacy_id, medicine_id))['stock_quantity']
+        execute_update("DELETE FROM core_pharmacymedicine WHERE pharmacy_id = %s", (pharmacy_id,))
+        execute_update("DELETE FROM core_medicine WHERE medicine_id = %s", (medicine_id,))
+        execute_update("DELETE FROM core_manufacturer WHERE manufacturer_id = %s", (manufacturer_id,))
+        execute_update("DELETE FROM core_pharmacy WHERE pharmacy_id = %s", (pharmacy_id,))
+        execute_update("DELETE FROM core_hospital WHERE hospital_id = %s", (hospital_id,))
+        execute_update("DELETE FROM core_district WHERE district_id = %s", (district_id,))
+    
+    expected_successes = initial_stock // per_request
+    assert len(successes) == expected_successes, f"{len(successes)} dispenses succeeded, {remaining} left in stock"
+    assert remaining == initial_stock - expected_successes * per_request, f"{len(successes)} dispenses succeeded, {remaining} left in stock"
+    print(f"[OK] {workers} concurrent dispenses: {len(successes)} succeeded, "
+          f"{len(failures)} rejected, {remaining} left (no oversell)")
+
+
+def test_fefo_allocation():
+    """Test first-expiry-first-out batch allocation for dispensing"""
+    print("\n" + "=" * 60)
+    print("Testing FEFO Allocation")
+    print("=" * 60)
+    
+    from datetime import date, timedelta
+    from decimal import Decimal
+    from services.dispensing import allocate_fefo
+    from utils import ValidationError
+    
+    today = date(2025, 6, 1)
+    batches = [
+        {'pharmacy_medicine_id': 1, 'medicine_id': 7, 'stock_quantity': 50, 'unit_price': Decimal('2.00'),
+         'expiry_date': date(2025, 5, 31), 'batch_number': 'EXPIRED'},
+        {'pharmacy_medicine_id': 2, 'medicine_id': 7, 'stock_quantity': 10, 'unit_price': Decimal('2.50'),
+         'expiry_date': date(2025, 9, 1), 'batch_number': 'LATE'},
+        {'pharmacy_medicine_id': 3, 'medicine_id': 7, 'stock_quantity': 4, 'unit_price': Decimal('2.00'),
+         'expiry_date': date(2025, 7, 1), 'batch_number': 'EARLY'},
+    ]
+    
+    allocations = allocate_fefo([{'medicine_id': 7, 'quantity': 6, 'name': 'Napa'}], batches, today)
+    taken = [(a.batch_number, a.quantity) for a in allocations]
+    assert taken == [('EARLY', 4), ('LATE', 2)], f"Unexpected allocation: {taken}"
+    assert sum((a.amount for a in allocations), Decimal('0')) == Decimal('13.00'), "Allocation amounts do not use batch prices"
+    print("[OK] Earliest unexpired batch used first, expired batch skipped")
+    
+    with pytest.raises(ValidationError) as shortage:
+        allocate_fefo([{'medicine_id': 7, 'quantity': 15, 'name': 'Napa'}], batches, today)
+    print(f"[OK] Shortage reported: {shortage.value}")
+    
+    from app import create_app
+    from utils import reduce_stock
+    
+    app = create_app()
+    answers = {
+        'SUM(stock_quantity)': [{'pharmacy_id': 1, 'medicine_id': 5, 'stock_quantity': 1, 'batch_count': 2}],
+        'FOR UPDATE': [
+            {'pharmacy_medicine_id': 21, 'medicine_id': 5, 'stock_quantity': 5, 'unit_price': '2.00',
+             'expiry_date': date.today() + timedelta(days=30), 'batch_number': 'B-2'},
+            {'pharmacy_medicine_id': 20, 'medicine_id': 5, 'stock_quantity': 2, 'unit_price': '2.00',
+             'expiry_date': date.today() + timedelta(days=10), 'batch_number': 'B-1'},
+        ],
+    }
+    pool, executed = fake_database(app, answers)
+    with app.app_context():
+        result = reduce_stock({'pharmacy_id': 1}, {'medicine_id': 5, 'name': 'Napa'}, 6)
+        locks = [sql for sql, params in executed if 'FOR UPDATE' in sql]
+        updates = [params for sql, params in executed if sql.lstrip().startswith('UPDATE')]
+        # The query itself filters expired batches out
+        assert len(locks) == 1, f"Expected one locking read: {locks}"
+        assert 'expiry_date >=' in locks[0], "Expired batches not excluded"
+        assert updates == [(20, 2, 21, 4, 20, 21)], f"reduce_stock did not split across batches: {updates}"
+        assert result['stock_quantity'] == 1, f"Unexpected result: {result}"
+        executed.clear()
+        with pytest.raises(ValidationError):
+            reduce_stock({'pharmacy_id': 1}, {'medicine_id': 5, 'name': 'Napa'}, 8)
+        assert not any(sql.lstrip().startswith('UPDATE') for sql, params in executed), "Stock changed on a shortage"
+    print("[OK] reduce_stock takes stock through take_stock(), spanning unexpired batches")
+    
+    import services.dispensing as dispensing
+    
+    answers.clear()
+    answers['FROM core_pharmacybill'] = [{'times': 1}]
+    answers['FROM core_prescription'] = [{'prescription_id': 3, 'valid_until': date.today() + timedelta(days=30),
+                                          'refill_count': 0, 'patient_id': 9}]
+    original_service_type = dispensing.get_service_type_id
+    dispensing.get_service_type_id = lambda name, description=None: 1
+    executed.clear()
+    try:
+        with app.app_context(), pytest.raises(ValidationError) as repeat:
+            dispensing.dispense_prescription(3, 1)
+        writes = [sql for sql, params in executed if sql.lstrip().startswith(('UPDATE', 'INSERT'))]
+        assert not writes, f"Stock changed before the repeat was rejected: {writes}"
+        print(f"[OK] Repeat dispense rejected: {repeat.value}")
+    finally:
+        dispensing.get_service_type_id = original_service_type
+
+
+def test_reference_cache():
+    """Test that reference data ids are looked up once and then served from memory"""
+    print("\n" + "=" * 60)
+    print("Testing Reference Data Cache")
+    print("=" * 60)
+    
+    import services.reference as reference
+    original = reference.get_or_create
+    calls = []
+    
+    def fake_get_or_create(table, lookup, defaults):
+        calls.append((table, lookup['name']))
+        return {'service_type_id': 42, 'name': lookup['name']}, False
+    
+    try:
+        reference.get_or_create = fake_get_or_create
+        reference.reference_cache.clear()
+        
+        first = reference.get_service_type_id('Laboratory', 'Lab test services')
+        second = reference.get_service_type_id('Laboratory', 'Lab test services')
+        assert first == 42, f"Expected one lookup, got {calls}"
+        assert second == 42, f"Expected one lookup, got {calls}"
+        assert len(calls) == 1, f"Expected one lookup, got {calls}"
+        print("[OK] Service type id memoized after first lookup")
+        
+        reference.invalidate_reference('core_servicetype', {'name': 'Laboratory'})
+        reference.get_service_type_id('Laboratory')
+        assert len(calls) == 2, "Invalidation did not force a reload"
+        print("[OK] Invalidation forces a reload")
+        
+        from db_utils import table_keys
+        pk_name, unique_sets = table_keys('core_servicetype')
+        assert pk_name == 'service_type_id', f"Unexpected key metadata: {pk_name}, {unique_sets}"
+        assert frozenset(['name']) in unique_sets, f"Unexpected key metadata: {pk_name}, {unique_sets}"
+        pk_name, unique_sets = table_keys('core_manufacturer')
+        assert pk_name == 'manufacturer_id', f"Unexpected key metadata: {pk_name}, {unique_sets}"
+        assert frozenset(['license_no']) in unique_sets, f"Unexpected key metadata: {pk_name}, {unique_sets}"
+        print("[OK] Primary and unique keys read from models")
+        
+        import db_utils
+        from app import create_app
+        
+        executed = []
+        indexes = [('PRIMARY', 'service_type_id')]
+        
+        class FakeCursor:
+            rowcount = 1
+            lastrowid = 7
+            description = (('service_type_id',), ('name',))
+            
+            def __enter__(self):
+                return self
+            
+            def __exit__(self, *exc):
+                return False
+            
+            def execute(self, sql, params=None):
+                executed.append(sql)
+                self.description = ((('index_name',), ('column_name',)) if 'information_schema' in sql
+                                    else (('service_type_id',), ('name',)))
+                return 1
+            
+            def fetchall(self):
+                return list(indexes)
+            
+            def fetchone(self):
+                return (7, 'Laboratory')
+        
+        class FakeConnection:
+            open = True
+            
+            def cursor(self):
+                return FakeCursor()
+            
+            def ping(self, reconnect=False):
+                pass
+            
+            def begin(self):
+                pass
+            
+            def commit(self):
+                pass
+            
+            def rollback(self):
+                pass
+            
+            def close(self):
+                pass
+        
+        app = create_app()
+        app.extensions['db_pool'] = db_utils.ConnectionPool(FakeConnection, size=1, max_overflow=0)
+        with app.app_context():
+            db_utils.get_or_create('core_servicetype', {'name': 'Laboratory'}, {})
+            assert not any('ON DUPLICATE KEY' in sql for sql in executed), f"Upsert used without a unique index in the database: {executed}"
+            assert any('FOR UPDATE' in sql for sql in executed), f"Upsert used without a unique index in the database: {executed}"
+            executed.clear()
+            indexes.append(('uniq_servicetype_name', 'name'))
+            db_utils.get_or_create('core_servicetype', {'name': 'Laboratory'}, {})
+            assert any('ON DUPLICATE KEY' in sql for sql in executed), f"Upsert not used once the unique index exists: {executed}"
+            db_utils._unique_indexes.clear()
+        print("[OK] Upsert only used when the unique index exists in the database")
+    finally:
+        reference.get_or_create = original
+        reference.reference_cache.clear()
+
+
+def test_data_generator():
+    """Test that synthetic data is deterministic and internally consistent"""
+    print("\n" + "=" * 60)
+    print("Testing Synthetic Data Generator")
+    print("=" * 60)
+    
+    import itertools
+    import random
+    from datetime import date
+    from commands.generate_data import Generator, ChunkedWriter, COLUMNS, PRIMARY_KEYS, SHARED_KEYS
+    
+    class CollectingWriter(ChunkedWriter):
+        """Keeps every row in memory instead of writing to MySQL"""
+        def __init__(self):
+            super().__init__(chunk_size=1)
+            self.rows = {table: [] for table in COLUMNS}
+        
+        def add(self, table, row):
+            self.rows[table].append(row)
+    
+    def generate(seed):
+        writer = CollectingWriter()
+        ids = {table: itertools.count(1) for table in PRIMARY_KEYS if table not in SHARED_KEYS}
+        generator = Generator(random.Random(seed), writer, ids, date(2025, 6, 1), 'hash')
+        hospitals = generator.hospitals(3, [1, 2])
+        doctors = generator.doctors(10, hospitals, [1, 2, 3])
+        medicines = generator.medicines(15, [1], hospitals)
+        generator.patients(200, 4, doctors, medicines, {'Consultation': 1, 'Laboratory': 2, 'Pharmacy': 3})
+        return writer.rows
+    
+    rows = generate(7)
+    assert rows == generate(7), "Same seed produced different rows"
+    print("[OK] Same seed produces identical rows")
+    
+    for table, table_rows in rows.items():
+        assert all(len(row) == len(COLUMNS[table]) for row in table_rows), f"Row width does not match columns for {table}"
+    
+    doctor_ids = {row[0] for row in rows['core_doctor']}
+    patient_ids = {row[0] for row in rows['core_patient']}
+    assert all(row[1] in patient_ids and row[2] in doctor_ids for row in rows['core_appointment']), "Appointment references a missing patient or doctor"
+    transaction_ids = [row[-1] for row in rows['core_bill'] if row[-1]]
+    assert len(transaction_ids) == len(set(transaction_ids)), "Duplicate bill transaction_id"
+    print(f"[OK] {len(rows['core_appointment'])} appointments with valid foreign keys and unique transaction ids")
+
+
+def test_benchmark_compare():
+    """Test the benchmark regression check against a baseline"""
+    print("\n" + "=" * 60)
+    print("Testing Benchmark Regression Check")
+    print("=" * 60)
+    
+    from benchmark import compare
+    
+    baseline = {'routes': {
+        'doctor.dashboard': {'p95_ms': 20.0, 'queries': 4, 'peak_kb': 500.0},
+        'patient.bills': {'p95_ms': 10.0, 'queries': 3, 'peak_kb': 200.0},
+    }}
+    steady = {'routes': {
+        'doctor.dashboard': {'p95_ms': 22.0, 'queries': 4, 'peak_kb': 510.0},
+        'patient.bills': {'p95_ms': 12.5, 'queries': 3, 'peak_kb': 200.0},
+    }}
+    assert not compare(steady, baseline, tolerance=0.25, slack_ms=2.0), "Noise within tolerance reported as a regression"
+    print("[OK] Changes within tolerance pass")
+    
+    regressed = {'routes': {
+        'doctor.dashboard': {'p95_ms': 40.0, 'queries': 5, 'peak_kb': 500.0},
+    }}
+    regressions = compare(regressed, baseline, tolerance=0.25, slack_ms=2.0)
+    assert len(regressions) == 3, f"Expected latency, query and missing-route regressions: {regressions}"
+    print("[OK] Latency, query count and missing routes flagged")
+
+
+def test_request_profiling():
+    """Test that signed-token requests are profiled and stored"""
+    print("\n" + "=" * 60)
+    print("Testing Request Profiling")
+    print("=" * 60)
+    
+    import shutil
+    import tempfile
+    profiles = tempfile.mkdtemp(prefix='profiles-')
+    try:
+        from app import create_app
+        from config import Config
+        import profiling
+        
+        class ProfilingConfig(Config):
+            PROFILING_ENABLED = True
+            PROFILING_INTERVAL = 0.001
+            PROFILES_DIR = profiles
+        
+        app = create_app(ProfilingConfig)
+        client = app.test_client()
+        
+        assert 'X-Profile-Id' not in client.get('/login').headers, "Request without a token was profiled"
+        assert 'X-Profile-Id' not in client.get('/login', headers={'X-Profile-Token': 'forged'}).headers, "Request with a forged token was profiled"
+        print("[OK] Unsigned requests are not profiled")
+        
+        output = app.test_cli_runner().invoke(args=['profile-token']).output
+        header, token = output.splitlines()[0].split(': ', 1)
+        assert header == 'X-Profile-Token', f"profile-token printed {output!r}"
+        response = client.get('/login', headers={'X-Profile-Token': token})
+        profile_id = response.headers.get('X-Profile-Id')
+        assert profile_id, "Signed request was not profiled"
+        
+        with app.app_context():
+            stored = profiling.list_profiles()
+            assert [summary['id'] for summary in stored] == [profile_id], f"Profile not stored: {stored}"
+            assert profiling.profile_path(profile_id) is not None, f"Profile not stored: {stored}"
+            assert set(stored[0]['categories']) == set(profiling.CATEGORIES), "Summary is missing time categories"
+            assert profiling.profile_path('../../etc/passwd') is None, "Profile path accepted a traversal id"
+        print(f"[OK] Profile {profile_id} stored with {stored[0]['samples']} samples")
+    finally:
+        shutil.rmtree(profiles, ignore_errors=True)
+
+
+def test_metrics():
+    """Test the /metrics endpoint and per-thread metric shards"""
+    print("\n" + "=" * 60)
+    print("Testing Metrics")
+    print("=" * 60)
+    
+    import re
+    import threading
+    from app import create_app
+    import metrics
+    
+    from config import Config
+    
+    class OpenConfig(Config):
+        METRICS_ENABLED = True
+        METRICS_TOKEN = None
+    
+    assert '/metrics' not in [rule.rule for rule in create_app(OpenConfig).url_map.iter_rules()], "/metrics registered without a token"
+    print("[OK] /metrics is not served without METRICS_TOKEN")
+    
+    class MetricsConfig(Config):
+        METRICS_ENABLED = True
+        METRICS_TOKEN = 'scrape-secret'
+    
+    app = create_app(MetricsConfig)
+    client = app.test_client()
+    for _ in range(3):
+        client.get('/login')
+    assert client.get('/metrics').status_code == 401, "/metrics served without the bearer token"
+    body = client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).get_data(as_text=True)
+    
+    match = re.search(r'http_request_duration_seconds_count\{endpoint="auth.login",method="GET",status="200"\} (\d+)', body)
+    assert match, "Login requests missing from the latency histogram"
+    assert int(match.group(1)) >= 3, "Login requests missing from the latency histogram"
+    for name in ('http_requests_in_flight', 'db_pool_connections', 'cache_hit_ratio{cache="users"}'):
+        assert name in body, f"{name} missing from /metrics"
+    print("[OK] /metrics exposes request, pool and cache metrics")
+    
+    registry = metrics.Registry(max_fingerprints=2)
+    
+    def work():
+        for _ in range(1000):
+            registry.observe('db_query_duration_seconds', ('SELECT ?',), 0.002)
+    
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    values = registry.collect().series[('db_query_duration_seconds', ('SELECT ?',))]
+    assert sum(values[:-1]) == 4000, f"Expected 4000 observations across shards, got {sum(values[:-1])}"
+    print("[OK] Observations from 4 threads summed on collect")
+    
+    labels = [registry.fingerprint_label(f'SELECT {n}') for n in range(4)]
+    assert labels == ['SELECT 0', 'SELECT 1', metrics.OTHER_FINGERPRINT, metrics.OTHER_FINGERPRINT], f"Fingerprint cap not applied: {labels}"
+    print("[OK] Fingerprint label cardinality capped")
+
+
+def test_row_objects():
+    """Test the lightweight read models that replace dict_to_model"""
+    print("\n" + "=" * 60)
+    print("Testing Row Objects")
+    print("=" * 60)
+    
+    from datetime import date
+    from services.rows import APPOINTMENT, DOCTOR, PRESCRIPTION, PHARMACY_BILL
+    import benchmark_rows
+    
+    appointments = APPOINTMENT.many([
+        {'appointment_id': 1, 'status': 'Scheduled', 'patient_name': 'Rahim'},
+        {'appointment_id': 2, 'status': 'Completed', 'patient_name': 'Karim'},
+    ])
+    assert appointments[1].status == 'Completed', "Columns or nested .patient not hydrated"
+    assert appointments[0].patient.full_name == 'Rahim', "Columns or nested .patient not hydrated"
+    assert appointments[0].diagnosis is None, "Unselected columns should read as None like on a model"
+    assert appointments[0].doctor is None, "Unselected columns should read as None like on a model"
+    assert type(appointments[0]) is type(appointments[1]), "Rows of one query should share one __slots__ class"
+    assert not hasattr(appointments[0], '__dict__'), "Rows of one query should share one __slots__ class"
+    print("[OK] Columns, unselected defaults and nested accessors work")
+    
+    doctors = DOCTOR.many([{'doctor_id': 1, 'dept_name': 'Cardiology'}, {'doctor_id': 2, 'dept_name': None}])
+    assert doctors[0].dept.dept_name == 'Cardiology', "LEFT JOIN relation should be None when its columns are NULL"
+    assert doctors[1].dept is None, "LEFT JOIN relation should be None when its columns are NULL"
+    
+    prescription = PRESCRIPTION.one({'prescription_id': 5, 'valid_until': date(2000, 1, 1)})
+    prescription.items = []
+    assert prescription.is_expired, "Model properties not available on rows"
+    assert PRESCRIPTION.one(None) is None, "Model properties not available on rows"
+    
+    pharmacy_bill = PHARMACY_BILL.one({'bill_id': 3, 'total_amount': 10, 'pharmacy_name': 'Lazz'})
+    assert pharmacy_bill.bill.total_amount == 10, "Whole-row relation not built"
+    assert pharmacy_bill.pharmacy.name == 'Lazz', "Whole-row relation not built"
+    print("[OK] Relations and model properties work")
+    
+    results = benchmark_rows.run(count=500, repeat=1)
+    for name, row in results.items():
+        print(f"[OK] {name}: dict_to_model {row['legacy_ms']}ms, rows {row['rows_ms']}ms on 500 rows")
+
+
+def test_dashboard_stats():
+    """Test the admin dashboard query's parameters and the mapping of its columns to DashboardStats"""
+    print("\n" + "=" * 60)
+    print("Testing Dashboard Stats")
+    print("=" * 60)
+    
+    import re
+    from datetime import date, datetime
+    from app import create_app
+    from services.dashboard import CHART_DAYS, DashboardStats, _STATS_SQL, get_dashboard_stats
+    
+    # Distinct values in the order the query selects its columns
+    aliases = re.findall(r'AS (\w+)', _STATS_SQL)
+    assert aliases == ['departments_count', 'doctors_count', 'labs_count'] + [f'day_{i}' for i in range(CHART_DAYS)], \
+        f"Unexpected columns: {aliases}"
+    answers = {
+        'AS departments_count': [{alias: position + 1 for position, alias in enumerate(aliases)}],
+        'ORDER BY a.date_and_time DESC': [{'appointment_id': 41, 'doctor_name': 'Dr. Karim'}],
+    }
+    app = create_app()
+    pool, executed = fake_database(app, answers)
+    with app.app_context():
+        stats = get_dashboard_stats(5, today=date(2024, 3, 10), recent_limit=3)
+    
+    midnights = tuple(datetime(2024, 3, day) for day in range(4, 12))
+    day_params = tuple(value for i in range(CHART_DAYS) for value in midnights[i:i + 2])
+    assert len(executed) == 2, f"Expected two queries: {executed}"
+    assert executed[0][1] == (5, 5, 5) + day_params + (5, midnights[0], midnights[-1]), \
+        f"Unexpected stats parameters: {executed[0][1]}"
+    assert executed[1][1] == (5, 3), f"Unexpected recent appointments parameters: {executed[1][1]}"
+    print("[OK] Day boundaries are the local midnights from six days ago to tomorrow")
+    
+    assert isinstance(stats, DashboardStats), f"Unexpected result: {stats!r}"
+    assert (stats.departments_count, stats.doctors_count, stats.labs_count) == (1, 2, 3), f"Counters mixed up: {stats}"
+    assert [day.count for day in stats.appointments_per_day] == list(range(4, 11)), f"Chart mixed up: {stats}"
+    assert stats.appointments_per_day[0].day == date(2024, 3, 4), f"Chart does not start six days ago: {stats}"
+    assert stats.today_appointments == 10, f"Today is not the last chart day: {stats}"
+    assert stats.chart_data()[-1] == {'date': 'Mar 10', 'count': 10}, f"Unexpected chart data: {stats.chart_data()}"
+    assert stats.recent_appointments == ({'appointment_id': 41, 'doctor_name': 'Dr. Karim'},), \
+        f"Unexpected recent appointments: {stats.recent_appointments}"
+    print("[OK] Columns map onto DashboardStats in order")
+
+
+def test_current_hospital():
+    """Test current_hospital() is resolved once per request and cached across requests"""
+    print("\n" + "=" * 60)
+    print("Testing Current Hospital")
+    print("=" * 60)
+    
+    from flask_login import login_user
+    from app import create_app
+    from db_utils import capture_queries
+    from services.hospitals import current_hospital, hospital_cache, invalidate_hospital
+    from services.users import build_user, snapshot_user
+    
+    app = create_app()
+    pool, executed = fake_database(app, {
+        'FROM core_hospital': [{'hospital_id': 90031, 'name': 'Sylhet MAG Osmani Medical College Hospital'}],
+    })
+    admin = build_user(snapshot_user({'id': 90031, 'username': 'somc_admin', 'role': 'ADMIN',
+                                      'hospital_id': 90031, 'is_active': True}))
+    patient = build_user(snapshot_user({'id': 90032, 'username': 'patient', 'role': 'PATIENT',
+                                        'hospital_id': None, 'is_active': True}))
+    
+    hospital_cache.invalidate(90031)
+    try:
+        with app.test_request_context('/admin/dashboard'), capture_queries() as queries:
+            login_user(admin)
+            first = current_hospital()
+            second = current_hospital()
+        assert first.name == 'Sylhet MAG Osmani Medical College Hospital', f"Unexpected hospital: {first}"
+        assert second is first, "Hospital not memoized for the request"
+        assert len(queries) == 1, f"Expected one query for the request: {queries}"
+        print("[OK] Hospital loaded once per request")
+        
+        with app.test_request_context('/admin/dashboard'), capture_queries() as queries:
+            login_user(admin)
+            hospital = current_hospital()
+        assert not queries, f"Cached hospital loaded again: {queries}"
+        assert hospital is not first, "Hospital object shared between requests"
+        assert hospital.hospital_id == 90031, f"Unexpected hospital: {hospital}"
+        
+        invalidate_hospital(90031)
+        with app.test_request_context('/admin/dashboard'), capture_queries() as queries:
+            login_user(admin)
+            current_hospital()
+        assert len(queries) == 1, f"Invalidated hospital not reloaded: {queries}"
+        print("[OK] Later requests use the cache until the hospital is invalidated")
+        
+        with app.test_request_context('/patient/dashboard'), capture_queries() as queries:
+            login_user(patient)
+            assert current_hospital() is None, "User without a hospital got one"
+        assert not queries, f"Hospital queried for a user without one: {queries}"
+        print("[OK] Users without a hospital get None without a query")
+    finally:
+        hospital_cache.invalidate(90031)
+
+
+def test_search_endpoints():
+    """Test the doctor patient and medicine typeahead endpoints"""
+    print("\n" + "=" * 60)
+    print("Testing Search Endpoints")
+    print("=" * 60)
+    
+    from app import create_app
+    from config import Config
+    from db_utils import capture_queries
+    from services.catalog import medicine_catalog
+    from services.users import user_cache
+    
+    class SearchConfig(Config):
+        PATIENT_SEARCH_LIMIT = 7
+        MEDICINE_SEARCH_LIMIT = 2
+    
+    app = create_app(SearchConfig)
+    pool, executed = fake_database(app, {
+        'FROM core_patient': [{'patient_id': 11, 'full_name': 'Rahim_% Uddin', 'national_id': '1990123456789'}],
+        'FROM core_medicine': [
+            {'medicine_id': 3, 'name': 'Paracetamol', 'type': 'Tablet'},
+            {'medicine_id': 1, 'name': 'Napa Extra', 'type': 'Tablet'},
+            {'medicine_id': 2, 'name': 'napa syrup', 'type': 'Syrup'},
+            {'medicine_id': 4, 'name': 'Napadol', 'type': 'Tablet'},
+        ],
+    })
+    client = app.test_client()
+    log_in(client, 90041, 'DOCTOR')
+    # Load the shared catalog from this test's rows, and leave it unloaded for others
+    medicine_catalog._loaded_at = None
+    try:
+        response = client.get('/doctor/patients/search?q=Rahim_%')
+        assert response.get_json() == {'results': [{'id': 11, 'name': 'Rahim_% Uddin', 'national_id': '1990123456789'}]}, \
+            f"Unexpected patient results: {response.get_json()}"
+        assert executed[-1][1] == ('Rahim_%', 'Rahim_%', 'Rahim\\_\\%%', 7, 7), f"Unexpected parameters: {executed[-1][1]}"
+        print("[OK] Patient search matches ID and phone exactly and the name by escaped prefix")
+        
+        client.get('/doctor/patients/search?q=R')
+        assert executed[-1][1] == ('R', 'R', 7), f"One-letter name prefix searched: {executed[-1]}"
+        executed.clear()
+        assert client.get('/doctor/patients/search?q=++').get_json() == {'results': []}, "Blank query returned results"
+        assert not executed, f"Blank query hit the database: {executed}"
+        print("[OK] Short prefixes search ID and phone only; blank queries skip the database")
+        
+        response = client.get('/doctor/medicines/search?q=NAPA')
+        assert response.get_json() == {'results': [{'id': 1, 'name': 'Napa Extra', 'type': 'Tablet'},
+                                                   {'id': 2, 'name': 'napa syrup', 'type': 'Syrup'}]}, \
+            f"Unexpected medicine results: {response.get_json()}"
+        with capture_queries() as queries:
+            response = client.get('/doctor/medicines/search?q=para')
+        assert [m['id'] for m in response.get_json()['results']] == [3], f"Unexpected results: {response.get_json()}"
+        assert not queries, f"Medicine search queried the database: {queries}"
+        print("[OK] Medicine search is a limited case-insensitive prefix match served from memory")
+        
+        log_in(client, 90042, 'PATIENT')
+        assert client.get('/doctor/medicines/search?q=napa').status_code == 302, "Patient reached the doctor search"
+        assert client.get('/doctor/patients/search?q=Rahim').status_code == 302, "Patient reached the doctor search"
+        print("[OK] Search endpoints are limited to doctors")
+    finally:
+        medicine_catalog._loaded_at = None
+        for user_id in (90041, 90042):
+            user_cache.invalidate(user_id)
+
+
+def test_route_query_budgets():
+    """Test that doctor and patient dashboards and lists issue a fixed number of queries"""
+    print("\n" + "=" * 60)
+    print("Testing Route Query Budgets")
+    print("=" * 60)
+    
+    from datetime import datetime, timedelta
+    from decimal import Decimal
+    import routes.doctor
+    import routes.patient
+    from app import create_app
+    from config import Config
+    from db_utils import assert_max_queries
+    from decorators import invalidate_profile
+    from services.users import user_cache
+    
+    start = datetime(2024, 5, 1, 9, 0)
+    appointments = [
+        {'appointment_id': i, 'date_and_time': start + timedelta(hours=i), 'status': 'Scheduled',
+         'patient_id': 11, 'doctor_id': 7, 'patient_name': 'Rahim Uddin', 'doctor_name': 'Dr. Karim',
+         'specialization': 'Cardiology', 'dept_name': 'Cardiology', 'hospital_name': 'DMCH'}
+        for i in range(1, 9)
+    ]
+    bills = [
+        {'bill_id': i, 'bill_date': start.date(), 'patient_id': 11, 'total_amount': Decimal('100.00'),
+         'status': 'Pending', 'service_type_name': 'Pharmacy', 'pharmacy_bill_id': i,
+         'pharmacy_id': 2, 'pharmacy_name': 'DMCH Pharmacy', 'purchase_date': start.date()}
+        for i in range(1, 6)
+    ]
+    # Fragments are matched in order: core_prescriptionitem before core_prescription
+    answers = {
+        'FROM core_doctor WHERE user_id': [{'doctor_id': 7, 'user_id': 90021, 'full_name': 'Dr. Karim'}],
+        'FROM core_patient WHERE user_id': [{'patient_id': 11, 'user_id': 90022, 'full_name': 'Rahim Uddin'}],
+        'FROM core_prescriptionitem': [
+            {'item_id': i, 'prescription_id': i % 3 + 1, 'medicine_id': 5, 'quantity': 10,
+             'medicine_name': 'Napa', 'medicine_type': 'Tablet'}
+            for i in range(1, 7)
+        ],
+        'FROM core_prescription': [
+            {'prescription_id': i, 'appointment_id': 1, 'valid_until': start.date() + timedelta(days=30),
+             'refill_count': 0}
+            for i in range(1, 4)
+        ],
+        'FROM core_appointment': appointments,
+        'FROM core_patientemergencycontact': [
+            {'contact_id': i, 'patient_id': 11, 'name': f'Contact {i}', 'is_primary': True} for i in range(1, 3)
+        ],
+        'FROM core_pharmacybill': bills,
+        'FROM core_bill': bills,
+    }
+    
+    class PageConfig(Config):
+        APPOINTMENTS_PAGE_SIZE = 5
+    
+    app = create_app(PageConfig)
+    fake_database(app, answers)
+    # Most page templates are not part of this tree; capture what they would render
+    rendered = {}
+    
+    def capture(template, **context):
+        rendered[template] = context
+        return ''
+    
+    originals = routes.doctor.render_template, routes.patient.render_template
+    routes.doctor.render_template = routes.patient.render_template = capture
+    client = app.test_client()
+    
+    def get(path, budget):
+        # The first request also loads the doctor/patient profile
+        with assert_max_queries(budget + 1):
+            response = client.get(path)
+        assert response.status_code == 200, f"{path} returned {response.status_code}"
+    
+    try:
+        log_in(client, 90021, 'DOCTOR')
+        invalidate_profile(90021)
+        get('/doctor/dashboard', 3)
+        context = rendered['doctor/dashboard.html']
+        assert len(context['today_appointments']) == 8, "Dashboard lost appointments"
+        assert context['completed_appointments'][0].patient_name == 'Rahim Uddin', "Patient name not joined"
+        invalidate_profile(90021)
+        get('/doctor/appointments', 1)
+        assert len(rendered['doctor/appointments.html']['appointments']) == 5, "Page size not applied"
+        invalidate_profile(90021)
+        get('/doctor/appointments/1', 3)
+        prescriptions = rendered['doctor/appointment_detail.html']['prescriptions']
+        assert [len(p.items) for p in prescriptions] == [2, 2, 2], "Prescription items not attached"
+        print("[OK] Doctor dashboard, appointment list and detail stay within their query budgets")
+        
+        log_in(client, 90022, 'PATIENT')
+        invalidate_profile(90022)
+        get('/patient/dashboard', 3)
+        assert len(rendered['patient/dashboard.html']['recent_bills']) == 5, "Dashboard lost bills"
+        invalidate_profile(90022)
+        get('/patient/appointments', 1)
+        assert len(rendered['patient/appointments.html']['appointments']) == 5, "Page size not applied"
+        invalidate_profile(90022)
+        get('/patient/appointments/1', 3)
+        prescriptions = rendered['patient/appointment_detail.html']['prescriptions']
+        assert [len(p.items) for p in prescriptions] == [2, 2, 2], "Prescription items not attached"
+        invalidate_profile(90022)
+        get('/patient/bills', 2)
+        context = rendered['patient/bills.html']
+        assert context['pharmacy_bills'][0].pharmacy.name == 'DMCH Pharmacy', "Pharmacy not built from the joined row"
+        assert len(context['pharmacy_bills']) == 5, "Pharmacy bills lost"
+        print("[OK] Patient dashboard, lists and detail stay within their query budgets")
+    finally:
+        routes.doctor.render_template, routes.patient.render_template = originals
+        for user_id in (90021, 90022):
+            user_cache.invalidate(user_id)
+            invalidate_profile(user_id)
+
+
+def run_test(test):
+    """
+    Run one test for the summary: True if it passed, False if it failed and
+    None if a skipif mark skipped it. Tests either return a bool or assert.
+    """
+    for mark in getattr(test, 'pytestmark', []):
+        if mark.name == 'skipif' and mark.args[0]:
+            print(f"\n[SKIP] {test.__name__}: {mark.kwargs['reason']}")
+            return None
+    try:
+        return test() is not False
+    except Exception as e:
+        print(f"[FAIL] {test.__name__}: {e}")
+        traceback.print_exc()
+        return False
+
+
 def main():
     """Run all tests"""
     print("\n" + "=" * 60)
@@ -281,13 +1925,37 @@ def main():
     
     results = []
     
-    results.append(("Imports", test_imports()))
-    results.append(("Models", test_models()))
-    results.append(("Forms", test_forms()))
-    results.append(("Routes", test_routes()))
-    results.append(("Decorators", test_decorators()))
-    results.append(("Utils", test_utils()))
-    results.append(("App Creation", test_app_creation()))
+    results.append(("Imports", run_test(test_imports)))
+    results.append(("Models", run_test(test_models)))
+    results.append(("Forms", run_test(test_forms)))
+    results.append(("Routes", run_test(test_routes)))
+    results.append(("Decorators", run_test(test_decorators)))
+    results.append(("Utils", run_test(test_utils)))
+    results.append(("Connection Pool", run_test(test_connection_pool)))
+    results.append(("Query Instrumentation", run_test(test_query_instrumentation)))
+    results.append(("Read Replicas", run_test(test_read_replicas)))
+    results.append(("Create Indexes", run_test(test_create_indexes)))
+    results.append(("Transactions", run_test(test_transactions)))
+    results.append(("Lab Test Billing", run_test(test_lab_test_billing)))
+    results.append(("Streaming Cursor", run_test(test_streaming)))
+    results.append(("CSV Export", run_test(test_csv_export)))
+    results.append(("TTL Cache", run_test(test_ttl_cache)))
+    results.append(("User Cache", run_test(test_user_cache)))
+    results.append(("Pagination Cursors", run_test(test_pagination_cursors)))
+    results.append(("Medicine Catalog", run_test(test_medicine_catalog)))
+    results.append(("Stock Concurrency", run_test(test_stock_concurrency)))
+    results.append(("FEFO Allocation", run_test(test_fefo_allocation)))
+    results.append(("Reference Cache", run_test(test_reference_cache)))
+    results.append(("Data Generator", run_test(test_data_generator)))
+    results.append(("Benchmark Compare", run_test(test_benchmark_compare)))
+    results.append(("Request Profiling", run_test(test_request_profiling)))
+    results.append(("Metrics", run_test(test_metrics)))
+    results.append(("Row Objects", run_test(test_row_objects)))
+    results.append(("Dashboard Stats", run_test(test_dashboard_stats)))
+    results.append(("Current Hospital", run_test(test_current_hospital)))
+    results.append(("Search Endpoints", run_test(test_search_endpoints)))
+    results.append(("Route Query Budgets", run_test(test_route_query_budgets)))
+    results.append(("App Creation", run_test(test_app_creation)))
     
     # Summary
     print("\n" + "=" * 60)
@@ -295,13 +1963,14 @@ def main():
     print("=" * 60)
     
     passed = sum(1 for _, result in results if result)
-    total = len(results)
+    skipped = sum(1 for _, result in results if result is None)
+    total = len(results) - skipped
     
     for name, result in results:
-        status = "[PASS]" if result else "[FAIL]"
+        status = "[SKIP]" if result is None else "[PASS]" if result else "[FAIL]"
         print(f"{status}: {name}")
     
-    print(f"\nTotal: {passed}/{total} tests passed")
+    print(f"\nTotal: {passed}/{total} tests passed" + (f" ({skipped} skipped)" if skipped else ""))
     
     if passed == total:
         print("\n[SUCCESS] All tests passed! Application structure is correct.")
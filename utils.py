@@ -1,8 +1,8 @@
 """
 Utility functions for business logic validation using raw SQL queries
 """
-from datetime import date
-from db_utils import fetch_one, execute_update
+from datetime import date, datetime, time, timedelta
+from db_utils import fetch_one, transaction
 
 
 class ValidationError(Exception):
@@ -10,10 +10,31 @@ class ValidationError(Exception):
     pass
 
 
+def day_bounds(day):
+    """
+    Half-open datetime range covering one calendar day.
+    
+    Filter with ``col >= start AND col < end`` instead of ``DATE(col) = day``
+    so MySQL can use an index on the datetime column.
+    
+    Args:
+        day: date (or datetime) to cover
+    
+    Returns:
+        tuple: (start: datetime, end: datetime) where end is the next midnight
+    """
+    if isinstance(day, datetime):
+        day = day.date()
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
 def validate_stock_availability(pharmacy, medicine, requested_quantity):
     """
     Validate if sufficient stock is available for a medicine purchase.
     
+    Stock is summed over all unexpired batches of the medicine at the pharmacy.
+    
     Args:
         pharmacy: Pharmacy object or dict with pharmacy_id
         medicine: Medicine object or dict with medicine_id
@@ -21,6 +42,8 @@ def validate_stock_availability(pharmacy, medicine, requested_quantity):
     
     Returns:
         tuple: (is_available: bool, available_quantity: int, pharmacy_medicine: dict or None)
+        where pharmacy_medicine holds pharmacy_id, medicine_id, stock_quantity
+        (the total) and batch_count
     """
     # Get IDs from object or dict
     pharmacy_id = pharmacy.pharmacy_id if hasattr(pharmacy, 'pharmacy_id') else pharmacy.get('pharmacy_id')
@@ -28,15 +51,19 @@ def validate_stock_availability(pharmacy, medicine, requested_quantity):
     
     # Query using raw SQL
     pharmacy_medicine_data = fetch_one(
-        """SELECT * FROM core_pharmacymedicine 
-           WHERE pharmacy_id = %s AND medicine_id = %s""",
-        (pharmacy_id, medicine_id)
+        """SELECT pharmacy_id, medicine_id, SUM(stock_quantity) AS stock_quantity,
+                  COUNT(*) AS batch_count
+           FROM core_pharmacymedicine 
+           WHERE pharmacy_id = %s AND medicine_id = %s AND expiry_date >= %s
+           GROUP BY pharmacy_id, medicine_id""",
+        (pharmacy_id, medicine_id, date.today())
     )
     
     if not pharmacy_medicine_data:
         return False, 0, None
     
-    stock_quantity = pharmacy_medicine_data['stock_quantity']
+    stock_quantity = int(pharmacy_medicine_data['stock_quantity'])
+    pharmacy_medicine_data['stock_quantity'] = stock_quantity
     
     if stock_quantity >= requested_quantity:
         return True, stock_quantity, pharmacy_medicine_data
@@ -48,39 +75,37 @@ def reduce_stock(pharmacy, medicine, quantity):
     """
     Reduce stock quantity for a medicine at a pharmacy.
     
+    A wrapper over services.dispensing.take_stock(), which locks the
+    unexpired batches and takes the quantity earliest-expiry-first, so it
+    succeeds exactly when validate_stock_availability() reports enough stock.
+    
     Args:
         pharmacy: Pharmacy object or dict with pharmacy_id
         medicine: Medicine object or dict with medicine_id
         quantity: int - quantity to reduce
     
     Returns:
-        dict: Updated pharmacy medicine data
+        dict: Updated stock, shaped like validate_stock_availability()'s pharmacy_medicine
         
     Raises:
-        ValidationError: If insufficient stock
+        ValidationError: If quantity is not positive or stock is insufficient
     """
-    is_available, available_qty, pharmacy_medicine = validate_stock_availability(pharmacy, medicine, quantity)
+    # Imported here: services.dispensing imports this module
+    from services.dispensing import take_stock
     
-    if not is_available:
-        medicine_name = medicine.name if hasattr(medicine, 'name') else medicine.get('name', 'Unknown')
-        raise ValidationError(
-            f"Insufficient stock for {medicine_name}. "
-            f"Requested: {quantity}, Available: {available_qty}"
-        )
+    if quantity <= 0:
+        raise ValidationError(f"Quantity must be positive, got {quantity}")
     
-    # Get IDs
+    # Get IDs from object or dict
     pharmacy_id = pharmacy.pharmacy_id if hasattr(pharmacy, 'pharmacy_id') else pharmacy.get('pharmacy_id')
     medicine_id = medicine.medicine_id if hasattr(medicine, 'medicine_id') else medicine.get('medicine_id')
+    medicine_name = medicine.name if hasattr(medicine, 'name') else medicine.get('name', 'Unknown')
     
-    # Update stock using raw SQL
-    new_quantity = pharmacy_medicine['stock_quantity'] - quantity
-    sql = """UPDATE core_pharmacymedicine 
-             SET stock_quantity = %s 
-             WHERE pharmacy_id = %s AND medicine_id = %s"""
-    execute_update(sql, (new_quantity, pharmacy_id, medicine_id))
+    with transaction() as tx:
+        take_stock(tx, pharmacy_id, [{'medicine_id': medicine_id, 'quantity': quantity, 'name': medicine_name}],
+                   date.today())
+        _, _, pharmacy_medicine = validate_stock_availability(pharmacy, medicine, 0)
     
-    # Return updated data
-    pharmacy_medicine['stock_quantity'] = new_quantity
     return pharmacy_medicine
 
 